@@ -3,3 +3,16 @@ from django.apps import AppConfig
 
 class AccountsConfig(AppConfig):
     name = 'apps.auth_api.accounts'
+
+    def ready(self):
+        from configs.metrics import register_collector, register_component
+        from . import audit, authentication, blacklist, checks, hashing, schema, signals  # noqa: F401
+
+        # Read the singletons without creating them: a process only reports
+        # the components it has actually started.
+        register_component('jwt_user_cache', lambda: authentication._user_cache and authentication._user_cache.stats())
+        register_component('jwt_blacklist_filter', lambda: blacklist._filter and blacklist._filter.stats())
+        register_component('password_hashing', lambda: hashing._pool and hashing._pool.stats())
+        register_component('audit_log', lambda: audit._writer and audit._writer.stats())
+        # Table sizes are the same whichever worker asks: read once per scrape
+        register_collector('jwt_token_tables', blacklist.cached_token_table_stats)
@@ -0,0 +1,147 @@
+"""
+Async-native versions of the busiest authentication endpoints.
+
+DRF views are synchronous, so under ASGI each one occupies a thread for its
+whole duration, including the wait on Google's certificate endpoint. These
+plain Django async views cover the same contracts as ``MeView`` and
+``GoogleLoginView`` with async ORM calls, ``CachedJWTAuthentication`` in its
+async form and ``GoogleIdTokenVerifier.averify``, so a few event-loop workers
+(``gunicorn -k uvicorn.workers.UvicornWorker configs.asgi:application``) can
+hold many concurrent requests. They also work under WSGI, one event loop per
+request. Bodies are rendered like DRF's (``OrjsonRenderer``, user data from
+``readers``), so both versions of an endpoint return the same bytes.
+"""
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from google.auth.exceptions import TransportError
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from configs.db_routers import primary_reads
+from configs.http_cache import conditional_response, set_validators
+from configs.renderers import OrjsonRenderer
+from .audit import record_event
+from .authentication import CachedJWTAuthentication
+from .freshness import auser_validators
+from .google_auth import InvalidIssuerError, get_google_verifier, login_claims_error
+from .lockout import alocked_until, retry_after
+from .readers import user_data
+from .serializers import ClaimsTokenObtainPairSerializer, GoogleTokenSerializer, UserSerializer
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+
+def _json(data, status_code=status.HTTP_200_OK):
+    renderer = OrjsonRenderer()
+    return HttpResponse(renderer.render(data), content_type=renderer.media_type, status=status_code)
+
+
+def _error(detail, status_code):
+    return _json({"detail": detail}, status_code)
+
+
+async def _authenticate(request):
+    """Return ``(user, None)``, or ``(None, error response)`` shaped like DRF's"""
+    authenticator = CachedJWTAuthentication()
+    try:
+        result = await authenticator.aauthenticate(request)
+    except APIException as exc:
+        data = exc.detail if isinstance(exc.detail, (dict, list)) else {"detail": exc.detail}
+        response = _json(data, exc.status_code)
+    else:
+        if result is not None:
+            return result[0], None
+        response = _error("Authentication credentials were not provided.", status.HTTP_401_UNAUTHORIZED)
+    response["WWW-Authenticate"] = authenticator.authenticate_header(request)
+    return None, response
+
+
+@sync_to_async
+def _user_data(user):
+    """What ``MeView`` returns for ``user``"""
+    with primary_reads():
+        data = user_data(User.objects.filter(pk=user.pk))
+    # Deleted since the token's user was cached
+    return UserSerializer(user).data if data is None else data
+
+
+class AsyncMeView(View):
+    """ GET /api/async/me/ - async counterpart of MeView """
+    http_method_names = ["get"]
+
+    async def get(self, request):
+        user, error = await _authenticate(request)
+        if error is not None:
+            return error
+
+        etag, last_modified = await auser_validators(user.pk, "me")
+        not_modified = conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        return set_validators(_json(await _user_data(user)), etag, last_modified)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncGoogleLoginView(View):
+    """ POST /api/async/auth/google/login/ - async counterpart of GoogleLoginView """
+    http_method_names = ["post"]
+
+    async def post(self, request):
+        try:
+            payload = json.loads(request.body or b"{}")
+        except ValueError:
+            return _error("Invalid JSON", status.HTTP_400_BAD_REQUEST)
+        token_serializer = GoogleTokenSerializer(data=payload)
+        if not token_serializer.is_valid():
+            return _json(token_serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            id_info = await get_google_verifier().averify(token_serializer.validated_data["id_token"])
+        except InvalidIssuerError:
+            return _error("Invalid Google token issuer", status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return _error("Invalid Google token", status.HTTP_400_BAD_REQUEST)
+        except TransportError:
+            logger.exception("Unable to reach Google to verify ID token")
+            return _error("Unable to verify Google token", status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        claims_error = login_claims_error(id_info)
+        if claims_error:
+            return _error(claims_error, status.HTTP_400_BAD_REQUEST)
+
+        until = await alocked_until(id_info["email"])
+        if until is not None:
+            response = _error("Account is temporarily locked. Try again later.", status.HTTP_403_FORBIDDEN)
+            response["Retry-After"] = str(retry_after(until))
+            return response
+
+        user, created = await User.objects.aget_or_create(
+            email=id_info["email"],
+            defaults={
+                "first_name": id_info.get("given_name") or "",
+                "last_name": id_info.get("family_name") or "",
+                "is_active": True,
+            },
+        )
+        if not user.is_active:
+            return _error("Account is inactive", status.HTTP_403_FORBIDDEN)
+
+        # Registers the OutstandingToken row; simplejwt has no async API
+        refresh = await sync_to_async(ClaimsTokenObtainPairSerializer.get_token)(user)
+        await sync_to_async(record_event)("login", request, user=user, method="google", created=created)
+
+        # Same fields, in the same order, as GoogleAutoResponseSerializer
+        return _json({
+            "access": str(refresh.access_token),
+            "refresh": str(refresh),
+            "user": await _user_data(user),
+        })
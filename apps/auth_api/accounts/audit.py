@@ -0,0 +1,234 @@
+"""
+Asynchronous, batched writer for ``AuditLog``.
+
+Authentication views call ``record_event()``, which builds an unsaved
+``AuditLog`` row and puts it on a bounded in-process queue. A background
+thread drains the queue and writes rows with ``bulk_create`` whenever a batch
+fills up or the flush interval elapses, so the request path never waits for
+an INSERT. When the queue is full the event is dropped and counted rather than
+blocking the login; the remaining queue is flushed when the worker exits.
+
+Behaviour is configured through ``settings.AUDIT_LOG``. With ``ASYNC`` set to
+``False`` events are written inline, which is what tests and management
+commands usually want.
+"""
+import atexit
+import ipaddress
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'ASYNC': True,
+    'QUEUE_SIZE': 10000,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 2.0,
+    # Seconds a request may wait for room in a full queue before dropping
+    'ENQUEUE_TIMEOUT': 0,
+}
+
+USER_AGENT_MAX_LENGTH = 512
+
+
+def audit_settings():
+    return {**DEFAULTS, **getattr(settings, 'AUDIT_LOG', {})}
+
+
+def get_client_ip(request):
+    """Best-effort client address; invalid values are discarded"""
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    address = forwarded.split(',')[0].strip() if forwarded else request.META.get('REMOTE_ADDR')
+    try:
+        return str(ipaddress.ip_address(address)) if address else None
+    except ValueError:
+        return None
+
+
+class AuditLogWriter:
+    """Bounded queue plus a daemon thread flushing ``AuditLog`` rows in batches"""
+
+    def __init__(self, queue_size=10000, batch_size=500, flush_interval=2.0, enqueue_timeout=0):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._stop = None
+        self._thread = None
+
+    def _ensure_started(self):
+        # Gunicorn forks workers after import; each process needs its own
+        # queue and thread, and a queue inherited mid-use is not safe to touch.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, entry):
+        """Queue ``entry`` for writing; returns ``False`` if it was dropped"""
+        self._ensure_started()
+        try:
+            if self.enqueue_timeout:
+                self._queue.put(entry, timeout=self.enqueue_timeout)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning('Audit log queue full, %d events dropped so far', self.dropped)
+            return False
+        self.enqueued += 1
+        return True
+
+    def _take_batch(self, block):
+        """Collect up to ``batch_size`` entries, waiting at most one interval"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if block and timeout > 0:
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take_batch(block=True)
+            if batch:
+                self._write_in_background(batch)
+
+    def write(self, batch):
+        """Insert ``batch``, isolating bad rows if the bulk insert fails"""
+        try:
+            with transaction.atomic():
+                AuditLog.objects.bulk_create(batch, batch_size=self.batch_size)
+            self.written += len(batch)
+        except IntegrityError:
+            # e.g. a user deleted between the event and the flush
+            for entry in batch:
+                try:
+                    with transaction.atomic():
+                        entry.save(force_insert=True)
+                    self.written += 1
+                except DatabaseError:
+                    self.failed += 1
+                    logger.exception('Could not write audit event %s', entry.event_type)
+        except DatabaseError:
+            self.failed += len(batch)
+            logger.exception('Could not write %d audit events', len(batch))
+
+    def _write_in_background(self, batch):
+        # The writer thread owns its connection, so it must also retire it.
+        with self._write_lock:
+            close_old_connections()
+            try:
+                self.write(batch)
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Write everything queued so far from the calling thread"""
+        if self._pid != os.getpid():
+            return
+        while True:
+            batch = self._take_batch(block=False)
+            if not batch:
+                return
+            with self._write_lock:
+                self.write(batch)
+
+    def shutdown(self):
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+    def stats(self):
+        return {
+            'queue_depth': self._queue.qsize() if self._pid == os.getpid() else 0,
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+            'written': self.written,
+            'failed': self.failed,
+        }
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                options = audit_settings()
+                _writer = AuditLogWriter(
+                    queue_size=options['QUEUE_SIZE'],
+                    batch_size=options['BATCH_SIZE'],
+                    flush_interval=options['FLUSH_INTERVAL'],
+                    enqueue_timeout=options['ENQUEUE_TIMEOUT'],
+                )
+                atexit.register(_writer.shutdown)
+    return _writer
+
+
+def record_event(event_type, request=None, user=None, user_id=None, **metadata):
+    """
+    Record an authentication event without touching the database on the
+    calling thread (unless ``AUDIT_LOG['ASYNC']`` is off).
+    """
+    options = audit_settings()
+    if not options['ENABLED']:
+        return
+
+    if user is not None and user.is_authenticated:
+        user_id = user.pk
+    ip_address = user_agent = None
+    if request is not None:
+        ip_address = get_client_ip(request)
+        user_agent = request.META.get('HTTP_USER_AGENT', '')[:USER_AGENT_MAX_LENGTH] or None
+    entry = AuditLog(
+        user_id=user_id,
+        event_type=event_type,
+        ip_address=ip_address,
+        user_agent=user_agent,
+        metadata=metadata,
+        timestamp=timezone.now(),
+    )
+
+    if options['ASYNC']:
+        get_audit_writer().submit(entry)
+    else:
+        get_audit_writer().write([entry])
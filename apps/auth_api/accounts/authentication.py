@@ -0,0 +1,216 @@
+"""
+JWT authentication without a user query per request.
+
+``JWTAuthentication`` loads the ``CustomUser`` row for every authenticated
+request. ``CachedJWTAuthentication`` keeps loaded users in a small per-process
+LRU cache with a short TTL, keyed by user id and the user's version stamp in
+the shared cache. Saving a user (which covers deactivation and password
+changes) bumps the stamp, so every process stops serving the old copy on its
+next request; the TTL only bounds memory and staleness if the shared cache is
+lost. That needs ``CACHES`` to be shared between processes (see
+``checks.check_shared_cache``).
+
+With ``JWT_USER_CACHE['STATELESS']`` the user is built from the token claims
+(``TokenUser``) and the database is never consulted. Deactivated users are
+still rejected through a marker kept in the shared cache for the lifetime of
+an access token.
+
+``SIMPLE_JWT['CHECK_REVOKE_TOKEN']`` holds on every path: cached users are
+compared with the token's password claim on each request, and in stateless
+mode every user save publishes the hash of the current password in the
+shared cache, so tokens issued before a password change stop working at
+once.
+"""
+import copy
+import threading
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from configs.cache_versions import aget_version, bump_version, get_version
+from configs.db_routers import primary_reads
+
+DEFAULTS = {
+    # Build request.user from the token claims instead of the database
+    'STATELESS': False,
+    'MAX_SIZE': 10000,
+    # Seconds a cached user may be served
+    'TTL': 60,
+}
+
+USER_VERSION_KEY = 'accounts:user:{user_id}'
+INACTIVE_KEY = 'accounts:user:{user_id}:inactive'
+PASSWORD_KEY = 'accounts:user:{user_id}:password'
+
+# Copied into every token so stateless mode can answer common questions
+TOKEN_USER_CLAIMS = ('email', 'first_name', 'last_name', 'is_staff', 'is_superuser')
+
+
+def jwt_user_cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'JWT_USER_CACHE', {})}
+
+
+class UserCache:
+    """Thread-safe LRU/TTL cache of users keyed by ``(user_id, version)``"""
+
+    def __init__(self, max_size=10000, ttl=60):
+        self._users = TTLCache(maxsize=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, version):
+        with self._lock:
+            user = self._users.get((str(user_id), version))
+            if user is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        # Views may hang per-request state off request.user; keep the
+        # cached instance pristine.
+        return copy.copy(user)
+
+    def set(self, user_id, version, user):
+        with self._lock:
+            self._users[(str(user_id), version)] = copy.copy(user)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+    def stats(self):
+        return {'size': len(self._users), 'hits': self.hits, 'misses': self.misses}
+
+
+_user_cache = None
+_user_cache_lock = threading.Lock()
+
+
+def get_user_cache():
+    global _user_cache
+    if _user_cache is None:
+        with _user_cache_lock:
+            if _user_cache is None:
+                options = jwt_user_cache_settings()
+                _user_cache = UserCache(max_size=options['MAX_SIZE'], ttl=options['TTL'])
+    return _user_cache
+
+
+@receiver(setting_changed)
+def _reset_user_cache(setting, **kwargs):
+    global _user_cache
+    if setting == 'JWT_USER_CACHE':
+        _user_cache = None
+
+
+def invalidate_user(user_id, is_active=True, password=None):
+    """Drop cached copies of the user everywhere once the transaction commits"""
+    def bump():
+        bump_version(USER_VERSION_KEY.format(user_id=user_id))
+        timeout = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+        inactive_key = INACTIVE_KEY.format(user_id=user_id)
+        if is_active:
+            cache.delete(inactive_key)
+        else:
+            cache.set(inactive_key, True, timeout)
+        if password is not None and api_settings.CHECK_REVOKE_TOKEN:
+            cache.set(PASSWORD_KEY.format(user_id=user_id), get_md5_hash_password(password), timeout)
+
+    transaction.on_commit(bump)
+
+
+def _check_password_claim(validated_token, password_hash):
+    if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_hash:
+        raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+
+def _check_markers(validated_token, markers, user_id):
+    """Reject a stateless token from the shared cache markers of its user"""
+    if markers.get(INACTIVE_KEY.format(user_id=user_id)):
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+    password_hash = markers.get(PASSWORD_KEY.format(user_id=user_id))
+    if password_hash is not None:
+        _check_password_claim(validated_token, password_hash)
+
+
+def _marker_keys(user_id):
+    keys = [INACTIVE_KEY.format(user_id=user_id)]
+    if api_settings.CHECK_REVOKE_TOKEN:
+        keys.append(PASSWORD_KEY.format(user_id=user_id))
+    return keys
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` serving users from ``UserCache`` or token claims"""
+
+    def _user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+    def get_user(self, validated_token):
+        user_id = self._user_id(validated_token)
+
+        if jwt_user_cache_settings()['STATELESS']:
+            _check_markers(validated_token, cache.get_many(_marker_keys(user_id)), user_id)
+            return api_settings.TOKEN_USER_CLASS(validated_token)
+
+        # Read the stamp before loading, so a save racing the load leaves
+        # the copy under an already-outdated version.
+        version = get_version(USER_VERSION_KEY.format(user_id=user_id))
+        users = get_user_cache()
+        user = users.get(user_id, version)
+        if user is None:
+            # Checks is_active and the password claim itself
+            with primary_reads():
+                user = super().get_user(validated_token)
+            users.set(user_id, version, user)
+        elif api_settings.CHECK_REVOKE_TOKEN:
+            # The copy may have been cached for a token issued after a password change
+            _check_password_claim(validated_token, get_md5_hash_password(user.password))
+        return user
+
+    async def aauthenticate(self, request):
+        """``authenticate()`` for async views; takes a plain ``HttpRequest``"""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        # Signature and claim checks are CPU-only; no I/O to await
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self._user_id(validated_token)
+
+        if jwt_user_cache_settings()['STATELESS']:
+            _check_markers(validated_token, await cache.aget_many(_marker_keys(user_id)), user_id)
+            return api_settings.TOKEN_USER_CLASS(validated_token)
+
+        version = await aget_version(USER_VERSION_KEY.format(user_id=user_id))
+        users = get_user_cache()
+        user = users.get(user_id, version)
+        if user is None:
+            try:
+                with primary_reads():
+                    user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            if not user.is_active:
+                raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+            users.set(user_id, version, user)
+        if api_settings.CHECK_REVOKE_TOKEN:
+            _check_password_claim(validated_token, get_md5_hash_password(user.password))
+        return user
@@ -0,0 +1,239 @@
+"""
+In-memory filter in front of simplejwt's token blacklist.
+
+simplejwt checks ``BlacklistedToken`` with a query on every refresh and
+verify. Almost every token checked is not blacklisted, so this module keeps
+the set of blacklisted, unexpired JTIs in memory and only asks the database
+when a JTI is a possible hit. Every ``REFRESH_INTERVAL`` seconds only the
+rows added since the last load are read (``id`` above the highest seen), so
+the request that crosses the deadline pays for an index range scan, not the
+table; every ``FULL_RELOAD_INTERVAL`` seconds the set is rebuilt, which drops
+expired and purged JTIs. Tokens blacklisted in between are caught by a marker
+written to the shared cache when the ``BlacklistedToken`` row is saved (see
+``signals``), and by a direct insert into the local set for tokens
+blacklisted in this process. The markers also cover rows committed out of
+``id`` order. With a per-process cache backend, which deploy checks reject,
+other processes would only see new entries at the next load.
+
+``cached_token_table_stats`` feeds the token table sizes to ``/metrics``.
+
+Configured through ``settings.JWT_BLACKLIST_FILTER``.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # False checks the database on every refresh/verify, like simplejwt
+    'ENABLED': True,
+    # Seconds between loads of newly blacklisted JTIs
+    'REFRESH_INTERVAL': 30,
+    # Seconds between rebuilds of the whole set
+    'FULL_RELOAD_INTERVAL': 600,
+}
+
+MARKER_KEY = 'jwt:blacklisted:{jti}'
+TABLE_STATS_KEY = 'jwt:token-table-stats'
+TABLE_STATS_TIMEOUT = 60
+
+
+def blacklist_filter_settings():
+    return {**DEFAULTS, **getattr(settings, 'JWT_BLACKLIST_FILTER', {})}
+
+
+class BlacklistFilter:
+    """Exact set of blacklisted, unexpired JTIs, topped up and rebuilt periodically"""
+
+    def __init__(self, refresh_interval=30, full_reload_interval=600):
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+
+        self._jtis = None
+        self._max_id = 0
+        self._loaded_at = 0.0
+        self._rebuilt_at = 0.0
+        self._lock = threading.Lock()
+
+        self.checks = 0
+        self.possible_hits = 0
+        self.confirmed_hits = 0
+        self.reloads = 0
+        self.incremental_loads = 0
+
+    def _load(self):
+        # Read first: rows added during the load are read again, harmlessly
+        max_id = BlacklistedToken.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        jtis = set(
+            BlacklistedToken.objects
+            .filter(token__expires_at__gt=timezone.now())
+            .values_list('token__jti', flat=True)
+            .iterator(chunk_size=5000)
+        )
+        self._jtis = jtis
+        self._max_id = max_id
+        self._loaded_at = self._rebuilt_at = time.monotonic()
+        self.reloads += 1
+        logger.debug('Loaded %d blacklisted token ids', len(jtis))
+
+    def _load_new(self):
+        added = 0
+        rows = BlacklistedToken.objects.filter(id__gt=self._max_id).values_list('id', 'token__jti')
+        for row_id, jti in rows.iterator(chunk_size=5000):
+            self._jtis.add(jti)
+            self._max_id = max(self._max_id, row_id)
+            added += 1
+        self._loaded_at = time.monotonic()
+        self.incremental_loads += 1
+        logger.debug('Loaded %d newly blacklisted token ids', added)
+
+    def _current(self):
+        if self._jtis is None:
+            with self._lock:
+                if self._jtis is None:
+                    self._load()
+        elif time.monotonic() - self._loaded_at >= self.refresh_interval:
+            # One caller loads; the others keep using the current set.
+            if self._lock.acquire(blocking=False):
+                try:
+                    if time.monotonic() - self._rebuilt_at >= self.full_reload_interval:
+                        self._load()
+                    else:
+                        self._load_new()
+                finally:
+                    self._lock.release()
+        return self._jtis
+
+    def add(self, jti):
+        if self._jtis is not None:
+            self._jtis.add(jti)
+
+    def might_contain(self, jti):
+        return jti in self._current() or cache.get(MARKER_KEY.format(jti=jti)) is not None
+
+    def is_blacklisted(self, jti):
+        """Check ``jti``; the database is only consulted on a possible hit"""
+        self.checks += 1
+        if not self.might_contain(jti):
+            return False
+        self.possible_hits += 1
+        blacklisted = BlacklistedToken.objects.filter(token__jti=jti).exists()
+        if blacklisted:
+            self.confirmed_hits += 1
+        return blacklisted
+
+    def stats(self):
+        return {
+            'size': len(self._jtis or ()),
+            'checks': self.checks,
+            'possible_hits': self.possible_hits,
+            'confirmed_hits': self.confirmed_hits,
+            'false_positives': self.possible_hits - self.confirmed_hits,
+            # Share of checks answered without touching the database
+            'filter_rate': round(1 - self.possible_hits / self.checks, 4) if self.checks else None,
+            'reloads': self.reloads,
+            'incremental_loads': self.incremental_loads,
+        }
+
+
+_filter = None
+_filter_lock = threading.Lock()
+
+
+def get_blacklist_filter():
+    global _filter
+    if _filter is None:
+        with _filter_lock:
+            if _filter is None:
+                options = blacklist_filter_settings()
+                _filter = BlacklistFilter(
+                    refresh_interval=options['REFRESH_INTERVAL'],
+                    full_reload_interval=options['FULL_RELOAD_INTERVAL'],
+                )
+    return _filter
+
+
+@receiver(setting_changed)
+def _reset_filter(setting, **kwargs):
+    global _filter
+    if setting == 'JWT_BLACKLIST_FILTER':
+        _filter = None
+
+
+def is_blacklisted(jti):
+    if not blacklist_filter_settings()['ENABLED']:
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+    return get_blacklist_filter().is_blacklisted(jti)
+
+
+def mark_blacklisted(jti, expires_at):
+    """Make a newly blacklisted ``jti`` visible before the next reload"""
+    timeout = int((expires_at - timezone.now()).total_seconds())
+    if timeout > 0:
+        cache.set(MARKER_KEY.format(jti=jti), True, timeout)
+    if _filter is not None:
+        _filter.add(jti)
+
+
+class FilteredRefreshToken(RefreshToken):
+    """``RefreshToken`` whose blacklist check goes through ``BlacklistFilter``"""
+
+    def check_blacklist(self):
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError('Token is blacklisted')
+
+
+def token_table_stats():
+    """Row counts of the simplejwt token tables"""
+    now = timezone.now()
+    outstanding = OutstandingToken.objects.aggregate(
+        total=Count('id'),
+        expired=Count('id', filter=Q(expires_at__lte=now)),
+    )
+    blacklisted = BlacklistedToken.objects.aggregate(
+        total=Count('id'),
+        expired=Count('id', filter=Q(token__expires_at__lte=now)),
+    )
+    return {
+        'outstanding': outstanding['total'],
+        'outstanding_expired': outstanding['expired'],
+        'blacklisted': blacklisted['total'],
+        'blacklisted_expired': blacklisted['expired'],
+    }
+
+
+def cached_token_table_stats():
+    """``token_table_stats()`` shared through the cache, so scrapes do not count the tables each time"""
+    return cache.get_or_set(TABLE_STATS_KEY, token_table_stats, TABLE_STATS_TIMEOUT)
+
+
+def purge_expired_tokens(chunk_size=1000, pause=0.0, now=None):
+    """
+    Delete expired outstanding tokens and their blacklist entries in chunks,
+    one short transaction per chunk. Returns ``(outstanding, blacklisted)``.
+    """
+    now = now or timezone.now()
+    expired = OutstandingToken.objects.filter(expires_at__lte=now).order_by('id')
+    outstanding_deleted = blacklisted_deleted = 0
+    while True:
+        ids = list(expired.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return outstanding_deleted, blacklisted_deleted
+        with transaction.atomic():
+            blacklisted_deleted += BlacklistedToken.objects.filter(token_id__in=ids).delete()[0]
+            outstanding_deleted += OutstandingToken.objects.filter(id__in=ids).delete()[0]
+        if pause:
+            time.sleep(pause)
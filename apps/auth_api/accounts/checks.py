@@ -0,0 +1,28 @@
+"""
+System checks for settings the auth features depend on.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Backends whose entries are only visible to the process that wrote them
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Cross-process invalidation needs a cache every worker shares"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        f'The default cache ({backend}) is local to each process.',
+        hint=(
+            'Role revocations, user deactivation, blacklisted refresh tokens and '
+            'login lockout counters would only take effect in the worker that saw '
+            'them. Point CACHES at a shared backend (set REDIS_URL).'
+        ),
+        id='accounts.E001',
+    )]
@@ -0,0 +1,56 @@
+"""
+Composite version of everything a serialized user is built from.
+
+``UserSerializer`` output depends on the user row, their role assignments,
+the role catalog (role names and codes) and their Zendesk profile. Each of
+these already has, or here gets, a version stamp bumped on change, so the
+stamps together identify one representation. Reading them is a single cache
+round-trip, which is enough to answer conditional requests with 304 without
+touching the database or the serializers.
+
+Stamps are microsecond timestamps, so the newest one doubles as the
+``Last-Modified`` time.
+"""
+from django.db import transaction
+
+from apps.auth_api.roles.resolver import CATALOG_VERSION_KEY
+from apps.auth_api.roles.resolver import USER_VERSION_KEY as ROLES_VERSION_KEY
+from configs.cache_versions import aget_versions, bump_version, get_versions
+from configs.http_cache import strong_etag
+from .authentication import USER_VERSION_KEY
+
+PROFILE_VERSION_KEY = 'accounts:profile:{user_id}'
+
+
+def user_version_keys(user_id):
+    return (
+        USER_VERSION_KEY.format(user_id=user_id),
+        ROLES_VERSION_KEY.format(user_id=user_id),
+        PROFILE_VERSION_KEY.format(user_id=user_id),
+        CATALOG_VERSION_KEY,
+    )
+
+
+def user_validators(user_id, *variant):
+    """
+    Return ``(etag, last_modified)`` for the representation of ``user_id``.
+    ``variant`` distinguishes representations of the same user (e.g. the
+    serializer used).
+    """
+    versions = get_versions(*user_version_keys(user_id))
+    stamps = [versions[key] for key in user_version_keys(user_id)]
+    # HTTP dates have whole-second precision; the ETag catches faster changes
+    return strong_etag(user_id, *variant, *stamps), max(stamps) // 1_000_000
+
+
+async def auser_validators(user_id, *variant):
+    """``user_validators`` for async views"""
+    keys = user_version_keys(user_id)
+    versions = await aget_versions(*keys)
+    stamps = [versions[key] for key in keys]
+    return strong_etag(user_id, *variant, *stamps), max(stamps) // 1_000_000
+
+
+def invalidate_user_profile(user_id):
+    """Mark the user's Zendesk profile as changed once the transaction commits"""
+    transaction.on_commit(lambda: bump_version(PROFILE_VERSION_KEY.format(user_id=user_id)))
@@ -0,0 +1,264 @@
+"""
+Google ID token verification.
+
+``google.oauth2.id_token.verify_oauth2_token`` downloads Google's signing
+certificates on every call through whatever transport it is handed. The
+verifier below keeps one pooled HTTP session per process, caches the
+certificates for as long as Google's ``Cache-Control: max-age`` allows,
+refreshes them in the background shortly before they expire, and makes sure
+only one refresh runs at a time however many logins arrive at once.
+
+The certificate endpoint is configurable (``GOOGLE_CERTS_URL``) so tests and
+local development can point it at a stand-in serving their own keys
+(``apps.tooling.google_stub``, kept out of the application packages).
+"""
+import base64
+import json
+import logging
+import re
+import threading
+import time
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from google.auth import jwt
+from google.auth.exceptions import TransportError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_ISSUERS = frozenset({'accounts.google.com', 'https://accounts.google.com'})
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class InvalidIssuerError(ValueError):
+    """A correctly signed token that was not issued by Google"""
+
+
+def _unverified_key_id(token):
+    """Return the ``kid`` from the token header without verifying anything"""
+    try:
+        header = token.split('.', 1)[0]
+        header += '=' * (-len(header) % 4)
+        return json.loads(base64.urlsafe_b64decode(header)).get('kid')
+    except (ValueError, AttributeError):
+        return None
+
+
+class GoogleIdTokenVerifier:
+    """Verify Google ID tokens against cached signing certificates"""
+
+    def __init__(
+        self,
+        audience,
+        certs_url,
+        timeout=5,
+        default_max_age=300,
+        refresh_margin=60,
+        min_forced_refresh_interval=30,
+        pool_size=10,
+        clock_skew_in_seconds=10,
+    ):
+        self.audience = audience
+        self.certs_url = certs_url
+        self.timeout = timeout
+        self.default_max_age = default_max_age
+        self.refresh_margin = refresh_margin
+        self.min_forced_refresh_interval = min_forced_refresh_interval
+        self.clock_skew_in_seconds = clock_skew_in_seconds
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504)),
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._certs = None
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._refresh_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Certificates
+    # ------------------------------------------------------------------
+    def _fetch(self):
+        try:
+            response = self.session.get(self.certs_url, timeout=self.timeout)
+        except requests.RequestException as exc:
+            raise TransportError(f'Could not fetch certificates at {self.certs_url}') from exc
+        if response.status_code != 200:
+            raise TransportError(
+                f'Could not fetch certificates at {self.certs_url} ({response.status_code})'
+            )
+
+        match = _MAX_AGE_RE.search(response.headers.get('Cache-Control', ''))
+        max_age = int(match.group(1)) if match else self.default_max_age
+        try:
+            max_age -= int(response.headers.get('Age', 0))
+        except ValueError:
+            pass
+
+        try:
+            certs = response.json()
+        except ValueError as exc:
+            raise TransportError(f'Invalid certificates from {self.certs_url}') from exc
+        if not isinstance(certs, dict):
+            raise TransportError(f'Invalid certificates from {self.certs_url}')
+        now = time.monotonic()
+        self._certs = certs
+        self._fetched_at = now
+        self._expires_at = now + max(max_age, 0)
+        return certs
+
+    def _refresh(self, stale_certs):
+        """Fetch new certificates, letting only one caller do the work"""
+        with self._refresh_lock:
+            # Someone else refreshed while we waited for the lock.
+            if self._certs is not stale_certs and self._certs is not None:
+                return self._certs
+            return self._fetch()
+
+    def _refresh_in_background(self):
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self._fetch()
+            except TransportError:
+                logger.warning('Background refresh of Google certificates failed', exc_info=True)
+            finally:
+                self._refresh_lock.release()
+
+        threading.Thread(target=run, name='google-certs-refresh', daemon=True).start()
+
+    def cached_certs(self):
+        """
+        Return the certificates if they are still fresh, without any I/O
+        (a refresh is started in the background when they are about to
+        expire); ``None`` if they have to be fetched first.
+        """
+        certs = self._certs
+        now = time.monotonic()
+        if certs is not None and now < self._expires_at:
+            if now >= self._expires_at - self.refresh_margin:
+                self._refresh_in_background()
+            return certs
+        return None
+
+    def get_certs(self):
+        """Return the current certificates, fetching them if they have expired"""
+        certs = self.cached_certs()
+        if certs is not None:
+            return certs
+        certs = self._certs
+        now = time.monotonic()
+        try:
+            return self._refresh(certs)
+        except TransportError:
+            if certs is None:
+                raise
+            # Google keeps retired keys valid for days; keep serving the last
+            # known set for a short while instead of stalling every login.
+            logger.warning('Refresh of Google certificates failed, using stale set', exc_info=True)
+            self._expires_at = now + self.refresh_margin
+            return certs
+
+    def has_fresh_certs(self):
+        return self._certs is not None and time.monotonic() < self._expires_at
+
+    # ------------------------------------------------------------------
+    # Verification
+    # ------------------------------------------------------------------
+    def decode(self, token, certs):
+        """Verify ``token`` against ``certs``; raises ``ValueError`` if invalid"""
+        id_info = jwt.decode(
+            token,
+            certs=certs,
+            audience=self.audience,
+            clock_skew_in_seconds=self.clock_skew_in_seconds,
+        )
+        if id_info.get('iss') not in GOOGLE_ISSUERS:
+            raise InvalidIssuerError(f"Wrong issuer. 'iss' should be one of {sorted(GOOGLE_ISSUERS)}")
+        return id_info
+
+    def needs_forced_refresh(self, token, certs):
+        """
+        Google rotates keys; a token signed with a key id we have not seen
+        warrants one early refresh, but not more often than the configured
+        interval so forged key ids cannot be used to hammer the endpoint.
+        """
+        key_id = _unverified_key_id(token)
+        return (
+            key_id is not None
+            and key_id not in certs
+            and time.monotonic() - self._fetched_at >= self.min_forced_refresh_interval
+        )
+
+    def verify(self, token):
+        """
+        Verify a Google ID token and return its claims.
+
+        Raises ``ValueError`` for invalid tokens (``InvalidIssuerError`` for
+        ones Google did not issue) and ``TransportError`` when valid
+        certificates cannot be fetched, like ``verify_oauth2_token``.
+        """
+        certs = self.get_certs()
+        if self.needs_forced_refresh(token, certs):
+            certs = self._refresh(certs)
+        return self.decode(token, certs)
+
+    async def averify(self, token):
+        """
+        ``verify()`` for async code. With fresh certificates verification is
+        CPU-only and runs inline; a fetch runs in a worker thread so the event
+        loop is never blocked on Google.
+        """
+        certs = self.cached_certs()
+        if certs is None or self.needs_forced_refresh(token, certs):
+            return await sync_to_async(self.verify, thread_sensitive=False)(token)
+        return self.decode(token, certs)
+
+
+def login_claims_error(id_info):
+    """Why verified ``id_info`` cannot be used to log in, or ``None``"""
+    if id_info.get('iss') not in GOOGLE_ISSUERS:
+        return 'Invalid Google token issuer'
+    if not id_info.get('email'):
+        return 'Google token does not contain email'
+    if not id_info.get('email_verified'):
+        return 'Google account email is not verified'
+    return None
+
+
+_verifier = None
+_verifier_lock = threading.Lock()
+
+
+def get_google_verifier():
+    """Return the process-wide verifier built from settings"""
+    global _verifier
+    if _verifier is None:
+        with _verifier_lock:
+            if _verifier is None:
+                _verifier = GoogleIdTokenVerifier(
+                    audience=settings.GOOGLE_CLIENT_ID,
+                    certs_url=settings.GOOGLE_CERTS_URL,
+                    timeout=settings.GOOGLE_CERTS_TIMEOUT,
+                )
+    return _verifier
+
+
+@receiver(setting_changed)
+def _reset_verifier(setting, **kwargs):
+    global _verifier
+    if setting in {'GOOGLE_CLIENT_ID', 'GOOGLE_CERTS_URL', 'GOOGLE_CERTS_TIMEOUT'}:
+        _verifier = None
@@ -0,0 +1,30 @@
+import base64
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+from .hashing import get_hashing_pool, hashing_settings
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 whose key derivation runs in the bounded hashing pool.
+
+    Produces and verifies the same ``pbkdf2_sha256$...`` strings as Django's
+    own hasher, so existing hashes keep working. It must be listed instead
+    of that hasher, not beside it: both claim the ``pbkdf2_sha256`` name.
+    The iteration count comes from ``PASSWORD_HASHING['ITERATIONS']``;
+    hashes made with a different count are upgraded on the user's next
+    successful login.
+    """
+
+    @property
+    def iterations(self):
+        return hashing_settings()['ITERATIONS'] or PBKDF2PasswordHasher.iterations
+
+    def encode(self, password, salt, iterations=None, pool=None):
+        self._check_encode_args(password, salt)
+        iterations = iterations or self.iterations
+        pool = pool or get_hashing_pool()
+        hash = pool.derive(self.digest().name, password, salt, iterations)
+        hash = base64.b64encode(hash).decode("ascii").strip()
+        return "%s$%d$%s$%s" % (self.algorithm, iterations, salt, hash)
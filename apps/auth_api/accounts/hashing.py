@@ -0,0 +1,194 @@
+"""
+Password hashing outside the request thread.
+
+PBKDF2 is deliberately CPU-bound. Run inline, a burst of logins pins every
+core and cheap requests queue behind them. ``HashingPool`` moves the key
+derivation into a small process pool: at most ``WORKERS`` cores are spent on
+hashing, and at most ``MAX_PENDING`` derivations are admitted to the pool;
+further callers block until a slot frees up. Both limits apply per worker
+process, not across the deployment.
+
+The calling thread still waits for its result, so a login keeps its sync
+worker thread for the whole derivation. What the pool bounds is CPU, which
+keeps the GIL and the remaining cores free for other requests.
+
+Pool processes are started by a fork server (or spawned where there is
+none), never forked from the worker itself: a fork copies locks that other
+threads of a threaded server hold at that moment (logging, database
+drivers, cache clients) and can deadlock the children on them. The pool is
+built on first use, so never in a gunicorn master before it forks.
+
+The pool only ever runs ``hashlib.pbkdf2_hmac``; encoding and verification
+stay in ``hashers.PooledPBKDF2PasswordHasher``. Configured through
+``settings.PASSWORD_HASHING``; ``WORKERS = 0`` hashes inline.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.encoding import force_bytes
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'WORKERS': 2,
+    'MAX_PENDING': 64,
+    # PBKDF2 iterations for new hashes; None keeps Django's default
+    'ITERATIONS': None,
+}
+
+
+def hashing_settings():
+    return {**DEFAULTS, **getattr(settings, 'PASSWORD_HASHING', {})}
+
+
+def _mp_context():
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+
+class HashingPool:
+    """Bounded process pool for PBKDF2 key derivation"""
+
+    def __init__(self, workers=2, max_pending=64):
+        self.workers = workers
+        self.max_pending = max_pending
+
+        self._slots = threading.BoundedSemaphore(max(max_pending, 1))
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+        self.submitted = 0
+        self.completed = 0
+        self.waiting = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.inline = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    def _get_executor(self):
+        # Executors do not survive a fork; each worker process builds its own.
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_mp_context())
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _reset(self):
+        with self._lock:
+            self._executor = None
+            self._pid = None
+
+    def derive(self, digest_name, password, salt, iterations):
+        """
+        ``hashlib.pbkdf2_hmac`` run in the pool. Blocks the calling thread
+        until the result is ready, and beforehand while ``max_pending``
+        derivations of this process are already admitted.
+        """
+        args = (digest_name, force_bytes(password), force_bytes(salt), iterations)
+        if self.workers <= 0:
+            self.inline += 1
+            return hashlib.pbkdf2_hmac(*args)
+
+        queued_at = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+        with self._slots:
+            started_at = time.monotonic()
+            with self._lock:
+                self.waiting -= 1
+                self.submitted += 1
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                self.wait_seconds += started_at - queued_at
+            try:
+                return self._get_executor().submit(hashlib.pbkdf2_hmac, *args).result()
+            except BrokenProcessPool:
+                logger.exception('Password hashing pool broke; hashing inline and rebuilding')
+                self._reset()
+                self.inline += 1
+                return hashlib.pbkdf2_hmac(*args)
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                    self.completed += 1
+                    self.run_seconds += time.monotonic() - started_at
+
+    def shutdown(self):
+        if self._pid == os.getpid():
+            self._executor.shutdown()
+        self._reset()
+
+    def stats(self):
+        """Queue depth and timing counters for this process"""
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'waiting': self.waiting,
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'inline': self.inline,
+            'wait_seconds_total': round(self.wait_seconds, 6),
+            'run_seconds_total': round(self.run_seconds, 6),
+        }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                options = hashing_settings()
+                _pool = HashingPool(workers=options['WORKERS'], max_pending=options['MAX_PENDING'])
+    return _pool
+
+
+@receiver(setting_changed)
+def _reset_pool(setting, **kwargs):
+    global _pool
+    if setting == 'PASSWORD_HASHING':
+        _pool = None
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    Return ``make_password()`` of every password, in order.
+
+    Batches get a pool of their own sized to ``workers`` (default: every
+    core) rather than competing with request traffic for the shared one.
+    """
+    from .hashers import PooledPBKDF2PasswordHasher
+
+    passwords = list(passwords)
+    workers = workers or os.cpu_count() or 1
+    hasher = get_hasher('default')
+    if workers == 1 or len(passwords) < 2 or not isinstance(hasher, PooledPBKDF2PasswordHasher):
+        return [make_password(password) for password in passwords]
+
+    pool = HashingPool(workers=workers, max_pending=workers * 2)
+    try:
+        with ThreadPoolExecutor(max_workers=workers * 2) as threads:
+            return list(threads.map(
+                lambda password: hasher.encode(password, hasher.salt(), pool=pool),
+                passwords,
+            ))
+    finally:
+        pool.shutdown()
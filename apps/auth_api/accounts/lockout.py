@@ -0,0 +1,164 @@
+"""
+Failed-login tracking and temporary account lockout.
+
+Failed attempts are counted per login identifier (the email, case-folded)
+in the shared cache with a sliding window: two fixed buckets, the previous
+one weighted by how much of it still overlaps the window. Nothing is written
+to the database until the count reaches ``MAX_ATTEMPTS``; then a lock marker
+goes into the cache and the user row (``failed_login_attempts``,
+``account_locked_until``) is updated once.
+
+Login views call ``locked_until()`` before checking the password, which is a
+single cache read. Identifiers that do not belong to any user are counted and
+locked the same way, so responses do not reveal which accounts exist.
+Changes made to ``account_locked_until`` on the row (``lock_account()``,
+``unlock_account()``, the admin) are copied to the cache by a signal. Only
+an actual unlock forgets the counted failures; a successful login forgets
+them and resets ``failed_login_attempts``.
+
+Counters and markers are only global if ``CACHES`` is shared between
+processes; with a per-process cache every worker counts on its own
+(``checks.check_shared_cache`` fails deploy checks on such a cache).
+"""
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Failed attempts within WINDOW seconds that lock the account
+    'MAX_ATTEMPTS': 5,
+    'WINDOW': 15 * 60,
+    'LOCK_MINUTES': 15,
+}
+
+FAILURES_KEY = 'accounts:login-failures:{digest}:{bucket}'
+LOCK_KEY = 'accounts:locked:{digest}'
+
+
+def lockout_settings():
+    return {**DEFAULTS, **getattr(settings, 'ACCOUNT_LOCKOUT', {})}
+
+
+def _digest(identifier):
+    # Hashed so keys stay short and valid for every cache backend
+    normalized = str(identifier).strip().casefold()
+    return hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
+
+
+def _failure_keys(digest, window, now):
+    bucket = int(now // window)
+    return (
+        FAILURES_KEY.format(digest=digest, bucket=bucket),
+        FAILURES_KEY.format(digest=digest, bucket=bucket - 1),
+    )
+
+
+def locked_until(identifier):
+    """Unix time the identifier stays locked until, or ``None``"""
+    if not identifier or not lockout_settings()['ENABLED']:
+        return None
+    until = cache.get(LOCK_KEY.format(digest=_digest(identifier)))
+    return until if until and until > time.time() else None
+
+
+async def alocked_until(identifier):
+    if not identifier or not lockout_settings()['ENABLED']:
+        return None
+    until = await cache.aget(LOCK_KEY.format(digest=_digest(identifier)))
+    return until if until and until > time.time() else None
+
+
+def retry_after(until):
+    """Seconds until ``until``, for the ``Retry-After`` header"""
+    return max(int(until - time.time()) + 1, 1)
+
+
+def failure_count(identifier, now=None):
+    """Failed attempts in the sliding window ending ``now``"""
+    options = lockout_settings()
+    window = options['WINDOW']
+    now = time.time() if now is None else now
+    current_key, previous_key = _failure_keys(_digest(identifier), window, now)
+    counts = cache.get_many([current_key, previous_key])
+    overlap = 1 - (now % window) / window
+    return counts.get(current_key, 0) + counts.get(previous_key, 0) * overlap
+
+
+def record_failure(identifier, now=None):
+    """
+    Count a failed attempt and lock the account once the window is full.
+    Returns the lock expiry (Unix time) if this attempt triggered a lock.
+    """
+    options = lockout_settings()
+    if not identifier or not options['ENABLED']:
+        return None
+
+    window = options['WINDOW']
+    now = time.time() if now is None else now
+    current_key, _previous_key = _failure_keys(_digest(identifier), window, now)
+    # Buckets live for two windows: one counting, one as the previous bucket
+    cache.add(current_key, 0, 2 * window)
+    try:
+        cache.incr(current_key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(current_key, 1, 2 * window)
+
+    attempts = failure_count(identifier, now)
+    if attempts < options['MAX_ATTEMPTS']:
+        return None
+    return lock(identifier, options['LOCK_MINUTES'] * 60, attempts=int(attempts), now=now)
+
+
+def lock(identifier, seconds, attempts=None, now=None):
+    """Lock ``identifier`` for ``seconds`` in the cache and on the user row"""
+    from .models import CustomUser
+
+    now = time.time() if now is None else now
+    until = now + seconds
+    digest = _digest(identifier)
+    cache.set(LOCK_KEY.format(digest=digest), until, seconds)
+    cache.delete_many(_failure_keys(digest, lockout_settings()['WINDOW'], now))
+
+    updates = {'account_locked_until': timezone.now() + timezone.timedelta(seconds=seconds)}
+    if attempts is not None:
+        updates['failed_login_attempts'] = attempts
+    user = CustomUser.objects.filter(email__iexact=str(identifier).strip()).only('pk', 'email').first()
+    if user is not None:
+        # save() rather than update() so signals refresh the cached user
+        for field, value in updates.items():
+            setattr(user, field, value)
+        user.save(update_fields=list(updates))
+        logger.warning('Locked account %s after %s failed login attempts', user.pk, attempts)
+    return until
+
+
+def clear_failures(identifier, user=None, now=None):
+    """Forget failed attempts after a successful login, on ``user``'s row too"""
+    if user is not None and user.failed_login_attempts:
+        user.failed_login_attempts = 0
+        user.save(update_fields=['failed_login_attempts'])
+    if not identifier:
+        return
+    now = time.time() if now is None else now
+    cache.delete_many(_failure_keys(_digest(identifier), lockout_settings()['WINDOW'], now))
+
+
+def sync_lock(user):
+    """Mirror ``user.account_locked_until`` into the cache"""
+    key = LOCK_KEY.format(digest=_digest(user.email))
+    if user.account_locked_until and user.account_locked_until > timezone.now():
+        until = user.account_locked_until.timestamp()
+        cache.set(key, until, retry_after(until))
+    elif cache.get(key) is not None:
+        # An unlock. Any other save of an unlocked user must leave the
+        # failure window alone, or saving would reset an attacker's count.
+        cache.delete(key)
+        clear_failures(user.email)
@@ -0,0 +1,92 @@
+import gzip
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.auth_api.accounts.audit import audit_settings
+from apps.auth_api.accounts.partitions import (
+    bucket_rows,
+    drop_bucket,
+    ensure_partitions,
+    expired_buckets,
+)
+
+FIELDS = ('id', 'user_id', 'event_type', 'ip_address', 'user_agent', 'metadata', 'timestamp')
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply the audit log retention policy: export each expired monthly bucket "
+        "to a gzip-compressed NDJSON file, then drop it. Also prepares partitions "
+        "for the coming months."
+    )
+
+    def add_arguments(self, parser):
+        options = audit_settings()
+        parser.add_argument(
+            '--retention-months', type=int, default=options.get('RETENTION_MONTHS', 12),
+            help='Number of whole months to keep in the database besides the current one',
+        )
+        parser.add_argument(
+            '--output-dir', default=options.get('ARCHIVE_DIR') or settings.BASE_DIR / 'audit_archive',
+            help='Directory receiving auditlog-YYYY-MM.ndjson.gz files',
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--months-ahead', type=int, default=3, help='Partitions to prepare in advance')
+        parser.add_argument('--no-archive', action='store_true', help='Drop expired buckets without exporting')
+        parser.add_argument('--dry-run', action='store_true', help='Only list what would be archived')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        now = timezone.now()
+        if options['retention_months'] < 0:
+            raise CommandError('--retention-months cannot be negative')
+
+        if not options['dry_run']:
+            for bucket in ensure_partitions(now, options['months_ahead'], using):
+                self.stdout.write(f'Created partition {bucket.partition_name}')
+
+        buckets = expired_buckets(options['retention_months'], now, using)
+        if not buckets:
+            self.stdout.write('No expired audit log buckets.')
+            return
+
+        output_dir = Path(options['output_dir'])
+        for bucket in buckets:
+            if options['dry_run']:
+                self.stdout.write(f'Would archive and drop {bucket.label}')
+                continue
+            if not options['no_archive']:
+                path, count = self.export(bucket, output_dir, options['chunk_size'], using)
+                self.stdout.write(f'Archived {count} rows of {bucket.label} to {path}')
+            drop_bucket(bucket, using, options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(f'Dropped {bucket.label}'))
+
+    def export(self, bucket, output_dir, chunk_size, using):
+        output_dir.mkdir(parents=True, exist_ok=True)
+        path = output_dir / f'auditlog-{bucket.label}.ndjson.gz'
+        partial = path.with_name(path.name + '.partial')
+
+        count = 0
+        rows = bucket_rows(bucket, using).values_list(*FIELDS).iterator(chunk_size=chunk_size)
+        with open(partial, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as archive:
+                for row in rows:
+                    record = dict(zip(FIELDS, row))
+                    record['user_id'] = str(record['user_id']) if record['user_id'] else None
+                    record['timestamp'] = record['timestamp'].isoformat()
+                    archive.write(json.dumps(record, separators=(',', ':')).encode())
+                    archive.write(b'\n')
+                    count += 1
+            raw.flush()
+            os.fsync(raw.fileno())
+
+        # Only a complete file ever carries the final name, so the bucket is
+        # never dropped after a partial export.
+        os.replace(partial, path)
+        return path, count
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from apps.auth_api.accounts.exports import (
+    DEFAULT_CHUNK_SIZE, FORMATS, encode_records, export_queryset, iter_records,
+)
+
+
+class Command(BaseCommand):
+    help = "Stream every user with active roles and Zendesk profile as CSV, NDJSON or a JSON array."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv', dest='export_format')
+        parser.add_argument('--output', help='File to write to (defaults to stdout)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--country')
+        parser.add_argument('--is-active', dest='is_active')
+        parser.add_argument('--role', help='Only users holding this role code')
+
+    def handle(self, *args, **options):
+        filters = {key: options[key] for key in ('country', 'is_active', 'role') if options[key]}
+        try:
+            queryset = export_queryset(filters)
+        except ValidationError as exc:
+            raise CommandError(exc.detail)
+        self.exported = 0
+        records = self.counted(iter_records(queryset, options['chunk_size']))
+        chunks = encode_records(options['export_format'], records)
+
+        if not options['output']:
+            self.write_stdout(chunks)
+            return
+
+        with open(options['output'], 'wb') as output:
+            self.write_chunks(output, chunks)
+        self.stderr.write(self.style.SUCCESS(f"Exported {self.exported} users to {options['output']}"))
+
+    def counted(self, records):
+        for record in records:
+            self.exported += 1
+            yield record
+
+    def write_stdout(self, chunks):
+        """Bytes to the binary buffer under ``self.stdout`` or, for a text-only stream, text"""
+        buffer = getattr(self.stdout._out, 'buffer', None)
+        if buffer is None:
+            for chunk in chunks:
+                self.stdout.write(chunk if isinstance(chunk, str) else chunk.decode('utf-8'), ending='')
+            return
+        # Whatever was written as text goes out before the raw bytes
+        self.stdout.flush()
+        self.write_chunks(buffer, chunks)
+        buffer.flush()
+
+    @staticmethod
+    def write_chunks(output, chunks):
+        # CSV rows are text, the JSON formats bytes
+        for chunk in chunks:
+            output.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
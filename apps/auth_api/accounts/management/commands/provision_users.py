@@ -0,0 +1,37 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.auth_api.accounts.provisioning import DEFAULT_CHUNK_SIZE, parse_csv, parse_json, provision_users
+
+
+class Command(BaseCommand):
+    help = "Create users in bulk from a CSV or JSON file, with optional roles and Zendesk profiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='.csv file, or .json holding a list (or {"users": [...]})')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only')
+        parser.add_argument('--workers', type=int, help='Password hashing processes (default: CPU count)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'{path} does not exist')
+
+        with path.open(encoding='utf-8-sig', newline='') as stream:
+            rows = parse_csv(stream) if path.suffix.lower() == '.csv' else parse_json(stream)
+
+        report = provision_users(
+            rows,
+            dry_run=options['dry_run'],
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+        )
+        for error in report['errors']:
+            self.stderr.write(f"row {error['row']}: {json.dumps(error['errors'])}")
+        verb = 'Would create' if report['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report['created']} of {report['total']} users ({report['failed']} failed)"
+        ))
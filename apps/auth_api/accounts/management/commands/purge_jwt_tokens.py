@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.auth_api.accounts.blacklist import purge_expired_tokens, token_table_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired simplejwt outstanding tokens and their blacklist entries "
+        "in small batches, each in its own short transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Tokens deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only report table sizes')
+        parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        result = {'before': token_table_stats()}
+        if not options['dry_run']:
+            outstanding, blacklisted = purge_expired_tokens(options['chunk_size'], options['pause'])
+            result.update(
+                deleted={'outstanding': outstanding, 'blacklisted': blacklisted},
+                after=token_table_stats(),
+            )
+
+        if options['json']:
+            self.stdout.write(json.dumps(result))
+            return
+        before = result['before']
+        self.stdout.write(
+            f"Outstanding tokens: {before['outstanding']} ({before['outstanding_expired']} expired), "
+            f"blacklisted: {before['blacklisted']} ({before['blacklisted_expired']} expired)"
+        )
+        if 'deleted' in result:
+            deleted = result['deleted']
+            self.stdout.write(self.style.SUCCESS(
+                f"Deleted {deleted['outstanding']} outstanding and {deleted['blacklisted']} blacklisted tokens."
+            ))
@@ -0,0 +1,90 @@
+"""
+Convert accounts_auditlog into a table range-partitioned by month on PostgreSQL.
+
+The logical schema is unchanged, so Django's migration state is untouched and
+other database backends skip this migration. The primary key becomes
+(id, timestamp) because PostgreSQL requires the partition key in every unique
+constraint; ids still come from a single sequence and stay unique.
+"""
+import datetime
+
+from django.db import migrations
+
+TABLE = 'accounts_auditlog'
+LEGACY = 'accounts_auditlog_legacy'
+MONTHS_AHEAD = 3
+
+
+def _month_start(value):
+    return datetime.datetime(value.year, value.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def _next_month(value):
+    return _month_start(value + datetime.timedelta(days=32))
+
+
+def partition_auditlog(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {LEGACY}')
+        cursor.execute(f'''
+            CREATE TABLE {TABLE} (
+                id bigint NOT NULL,
+                event_type varchar(50) NOT NULL,
+                ip_address inet NULL,
+                user_agent text NULL,
+                metadata jsonb NOT NULL,
+                "timestamp" timestamp with time zone NOT NULL,
+                user_id uuid NULL
+            ) PARTITION BY RANGE ("timestamp")
+        ''')
+        cursor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cursor.execute(f'SELECT min("timestamp"), max(id) FROM {LEGACY}')
+        oldest, max_id = cursor.fetchone()
+        month = _month_start(oldest or now)
+        last = _month_start(now)
+        for _ in range(MONTHS_AHEAD):
+            last = _next_month(last)
+        while month <= last:
+            following = _next_month(month)
+            cursor.execute(
+                f'CREATE TABLE {TABLE}_p{month:%Y%m} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)',
+                [month, following],
+            )
+            month = following
+
+        cursor.execute(f'''
+            INSERT INTO {TABLE} (id, event_type, ip_address, user_agent, metadata, "timestamp", user_id)
+            SELECT id, event_type, ip_address, user_agent, metadata, "timestamp", user_id FROM {LEGACY}
+        ''')
+        # Dropping the legacy table also drops its identity sequence and
+        # index names, which the new table then takes over.
+        cursor.execute(f'DROP TABLE {LEGACY}')
+
+        cursor.execute(f'CREATE SEQUENCE {TABLE}_id_seq START WITH %s OWNED BY {TABLE}.id', [(max_id or 0) + 1])
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')")
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, "timestamp")')
+        cursor.execute(f'CREATE INDEX accounts_au_user_id_d4cccd_idx ON {TABLE} (user_id, "timestamp")')
+        cursor.execute(f'CREATE INDEX accounts_au_event_t_f4e985_idx ON {TABLE} (event_type, "timestamp")')
+        cursor.execute(f'''
+            ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_user_id_fk_accounts_customuser_id
+            FOREIGN KEY (user_id) REFERENCES accounts_customuser (id) DEFERRABLE INITIALLY DEFERRED
+        ''')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_auditlog_event_time'),
+    ]
+
+    operations = [
+        # Reversing leaves the partitioned table in place; it is
+        # interchangeable with the plain one as far as Django is concerned.
+        migrations.RunPython(partition_auditlog, migrations.RunPython.noop),
+    ]
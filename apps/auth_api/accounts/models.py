@@ -87,6 +87,8 @@ class AuditLog(models.Model):
         ('register', 'Registration'),
         ('password_change', 'Password Change'),
         ('password_reset', 'Password Reset'),
+        ('token_refresh', 'Token Refresh'),
+        ('login_failed', 'Failed Login'),
     )
     
     user = models.ForeignKey(
@@ -100,7 +102,8 @@ class AuditLog(models.Model):
     ip_address = models.GenericIPAddressField(_('IP address'), blank=True, null=True)
     user_agent = models.TextField(_('user agent'), blank=True, null=True)
     metadata = models.JSONField(_('metadata'), default=dict, blank=True)
-    timestamp = models.DateTimeField(_('timestamp'), auto_now_add=True)
+    # Set when the event happens, not when the batched writer flushes it
+    timestamp = models.DateTimeField(_('timestamp'), default=timezone.now)
     
     class Meta:
         verbose_name = _('audit log')
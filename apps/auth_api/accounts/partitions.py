@@ -0,0 +1,188 @@
+"""
+Monthly buckets for ``AuditLog``.
+
+On PostgreSQL ``accounts_auditlog`` is range-partitioned on ``timestamp`` with
+one partition per calendar month (``accounts_auditlog_p202610``) and a default
+partition for anything outside the prepared range. PostgreSQL routes inserts
+by timestamp and queries against ``AuditLog`` see a single logical table, so
+application code is unchanged. ``ensure_partitions`` also creates the
+partition of every month found in the default partition and moves those rows
+into it, so backdated or early rows end up in their month and expire with
+it. Expiring a month drops its partition, which costs the same whether it
+holds a thousand rows or a hundred million.
+
+Other backends (SQLite in development) keep one plain table. A bucket is then
+just a month's range of rows and is removed with chunked DELETEs.
+"""
+import datetime
+from dataclasses import dataclass
+
+from django.db import connections, transaction
+
+from .models import AuditLog
+
+TABLE = AuditLog._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+
+@dataclass(frozen=True, order=True)
+class Bucket:
+    """One calendar month of audit history (UTC)"""
+    year: int
+    month: int
+
+    @classmethod
+    def for_datetime(cls, value):
+        value = value.astimezone(datetime.timezone.utc)
+        return cls(value.year, value.month)
+
+    @classmethod
+    def from_partition_name(cls, name):
+        suffix = name.rsplit('_p', 1)[-1]
+        return cls(int(suffix[:4]), int(suffix[4:6]))
+
+    @property
+    def label(self):
+        return f'{self.year:04d}-{self.month:02d}'
+
+    @property
+    def partition_name(self):
+        return f'{TABLE}_p{self.year:04d}{self.month:02d}'
+
+    @property
+    def start(self):
+        return datetime.datetime(self.year, self.month, 1, tzinfo=datetime.timezone.utc)
+
+    @property
+    def end(self):
+        return self.shift(1).start
+
+    def shift(self, months):
+        index = self.year * 12 + (self.month - 1) + months
+        return Bucket(index // 12, index % 12 + 1)
+
+
+def is_partitioned(using='default'):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass',
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def create_partition(bucket, using='default'):
+    """
+    Create the partition for ``bucket`` if it is missing. Rows that already
+    landed in the default partition for that month are moved into it.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [bucket.partition_name])
+        if cursor.fetchone()[0] is not None:
+            return False
+
+        cursor.execute(
+            f'SELECT 1 FROM {qn(DEFAULT_PARTITION)} WHERE "timestamp" >= %s AND "timestamp" < %s LIMIT 1',
+            [bucket.start, bucket.end],
+        )
+        stray_rows = cursor.fetchone() is not None
+        if stray_rows:
+            cursor.execute(f'ALTER TABLE {qn(TABLE)} DETACH PARTITION {qn(DEFAULT_PARTITION)}')
+
+        cursor.execute(
+            f'CREATE TABLE {qn(bucket.partition_name)} PARTITION OF {qn(TABLE)} '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            [bucket.start, bucket.end],
+        )
+
+        if stray_rows:
+            cursor.execute(
+                f'INSERT INTO {qn(TABLE)} SELECT * FROM {qn(DEFAULT_PARTITION)} '
+                f'WHERE "timestamp" >= %s AND "timestamp" < %s',
+                [bucket.start, bucket.end],
+            )
+            cursor.execute(
+                f'DELETE FROM {qn(DEFAULT_PARTITION)} WHERE "timestamp" >= %s AND "timestamp" < %s',
+                [bucket.start, bucket.end],
+            )
+            cursor.execute(f'ALTER TABLE {qn(TABLE)} ATTACH PARTITION {qn(DEFAULT_PARTITION)} DEFAULT')
+    return True
+
+
+def default_buckets(using='default'):
+    """Months that have rows in the default partition, oldest first"""
+    qn = connections[using].ops.quote_name
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', \"timestamp\" AT TIME ZONE 'UTC') FROM {qn(DEFAULT_PARTITION)}"
+        )
+        return sorted(Bucket(month.year, month.month) for (month,) in cursor.fetchall())
+
+
+def ensure_partitions(start, months_ahead=3, using='default'):
+    """
+    Create partitions from the bucket of ``start`` up to ``months_ahead``
+    months later, and for every month stranded in the default partition.
+    """
+    if not is_partitioned(using):
+        return []
+    first = Bucket.for_datetime(start)
+    wanted = {first.shift(offset) for offset in range(months_ahead + 1)}
+    wanted.update(default_buckets(using))
+    return [bucket for bucket in sorted(wanted) if create_partition(bucket, using)]
+
+
+def list_buckets(using='default'):
+    """Buckets currently holding (or prepared to hold) audit rows, oldest first"""
+    if is_partitioned(using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                'SELECT child.relname FROM pg_inherits '
+                'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+                'WHERE pg_inherits.inhparent = %s::regclass AND child.relname <> %s',
+                [TABLE, DEFAULT_PARTITION],
+            )
+            return sorted(Bucket.from_partition_name(name) for (name,) in cursor.fetchall())
+
+    months = AuditLog.objects.using(using).dates('timestamp', 'month')
+    return sorted(Bucket(month.year, month.month) for month in months)
+
+
+def expired_buckets(retention_months, now, using='default'):
+    """Buckets that end before the retention cut-off"""
+    cutoff = Bucket.for_datetime(now).shift(-retention_months)
+    return [bucket for bucket in list_buckets(using) if bucket < cutoff]
+
+
+def bucket_rows(bucket, using='default'):
+    """All rows of ``bucket``; partition pruning keeps this to one partition"""
+    return (
+        AuditLog.objects.using(using)
+        .filter(timestamp__gte=bucket.start, timestamp__lt=bucket.end)
+        .order_by('timestamp', 'id')
+    )
+
+
+def drop_bucket(bucket, using='default', chunk_size=5000):
+    """Remove every row of ``bucket``"""
+    if is_partitioned(using):
+        qn = connections[using].ops.quote_name
+        with transaction.atomic(using=using), connections[using].cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {qn(bucket.partition_name)}')
+            cursor.execute(
+                f'DELETE FROM {qn(DEFAULT_PARTITION)} WHERE "timestamp" >= %s AND "timestamp" < %s',
+                [bucket.start, bucket.end],
+            )
+        return
+
+    rows = bucket_rows(bucket, using)
+    while True:
+        ids = list(rows.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return
+        AuditLog.objects.using(using).filter(id__in=ids).delete()
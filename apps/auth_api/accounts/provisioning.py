@@ -0,0 +1,163 @@
+"""
+Bulk user provisioning.
+
+A batch (parsed from CSV or JSON) is validated row by row like registration,
+checked for duplicates against itself and the database with one query, then
+inserted with chunked ``bulk_create`` together with role assignments and
+Zendesk profiles. Passwords are hashed in a process pool. Invalid rows are
+reported and skipped; valid rows are created in a single transaction.
+"""
+import csv
+import io
+import json
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from apps.auth_api.roles.models import Role, UserRole
+from apps.sunkinghub.zendesk_agents.models import ZendeskProfile
+from apps.sunkinghub.zendesk_agents.querysets import invalidate_profiles
+from .audit import record_event
+from .hashing import hash_passwords
+from .models import CustomUser
+from .serializers import BulkUserRowSerializer
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def parse_csv(stream):
+    """Rows from a CSV file object (text or bytes); ``roles`` is ``;``-separated"""
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    rows = []
+    for record in csv.DictReader(stream):
+        row = {key.strip(): value.strip() for key, value in record.items() if key and value and value.strip()}
+        if 'roles' in row:
+            row['roles'] = [code.strip() for code in row['roles'].split(';') if code.strip()]
+        rows.append(row)
+    return rows
+
+
+def parse_json(stream):
+    data = json.load(stream)
+    return data['users'] if isinstance(data, dict) else data
+
+
+def _validate(rows):
+    """Split rows into ``(index, validated_data)`` pairs and error entries"""
+    valid, errors = [], []
+    for index, row in enumerate(rows, start=1):
+        serializer = BulkUserRowSerializer(data=row)
+        if serializer.is_valid():
+            data = serializer.validated_data
+            data['email'] = CustomUser.objects.normalize_email(data['email'])
+            valid.append((index, data))
+        else:
+            errors.append({'row': index, 'errors': serializer.errors})
+    return valid, errors
+
+
+def _check_conflicts(valid):
+    """Reject rows clashing with each other or with existing users, and unknown roles"""
+    emails = {data['email'] for _, data in valid}
+    employee_ids = {data['employee_id'] for _, data in valid}
+    taken = CustomUser.objects.filter(Q(email__in=emails) | Q(employee_id__in=employee_ids))
+    taken_emails, taken_employee_ids = set(), set()
+    for email, employee_id in taken.values_list('email', 'employee_id'):
+        taken_emails.add(email)
+        taken_employee_ids.add(employee_id)
+
+    role_codes = {code for _, data in valid for code in data['roles']}
+    roles = {role.code: role for role in Role.objects.filter(code__in=role_codes, is_active=True)}
+
+    accepted, errors = [], []
+    batch_emails, batch_employee_ids = set(), set()
+    for index, data in valid:
+        row_errors = {}
+        if data['email'] in taken_emails:
+            row_errors['email'] = ['A user with this email already exists.']
+        elif data['email'] in batch_emails:
+            row_errors['email'] = ['Duplicate of an earlier row.']
+        if data['employee_id'] in taken_employee_ids:
+            row_errors['employee_id'] = ['A user with this employee id already exists.']
+        elif data['employee_id'] in batch_employee_ids:
+            row_errors['employee_id'] = ['Duplicate of an earlier row.']
+        unknown = [code for code in data['roles'] if code not in roles]
+        if unknown:
+            row_errors['roles'] = [f"Unknown or inactive role: {code}" for code in unknown]
+
+        if row_errors:
+            errors.append({'row': index, 'errors': row_errors})
+            continue
+        batch_emails.add(data['email'])
+        batch_employee_ids.add(data['employee_id'])
+        accepted.append((index, data))
+    return accepted, errors, roles
+
+
+def provision_users(rows, assigned_by=None, dry_run=False, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Create users from ``rows`` (dicts shaped like ``BulkUserRowSerializer``)
+    and return a report with the created count and per-row errors.
+    """
+    valid, errors = _validate(rows)
+    accepted, conflict_errors, roles = _check_conflicts(valid) if valid else ([], [], {})
+    errors = sorted(errors + conflict_errors, key=lambda error: error['row'])
+
+    report = {
+        'total': len(rows),
+        'created': 0,
+        'failed': len(errors),
+        'dry_run': dry_run,
+        'errors': errors,
+    }
+    if dry_run or not accepted:
+        report['created'] = len(accepted) if dry_run else 0
+        return report
+
+    hashes = hash_passwords([data['password'] for _, data in accepted], workers=workers)
+
+    users, user_roles, profiles = [], [], []
+    for (_, data), password_hash in zip(accepted, hashes):
+        user = CustomUser(
+            email=data['email'],
+            password=password_hash,
+            first_name=data['first_name'],
+            last_name=data['last_name'],
+            employee_id=data['employee_id'],
+            country=data['country'],
+        )
+        users.append(user)
+        user_roles.extend(
+            UserRole(user=user, role=roles[code], assigned_by=assigned_by) for code in dict.fromkeys(data['roles'])
+        )
+        if 'zendesk_employee_id' in data or 'zendesk_username' in data:
+            profile = ZendeskProfile(
+                user=user,
+                employee_id=data.get('zendesk_employee_id', data['employee_id'])[:20],
+                role=data.get('zendesk_role', 'Agent'),
+                country=data.get('zendesk_country', data['country']),
+                username=data.get('zendesk_username'),
+            )
+            profile.normalize_fields()
+            profiles.append(profile)
+
+    try:
+        with transaction.atomic():
+            CustomUser.objects.bulk_create(users, batch_size=chunk_size)
+            UserRole.objects.bulk_create(user_roles, batch_size=chunk_size)
+            ZendeskProfile.objects.bulk_create(profiles, batch_size=chunk_size)
+            if profiles:
+                invalidate_profiles()
+    except IntegrityError:
+        # Another request created one of these users after our check.
+        report['failed'] += len(accepted)
+        report['errors'].append({'row': None, 'errors': {'non_field_errors': [
+            'Batch conflicted with concurrent changes; nothing was created. Please retry.'
+        ]}})
+        return report
+
+    for user in users:
+        record_event('register', user=user, method='bulk', assigned_by=str(assigned_by.pk) if assigned_by else None)
+    report['created'] = len(users)
+    return report
@@ -0,0 +1,48 @@
+from django.db.models import Exists, OuterRef, Prefetch
+from rest_framework import serializers
+
+from apps.auth_api.roles.models import UserRole
+
+TRUE_VALUES = {'1', 'true', 'yes'}
+FALSE_VALUES = {'0', 'false', 'no'}
+
+
+def with_roles_and_profile(queryset):
+    """
+    Load what ``UserSerializer`` renders in a constant number of queries:
+    the Zendesk profile is joined and active roles are prefetched into
+    ``active_user_roles``.
+    """
+    return queryset.select_related('zendesk_agent').prefetch_related(
+        Prefetch(
+            'user_roles',
+            queryset=UserRole.objects.filter(is_active=True).select_related('role'),
+            to_attr='active_user_roles',
+        )
+    )
+
+
+def parse_bool(value, field):
+    value = value.strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise serializers.ValidationError({field: ['Expected true or false.']})
+
+
+def filter_users(queryset, params):
+    """Apply the optional ``country``, ``is_active`` and ``role`` (code) filters"""
+    country = params.get('country')
+    is_active = params.get('is_active')
+    role = params.get('role')
+
+    if country:
+        queryset = queryset.filter(country__iexact=country)
+    if is_active:
+        queryset = queryset.filter(is_active=parse_bool(is_active, 'is_active'))
+    if role:
+        queryset = queryset.filter(
+            Exists(UserRole.objects.filter(user=OuterRef('pk'), role__code=role, is_active=True))
+        )
+    return queryset
@@ -0,0 +1,57 @@
+"""
+Serializer-free read path for users.
+
+``user_values`` selects a user's columns and its Zendesk profile (joined) as
+flat rows; ``users_data`` adds the active roles with one more query and
+returns exactly the data ``UserSerializer`` (or ``UserDetailSerializer``)
+renders. Views paginate the rows, so a page costs two queries and no model
+instances. The serializers remain the reference for the parity tests.
+"""
+from apps.auth_api.roles.readers import active_roles_by_user
+from apps.sunkinghub.zendesk_agents.readers import profile_data
+from configs.readers import datetime_formatter
+
+USER_FIELDS = ('id', 'email', 'first_name', 'last_name', 'employee_id', 'country')
+DETAIL_FIELDS = USER_FIELDS + ('is_staff', 'is_superuser')
+PROFILE_COLUMNS = tuple(
+    f'zendesk_agent__{name}' for name in ('id', 'employee_id', 'role', 'country', 'username', 'created_at')
+)
+
+
+def user_values(queryset, detail=False):
+    """``queryset`` as the rows ``users_data`` takes"""
+    return queryset.prefetch_related(None).values(*(DETAIL_FIELDS if detail else USER_FIELDS), *PROFILE_COLUMNS)
+
+
+def users_data(rows, detail=False):
+    """Data of ``UserSerializer(many=True)``, or ``UserDetailSerializer`` with ``detail``"""
+    roles = active_roles_by_user([row['id'] for row in rows])
+    format_datetime = datetime_formatter()
+    data = []
+    for row in rows:
+        user_id = str(row['id'])
+        item = {
+            'id': user_id,
+            'email': row['email'],
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'employee_id': row['employee_id'],
+            'country': row['country'],
+            'zendesk_profile': None,
+            'roles': roles[row['id']],
+        }
+        profile = [row[column] for column in PROFILE_COLUMNS]
+        if profile[0] is not None:
+            minimal_user = {key: item[key] for key in ('id', 'email', 'first_name', 'last_name')}
+            item['zendesk_profile'] = profile_data(profile[0], minimal_user, *profile[1:], format_datetime)
+        if detail:
+            item['is_staff'] = row['is_staff']
+            item['is_superuser'] = row['is_superuser']
+        data.append(item)
+    return data
+
+
+def user_data(queryset, detail=False):
+    """``users_data`` of the single user in ``queryset``, or ``None``"""
+    rows = list(user_values(queryset, detail))
+    return users_data(rows, detail)[0] if rows else None
@@ -0,0 +1,13 @@
+"""
+drf-spectacular extensions for the accounts authenticators.
+
+``CachedJWTAuthentication`` subclasses simplejwt's ``JWTAuthentication``,
+which drf-spectacular only recognises by exact class. Without this extension
+the schema loses its ``jwtAuth`` security scheme. Imported by
+``AccountsConfig.ready()``; defining the class registers it.
+"""
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    target_class = 'apps.auth_api.accounts.authentication.CachedJWTAuthentication'
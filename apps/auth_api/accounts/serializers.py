@@ -1,9 +1,19 @@
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+    TokenVerifySerializer,
+)
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import UntypedToken
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth import get_user_model
 
 from apps.sunkinghub.zendesk_agents.serializers import ZendeskProfileSerializer
 from apps.auth_api.roles.serializers import SimpleRoleSerializer
+from .authentication import TOKEN_USER_CLAIMS
+from .blacklist import FilteredRefreshToken, is_blacklisted
 
 
 User = get_user_model() 
@@ -58,10 +68,60 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return user
 
 
+class BulkUserRowSerializer(UserRegistrationSerializer):
+    """
+    One row of a bulk provisioning batch.
+    Validated like registration, except that uniqueness is checked for the
+    whole batch at once and password2 is optional.
+    """
+
+    password2 = serializers.CharField(
+        write_only=True,
+        required=False,
+        help_text="Confirm password. Defaults to password."
+    )
+    roles = serializers.ListField(
+        child=serializers.SlugField(),
+        required=False,
+        default=list,
+        help_text="Codes of active roles to assign"
+    )
+    zendesk_employee_id = serializers.CharField(
+        max_length=20,
+        required=False,
+        help_text="Zendesk agent id; creates a Zendesk profile when given"
+    )
+    zendesk_username = serializers.CharField(max_length=50, required=False)
+    zendesk_role = serializers.CharField(max_length=100, required=False)
+    zendesk_country = serializers.CharField(max_length=200, required=False)
+
+    class Meta(UserRegistrationSerializer.Meta):
+        fields = UserRegistrationSerializer.Meta.fields + [
+            'roles',
+            'zendesk_employee_id',
+            'zendesk_username',
+            'zendesk_role',
+            'zendesk_country',
+        ]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for name in ('email', 'employee_id'):
+            fields[name].validators = [
+                validator for validator in fields[name].validators
+                if not isinstance(validator, UniqueValidator)
+            ]
+        return fields
+
+    def validate(self, attrs: dict) -> dict:
+        attrs.setdefault('password2', attrs['password'])
+        return super().validate(attrs)
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for user data in response"""
 
-    zendesk_profile = ZendeskProfileSerializer(read_only=True)
+    zendesk_profile = ZendeskProfileSerializer(source='zendesk_agent', read_only=True, allow_null=True)
     roles = serializers.SerializerMethodField()
 
     class Meta:
@@ -79,7 +139,11 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
     def get_roles(self, obj):
-        role_objs = [ur.role for ur in obj.user_roles.select_related("role").filter(is_active=True)]
+        # Prefetched by querysets.with_roles_and_profile on list endpoints
+        user_roles = getattr(obj, 'active_user_roles', None)
+        if user_roles is None:
+            user_roles = obj.user_roles.select_related("role").filter(is_active=True)
+        role_objs = [ur.role for ur in user_roles]
         return SimpleRoleSerializer(role_objs, many=True).data
         
         
@@ -98,3 +162,29 @@ class GoogleAutoResponseSerializer(serializers.Serializer):
 class LogoutSerializer(serializers.Serializer):
     refresh_token = serializers.CharField()
 
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Token pair carrying the user claims needed by stateless authentication"""
+    token_class = FilteredRefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for claim in TOKEN_USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh with the blacklist check going through the in-memory filter"""
+    token_class = FilteredRefreshToken
+
+
+class FilteredTokenVerifySerializer(TokenVerifySerializer):
+    """Verify with the blacklist check going through the in-memory filter"""
+
+    def validate(self, attrs):
+        token = UntypedToken(attrs["token"])
+        if jwt_settings.BLACKLIST_AFTER_ROTATION and is_blacklisted(token.get(jwt_settings.JTI_CLAIM)):
+            raise serializers.ValidationError("Token is blacklisted")
+        return {}
@@ -0,0 +1,59 @@
+from django.contrib.auth.signals import user_login_failed
+from django.db.models.signals import post_delete, post_save
+from django.db import transaction
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from apps.sunkinghub.zendesk_agents.models import ZendeskProfile
+from apps.sunkinghub.zendesk_agents.querysets import invalidate_profiles
+
+from .audit import record_event
+from .authentication import invalidate_user
+from .blacklist import mark_blacklisted
+from .freshness import invalidate_user_profile
+from .lockout import record_failure, sync_lock
+from .models import CustomUser
+
+
+@receiver(user_login_failed)
+def audit_failed_login(sender, credentials, request=None, **kwargs):
+    # credentials are already scrubbed of the password by authenticate()
+    record_event('login_failed', request, email=credentials.get('email') or credentials.get('username'))
+
+
+@receiver(user_login_failed)
+def count_failed_login(sender, credentials, request=None, **kwargs):
+    record_failure(credentials.get('email') or credentials.get('username'))
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_cached_user(sender, instance, update_fields=None, **kwargs):
+    # login() touches last_login on every session login; nothing cached depends on it
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    invalidate_user(instance.pk, is_active=instance.is_active, password=instance.password)
+
+
+@receiver(post_save, sender=CustomUser)
+def sync_account_lock(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'account_locked_until' in update_fields:
+        transaction.on_commit(lambda: sync_lock(instance))
+
+
+@receiver(post_delete, sender=CustomUser)
+def invalidate_deleted_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk, is_active=False)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def publish_blacklisted_token(sender, instance, created, **kwargs):
+    if created:
+        token = instance.token
+        transaction.on_commit(lambda: mark_blacklisted(token.jti, token.expires_at))
+
+
+@receiver(post_save, sender=ZendeskProfile)
+@receiver(post_delete, sender=ZendeskProfile)
+def zendesk_profile_changed(sender, instance, **kwargs):
+    invalidate_user_profile(instance.user_id)
+    invalidate_profiles()
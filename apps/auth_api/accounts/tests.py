@@ -1,3 +1,961 @@
-from django.test import TestCase
+import contextlib
+import datetime
+import decimal
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+import uuid
+from collections import OrderedDict
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import get_hasher, identify_hasher
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from drf_spectacular.drainage import GENERATOR_STATS
+from drf_spectacular.generators import SchemaGenerator
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from apps.auth_api.roles.models import Role, UserRole
+from apps.sunkinghub.zendesk_agents.models import ZendeskProfile
+from apps.tooling.google_stub import GoogleCertsStub
+from configs import db_routers, metrics
+from configs.db_routers import PrimaryReplicaRouter, ReplicaHealth, primary_reads
+from configs.pagination import KeysetPagination
+from configs.renderers import OrjsonParser, OrjsonRenderer, iter_json_array
+from . import lockout, partitions, views
+from .audit import AuditLogWriter, record_event
+from .authentication import CachedJWTAuthentication, get_user_cache
+from .blacklist import TABLE_STATS_KEY, FilteredRefreshToken, get_blacklist_filter, is_blacklisted
+from .checks import check_shared_cache
+from .hashers import PooledPBKDF2PasswordHasher
+from .hashing import get_hashing_pool
+from .lockout import failure_count, locked_until
+from .models import AuditLog, CustomUser
+from .provisioning import parse_csv, provision_users
+from .querysets import with_roles_and_profile
+from .readers import user_data, user_values, users_data
+from .serializers import ClaimsTokenObtainPairSerializer, UserDetailSerializer, UserSerializer
+
+
+def render(data):
+    return JSONRenderer().render(data)
+
+
+class UserReaderParityTests(TestCase):
+    """The values() read path renders the same JSON as the user serializers"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(
+            email='admin@example.com', password=None, is_staff=True, is_superuser=True, employee_id='A1',
+        )
+        cls.member = CustomUser.objects.create_user(
+            email='member@example.com', password=None, first_name='Mem', last_name='Ber',
+            employee_id='M1', country='KE',
+        )
+        CustomUser.objects.create_user(email='bare@example.com', password=None)
+        ZendeskProfile.objects.create(user=cls.member, employee_id='ZD1', country='KE', username='mem.ber')
+        agent = Role.objects.create(name='Agent', code='agent', category='support')
+        lead = Role.objects.create(name='Lead', code='lead', category='support', description='Team lead')
+        UserRole.objects.create(user=cls.member, role=agent)
+        UserRole.objects.create(user=cls.member, role=lead)
+        UserRole.objects.create(user=cls.admin, role=lead, is_active=False)
+
+    def users(self):
+        return with_roles_and_profile(CustomUser.objects.order_by('email'))
+
+    def test_rows_match_serializers(self):
+        for serializer_class, detail in ((UserSerializer, False), (UserDetailSerializer, True)):
+            with self.subTest(serializer=serializer_class.__name__):
+                expected = serializer_class(self.users(), many=True).data
+                rows = list(user_values(self.users(), detail=detail))
+                self.assertEqual(render(users_data(rows, detail=detail)), render(expected))
+
+    def test_single_user_matches_unprefetched_serializer(self):
+        expected = UserSerializer(CustomUser.objects.get(pk=self.member.pk)).data
+        self.assertEqual(render(user_data(CustomUser.objects.filter(pk=self.member.pk))), render(expected))
+        self.assertIsNone(user_data(CustomUser.objects.none()))
+
+    def test_endpoints_match_serializers(self):
+        admin, member = APIClient(), APIClient()
+        admin.force_authenticate(self.admin)
+        member.force_authenticate(self.member)
+
+        response = admin.get('/api/users/')
+        self.assertEqual(render(response.data['results']), render(UserDetailSerializer(self.users(), many=True).data))
+
+        response = admin.get(f'/api/users/{self.member.pk}/')
+        self.assertEqual(response.content, render(UserDetailSerializer(self.users().get(pk=self.member.pk)).data))
+
+        response = member.get(f'/api/users/{self.member.pk}/')
+        self.assertEqual(response.content, render(UserSerializer(self.users().get(pk=self.member.pk)).data))
+
+        response = member.get('/api/me/')
+        self.assertEqual(response.content, render(UserSerializer(self.users().get(pk=self.member.pk)).data))
+
+        response = admin.get(f'/api/users/{self.member.pk.hex[::-1]}/')
+        self.assertEqual(response.status_code, 404)
+
+
+class OrjsonRendererTests(SimpleTestCase):
+    """OrjsonRenderer and OrjsonParser agree with DRF's JSON classes, with and without orjson"""
+
+    payload = {
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'utc': datetime.datetime(2024, 1, 2, 3, 4, 5, 123456, tzinfo=datetime.timezone.utc),
+        'nairobi': datetime.datetime(2024, 1, 2, 3, 4, 5, tzinfo=datetime.timezone(datetime.timedelta(hours=3))),
+        'naive': datetime.datetime(2024, 1, 2, 3, 4, 5),
+        'date': datetime.date(2024, 1, 2),
+        'amount': decimal.Decimal('1.50'),
+        'label': gettext_lazy('Email'),
+        'text': 'caf\u00e9 \u2028 \u2029 \U0001f600',
+        'nested': [OrderedDict(b=1, a=None), (True, 1.5)],
+    }
+
+    def assertRendersLikeDRF(self, data, media_type=None, context=None):
+        self.assertEqual(
+            OrjsonRenderer().render(data, media_type, context),
+            JSONRenderer().render(data, media_type, context),
+        )
+
+    def test_renders_like_json_renderer(self):
+        self.assertRendersLikeDRF(self.payload)
+        self.assertRendersLikeDRF({'ascii': ['only', 1, None]})
+        self.assertRendersLikeDRF({'big': 2 ** 70, 1: 'non-string key'})
+        self.assertRendersLikeDRF(self.payload, 'application/json; indent=4')
+        self.assertEqual(OrjsonRenderer().render(None), b'')
+        with self.assertRaises(TypeError):
+            OrjsonRenderer().render({'unserializable': object()})
+
+    def test_without_orjson(self):
+        body = JSONRenderer().render(self.payload)
+        with mock.patch('configs.renderers.orjson', None):
+            self.assertEqual(OrjsonRenderer().render(self.payload), body)
+            self.assertEqual(OrjsonParser().parse(io.BytesIO(body)), json.loads(body))
+            self.assertEqual(b''.join(iter_json_array([self.payload] * 3, chunk_size=2)),
+                             JSONRenderer().render([self.payload] * 3))
+
+    def test_parses_like_json_parser(self):
+        body = JSONRenderer().render(self.payload)
+        self.assertEqual(OrjsonParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+        for invalid in (b'{"a": ', b'{"a": NaN}', b'\xff'):
+            with self.subTest(body=invalid), self.assertRaises(ParseError):
+                OrjsonParser().parse(io.BytesIO(invalid))
+
+    def test_iter_json_array(self):
+        for count in (0, 1, 5, 7):
+            items = [{'n': index, 'id': uuid.UUID(int=index)} for index in range(count)]
+            with self.subTest(count=count):
+                self.assertEqual(b''.join(iter_json_array(iter(items), chunk_size=2)), JSONRenderer().render(items))
+
+
+class UserExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(email='admin@example.com', password=None, is_staff=True)
+        member = CustomUser.objects.create_user(email='m\u00e9mber@example.com', password=None, country='KE')
+        ZendeskProfile.objects.create(user=member, employee_id='ZD1', username='member')
+
+    def export(self, export_format):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/api/users/export/', {'export_format': export_format})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_json_array_matches_ndjson(self):
+        records = [json.loads(line) for line in self.export('ndjson').splitlines()]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(json.loads(self.export('json')), records)
+
+    def command_export(self, export_format, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f'users.{export_format}')
+            stderr = io.StringIO()
+            call_command('export_users', format=export_format, output=path, chunk_size=1, stderr=stderr, **options)
+            with open(path, 'rb') as stream:
+                return stream.read(), stderr.getvalue()
+
+    def test_command_writes_every_format_as_the_endpoint_does(self):
+        for export_format in ('csv', 'ndjson', 'json'):
+            with self.subTest(export_format):
+                body, message = self.command_export(export_format)
+                self.assertEqual(body, self.export(export_format))
+                self.assertIn('Exported 2 users', message)
+        body, message = self.command_export('json', country='KE')
+        self.assertEqual([record['email'] for record in json.loads(body)], ['m\u00e9mber@example.com'])
+        self.assertIn('Exported 1 users', message)
+
+    def test_command_writes_to_its_stdout(self):
+        for export_format in ('csv', 'json'):
+            with self.subTest(export_format):
+                binary = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+                call_command('export_users', format=export_format, stdout=binary)
+                self.assertEqual(binary.buffer.getvalue(), self.export(export_format))
+
+                text = io.StringIO()
+                call_command('export_users', format=export_format, stdout=text)
+                self.assertEqual(text.getvalue(), self.export(export_format).decode())
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    def test_process_local_cache_fails_deploy_check(self):
+        errors = check_shared_cache(None)
+        self.assertEqual([error.id for error in errors], ['accounts.E001'])
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379/0',
+    }})
+    def test_shared_cache_passes(self):
+        self.assertEqual(check_shared_cache(None), [])
+
+
+class GoogleLoginTests(TestCase):
+    """Google ID tokens are verified against cached certificates; upstream failures are 503s"""
+
+    audience = 'tests.apps.googleusercontent.com'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = GoogleCertsStub().start()
+        cls.addClassCleanup(cls.stub.stop)
+
+    def setUp(self):
+        self.stub.status, self.stub.request_count = 200, 0
+        self.good_body = self.stub.body
+        self.addCleanup(setattr, self.stub, 'body', self.good_body)
+        # A fresh verifier (and certificate cache) per test
+        overrides = override_settings(
+            GOOGLE_CLIENT_ID=self.audience, GOOGLE_CERTS_URL=self.stub.url, AUDIT_LOG={'ASYNC': False},
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def login(self, token):
+        return APIClient().post('/api/auth/google/login/', {'id_token': token}, format='json')
+
+    def test_login_with_cached_certificates(self):
+        for _ in range(2):
+            response = self.login(self.stub.issue('agent@example.com', self.audience, given_name='Ada'))
+            self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(CustomUser.objects.get(email='agent@example.com').first_name, 'Ada')
+        self.assertEqual(self.stub.request_count, 1)
+
+    def test_invalid_tokens(self):
+        response = self.login(self.stub.issue('a@example.com', self.audience, iss='https://issuer.example.com'))
+        self.assertEqual((response.status_code, response.data['detail']), (400, 'Invalid Google token issuer'))
+        response = self.login(self.stub.issue('a@example.com', 'someone-else'))
+        self.assertEqual((response.status_code, response.data['detail']), (400, 'Invalid Google token'))
+        response = self.login(self.stub.issue('a@example.com', self.audience, email_verified=False))
+        self.assertEqual(response.status_code, 400)
+
+    def test_certificate_endpoint_failures_are_upstream_errors(self):
+        token = self.stub.issue('a@example.com', self.audience)
+        for body, status_code in ((b'<html>not json</html>', 200), (b'["not", "a", "mapping"]', 200),
+                                  (self.good_body, 500)):
+            self.stub.body, self.stub.status = body, status_code
+            with self.subTest(body=body, status=status_code), self.assertLogs(views.logger, 'ERROR'):
+                self.assertEqual(self.login(token).status_code, 503)
+        self.stub.status = 200
+        self.assertEqual(self.login(token).status_code, 200)
+
+
+    def test_async_login_matches_sync_login(self):
+        token = self.stub.issue('async@example.com', self.audience, given_name='Asa')
+        sync = self.login(token)
+        response = Client().post('/api/async/auth/google/login/', {'id_token': token}, content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        body = json.loads(response.content)
+        self.assertEqual(body['user'], sync.json()['user'])
+        self.assertEqual(response.content, OrjsonRenderer().render(body))
+
+        bad = self.stub.issue('async@example.com', 'someone-else')
+        response = Client().post('/api/async/auth/google/login/', {'id_token': bad}, content_type='application/json')
+        self.assertEqual((response.status_code, response.content), (400, self.login(bad).content))
+
+class UserListViewTests(TestCase):
+    """The user list costs a fixed number of queries and pages by cursor"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(email='admin@example.com', password=None, is_staff=True)
+        role = Role.objects.create(name='Agent', code='agent', category='support')
+        for index in range(20):
+            user = CustomUser.objects.create_user(
+                email=f'user{index:02d}@example.com', password=None, country='KE' if index % 2 else 'UG',
+                is_active=index != 3,
+            )
+            UserRole.objects.create(user=user, role=role)
+            if index % 3 == 0:
+                ZendeskProfile.objects.create(user=user, employee_id=f'ZD{index}')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def emails(self, response):
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['email'] for row in response.data['results']]
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.emails(self.client.get('/api/users/', {'page_size': 2}))), 2)
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.emails(self.client.get('/api/users/', {'page_size': 50}))), 21)
+
+    def test_cursor_walks_forwards_and_back(self):
+        everyone = sorted(CustomUser.objects.values_list('email', flat=True))
+        seen, url, pages = [], '/api/users/?page_size=6', []
+        while url:
+            response = self.client.get(url)
+            pages.append(self.emails(response))
+            seen += pages[-1]
+            url = response.data['next']
+        self.assertEqual(seen, everyone)
+
+        url = response.data['previous']
+        back = []
+        while url:
+            response = self.client.get(url)
+            back.insert(0, self.emails(response))
+            url = response.data['previous']
+        self.assertEqual(back, pages[:-1])
+
+    def test_filters_and_errors(self):
+        self.assertEqual(len(self.emails(self.client.get('/api/users/', {'country': 'ke'}))), 10)
+        self.assertEqual(len(self.emails(self.client.get('/api/users/', {'role': 'agent', 'is_active': 'false'}))), 1)
+        self.assertEqual(self.client.get('/api/users/', {'is_active': 'maybe'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/users/', {'cursor': 'garbage'}).status_code, 404)
+        response = self.client.get('/api/users/', {'count': 'true', 'country': 'UG'})
+        self.assertEqual(response.data['count'], 10)
+
+    def test_admin_only(self):
+        member = APIClient()
+        member.force_authenticate(CustomUser.objects.get(email='user01@example.com'))
+        self.assertEqual(member.get('/api/users/').status_code, 403)
+
+
+@override_settings(AUDIT_LOG={'ASYNC': False})
+class AuditEventTests(TestCase):
+    def test_inline_event(self):
+        user = CustomUser.objects.create_user(email='audited@example.com', password=None)
+        request = RequestFactory().get('/', HTTP_X_FORWARDED_FOR='203.0.113.9, 10.0.0.1',
+                                       HTTP_USER_AGENT='x' * 600)
+        record_event('login', request, user=user, method='password')
+        entry = AuditLog.objects.get(user=user)
+        self.assertEqual((entry.event_type, entry.ip_address, entry.metadata),
+                         ('login', '203.0.113.9', {'method': 'password'}))
+        self.assertEqual(len(entry.user_agent), 512)
+
+        record_event('login_failed', RequestFactory().get('/', REMOTE_ADDR='not-an-ip'))
+        self.assertIsNone(AuditLog.objects.get(event_type='login_failed').ip_address)
+
+
+class AuditLogWriterTests(TransactionTestCase):
+    def test_background_batches_are_flushed(self):
+        writer = AuditLogWriter(batch_size=3, flush_interval=0.05)
+        for _ in range(7):
+            self.assertTrue(writer.submit(AuditLog(event_type='token_refresh')))
+        writer.shutdown()
+        self.assertEqual(AuditLog.objects.filter(event_type='token_refresh').count(), 7)
+        self.assertEqual(writer.stats(), {'queue_depth': 0, 'enqueued': 7, 'dropped': 0, 'written': 7, 'failed': 0})
+
+
+def provision_row(number, **extra):
+    return {
+        'email': f'New.Hire{number}@Example.com', 'password': 'Sk-provision-2026',
+        'first_name': 'New', 'last_name': f'Hire {number}', 'employee_id': f'NH{number:03d}',
+        'country': 'KE', **extra,
+    }
+
+
+@override_settings(PASSWORD_HASHING={'WORKERS': 0, 'ITERATIONS': 1000}, AUDIT_LOG={'ASYNC': False})
+class ProvisioningTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(email='admin@example.com', password=None, is_staff=True)
+        CustomUser.objects.create_user(email='taken@example.com', password=None, employee_id='TAKEN')
+        Role.objects.create(name='Agent', code='agent', category='support')
+
+    def test_valid_rows_are_created_with_roles_and_profiles(self):
+        rows = [
+            provision_row(1, roles=['agent', 'agent'], zendesk_employee_id='ZD1', zendesk_username='New.Hire1'),
+            provision_row(2),
+        ]
+        report = provision_users(rows, assigned_by=self.admin, workers=2)
+        self.assertEqual((report['created'], report['failed'], report['errors']), (2, 0, []))
+
+        user = CustomUser.objects.get(email='New.Hire1@example.com')
+        self.assertTrue(user.check_password('Sk-provision-2026'))
+        self.assertEqual(list(user.user_roles.values_list('role__code', 'assigned_by')), [('agent', self.admin.pk)])
+        self.assertEqual((user.zendesk_agent.employee_id, user.zendesk_agent.role), ('ZD1', 'Agent'))
+        self.assertFalse(ZendeskProfile.objects.filter(user__email='New.Hire2@example.com').exists())
+        self.assertEqual(AuditLog.objects.filter(event_type='register', metadata__method='bulk').count(), 2)
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        rows = [
+            provision_row(1),
+            provision_row(2, email='taken@example.com'),
+            provision_row(3, employee_id='NH001'),
+            provision_row(4, roles=['ghost']),
+            provision_row(5, password2='mismatch'),
+            provision_row(6),
+        ]
+        with self.assertNumQueries(2):
+            report = provision_users(rows, dry_run=True)
+        self.assertEqual((report['total'], report['created'], report['failed']), (6, 2, 4))
+        self.assertEqual([error['row'] for error in report['errors']], [2, 3, 4, 5])
+        self.assertIn('employee_id', report['errors'][1]['errors'])
+        self.assertFalse(CustomUser.objects.filter(email__startswith='new.hire').exists())
+
+        report = provision_users(rows)
+        self.assertEqual(report['created'], 2)
+        self.assertEqual(CustomUser.objects.filter(employee_id__startswith='NH').count(), 2)
+
+    def test_csv_upload(self):
+        upload = io.BytesIO(
+            '\ufeffemail,password,first_name,last_name,employee_id,country,roles\n'
+            'csv@example.com,Sk-provision-2026,Csv,User,CSV1,UG,agent; \n'.encode()
+        )
+        self.assertEqual(parse_csv(io.BytesIO(upload.getvalue()))[0]['roles'], ['agent'])
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        upload.name = 'users.csv'
+        response = client.post('/api/users/bulk/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertTrue(UserRole.objects.filter(user__email='csv@example.com', role__code='agent').exists())
+        self.assertEqual(client.post('/api/users/bulk/', {'users': []}, format='json').status_code, 400)
+
+
+@override_settings(PASSWORD_HASHING={'WORKERS': 1, 'MAX_PENDING': 4, 'ITERATIONS': 1000},
+                   AUDIT_LOG={'ASYNC': False})
+class PooledHasherTests(TestCase):
+    def test_pool_hashes_and_verifies_pbkdf2_sha256(self):
+        self.addCleanup(lambda: get_hashing_pool().shutdown())
+        self.assertIsInstance(get_hasher('default'), PooledPBKDF2PasswordHasher)
+        self.assertIsInstance(get_hasher('pbkdf2_sha256'), PooledPBKDF2PasswordHasher)
+
+        user = CustomUser.objects.create_user(email='pooled@example.com', password='Sk-pooled-2026')
+        self.assertIsInstance(identify_hasher(user.password), PooledPBKDF2PasswordHasher)
+        self.assertEqual(get_hashing_pool().stats()['submitted'], 1)
+
+        response = APIClient().post('/api/auth/token/', {'email': 'pooled@example.com', 'password': 'Sk-pooled-2026'},
+                                    format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        stats = get_hashing_pool().stats()
+        self.assertEqual((stats['submitted'], stats['completed'], stats['inline']), (2, 2, 0))
+
+    def test_pool_processes_are_never_forked_from_the_worker(self):
+        pool = get_hashing_pool()
+        self.addCleanup(pool.shutdown)
+        self.assertIsNone(pool._executor)
+        self.assertIn(pool._get_executor()._mp_context.get_start_method(), ('forkserver', 'spawn'))
+
+
+@override_settings(JWT_USER_CACHE={'MAX_SIZE': 100, 'TTL': 60})
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='jwt@example.com', password=None, first_name='Jay')
+        self.request = self.request_for(self.user)
+        self.authentication = CachedJWTAuthentication()
+
+    def request_for(self, user):
+        token = ClaimsTokenObtainPairSerializer.get_token(user).access_token
+        return RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def authenticate(self):
+        return self.authentication.authenticate(self.request)[0]
+
+    def test_warm_requests_do_not_query(self):
+        with self.assertNumQueries(1):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        self.assertEqual(user, self.user)
+
+        # Copies are handed out, so request-local state never leaks back
+        user.first_name = 'Changed'
+        self.assertEqual(self.authenticate().first_name, 'Jay')
+        self.assertGreaterEqual(get_user_cache().stats()['hits'], 2)
+
+    def test_saving_the_user_invalidates_the_cached_copy(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Renamed'
+            self.user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate().first_name, 'Renamed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_async_authentication_shares_the_cache(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user, _ = async_to_sync(self.authentication.aauthenticate)(self.request)
+        self.assertEqual(user, self.user)
+
+    @override_settings(JWT_USER_CACHE={'STATELESS': True})
+    def test_stateless_users_come_from_the_token(self):
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        self.assertIsInstance(user, TokenUser)
+        self.assertEqual((user.id, user.email), (str(self.user.pk), 'jwt@example.com'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save(update_fields=['is_active'])
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def change_password(self):
+        """Change the password; return a request carrying a token issued afterwards"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('Sk-changed-2026')
+            self.user.save()
+        return self.request_for(self.user)
+
+    def assertRevoked(self, request):
+        with self.assertRaises(AuthenticationFailed) as caught:
+            self.authentication.authenticate(request)
+        self.assertEqual(caught.exception.detail['code'], 'password_changed')
+        with self.assertRaises(AuthenticationFailed):
+            async_to_sync(self.authentication.aauthenticate)(request)
+
+    def test_password_change_revokes_tokens_served_from_the_cache(self):
+        with mock.patch.object(jwt_settings, 'CHECK_REVOKE_TOKEN', True):
+            self.request = self.request_for(self.user)
+            self.authenticate()
+            fresh = self.change_password()
+            # The new token caches the user under the new stamp first
+            self.assertEqual(self.authentication.authenticate(fresh)[0], self.user)
+            self.assertRevoked(self.request)
+            self.assertEqual(async_to_sync(self.authentication.aauthenticate)(fresh)[0], self.user)
+
+    @override_settings(JWT_USER_CACHE={'STATELESS': True})
+    def test_password_change_revokes_stateless_tokens(self):
+        with mock.patch.object(jwt_settings, 'CHECK_REVOKE_TOKEN', True):
+            self.request = self.request_for(self.user)
+            self.authenticate()
+            fresh = self.change_password()
+            with self.assertNumQueries(0):
+                self.assertRevoked(self.request)
+                self.assertIsInstance(self.authentication.authenticate(fresh)[0], TokenUser)
+
+
+class SchemaTests(SimpleTestCase):
+    def test_jwt_security_scheme_is_documented(self):
+        with GENERATOR_STATS.silence():
+            schema = SchemaGenerator().get_schema(request=None, public=True)
+        self.assertIn('jwtAuth', schema['components']['securitySchemes'])
+        self.assertIn({'jwtAuth': []}, schema['paths']['/api/me/']['get']['security'])
+
+
+class BlacklistFilterTests(TestCase):
+    def setUp(self):
+        # A fresh filter per test, never reloaded on its own
+        override = override_settings(JWT_BLACKLIST_FILTER={'REFRESH_INTERVAL': 3600})
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = CustomUser.objects.create_user(email='tokens@example.com', password=None)
+
+    def test_clean_tokens_are_checked_in_memory(self):
+        revoked = FilteredRefreshToken.for_user(self.user)
+        revoked.blacklist()
+        token = FilteredRefreshToken.for_user(self.user)
+
+        self.assertTrue(is_blacklisted(revoked['jti']))
+        with self.assertNumQueries(0):
+            for _ in range(5):
+                self.assertFalse(is_blacklisted(token['jti']))
+        FilteredRefreshToken(str(token))
+        stats = get_blacklist_filter().stats()
+        self.assertEqual((stats['size'], stats['confirmed_hits'], stats['false_positives'], stats['reloads']),
+                         (1, 1, 0, 1))
+
+    def test_tokens_blacklisted_after_the_load_are_rejected(self):
+        token = FilteredRefreshToken.for_user(self.user)
+        self.assertFalse(is_blacklisted(token['jti']))
+        with self.captureOnCommitCallbacks(execute=True):
+            token.blacklist()
+        with self.assertRaises(TokenError):
+            FilteredRefreshToken(str(token))
+        self.assertEqual(get_blacklist_filter().stats()['reloads'], 1)
+
+    def test_only_new_rows_are_read_between_rebuilds(self):
+        blacklist = get_blacklist_filter()
+        self.assertFalse(is_blacklisted('unknown'))
+        revoked = FilteredRefreshToken.for_user(self.user)
+        revoked.blacklist()
+
+        blacklist.refresh_interval = 0
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(blacklist.might_contain(revoked['jti']))
+        self.assertEqual(len(queries), 1)
+        self.assertIn('"id" >', queries[0]['sql'])
+        with self.assertNumQueries(1):
+            blacklist.might_contain(revoked['jti'])
+        self.assertEqual(blacklist.stats()['reloads'], 1)
+
+        # Purged rows leave the set at the next rebuild
+        BlacklistedToken.objects.all().delete()
+        blacklist.full_reload_interval = 0
+        self.assertFalse(blacklist.might_contain(revoked['jti']))
+        self.assertEqual(blacklist.stats()['reloads'], 2)
+
+    def test_token_table_sizes_are_exported_once_per_scrape(self):
+        FilteredRefreshToken.for_user(self.user).blacklist()
+        FilteredRefreshToken.for_user(self.user)
+        admin = CustomUser.objects.create_user(email='scraper@example.com', password=None, is_staff=True)
+        cache.delete(TABLE_STATS_KEY)
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS={'DIR': directory}):
+            session = Client()
+            session.force_login(admin, backend='django.contrib.auth.backends.ModelBackend')
+            body = session.get('/metrics').content.decode()
+            self.assertIn('app_shared_stat{component="jwt_token_tables",stat="outstanding"} 2', body)
+            self.assertIn('app_shared_stat{component="jwt_token_tables",stat="blacklisted"} 1', body)
+            # Served from the shared cache until it expires
+            FilteredRefreshToken.for_user(self.user)
+            self.assertIn('stat="outstanding"} 2', session.get('/metrics').content.decode())
+
+    def test_purge_deletes_only_expired_tokens(self):
+        live = FilteredRefreshToken.for_user(self.user)
+        for _ in range(3):
+            FilteredRefreshToken.for_user(self.user).blacklist()
+        OutstandingToken.objects.exclude(jti=live['jti']).update(expires_at=timezone.now())
+
+        out = io.StringIO()
+        call_command('purge_jwt_tokens', chunk_size=2, json=True, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual(result['deleted'], {'outstanding': 3, 'blacklisted': 3})
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [live['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(email='admin@example.com', password=None, is_staff=True)
+        cls.user = CustomUser.objects.create_user(email='owner@example.com', password=None, first_name='Own')
+        cls.other = CustomUser.objects.create_user(email='other@example.com', password=None)
+        cls.role = Role.objects.create(name='Agent', code='agent', category='support')
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def assertRevalidates(self, client, url, etag):
+        with self.assertNumQueries(0):
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_me_answers_304_until_something_changes(self):
+        client = self.client_for(self.user)
+        response = client.get('/api/me/')
+        etag = response['ETag']
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('Last-Modified', response)
+        self.assertRevalidates(client, '/api/me/', etag)
+
+        changes = [
+            lambda: CustomUser.objects.get(pk=self.user.pk).save(),
+            lambda: UserRole.objects.create(user=self.user, role=self.role),
+            lambda: Role.objects.filter(pk=self.role.pk).first().save(),
+            lambda: ZendeskProfile.objects.create(user=self.user, employee_id='ZD9', country='KE'),
+        ]
+        for change in changes:
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            response = client.get('/api/me/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            etag = response['ETag']
+
+    def test_user_detail_validators(self):
+        url = f'/api/users/{self.user.pk}/'
+        owner = self.client_for(self.user)
+        etag = owner.get(url)['ETag']
+        self.assertRevalidates(owner, url, etag)
+
+        # Admins see a different representation, and strangers get no shortcut
+        admin = self.client_for(self.admin)
+        self.assertNotEqual(admin.get(url)['ETag'], etag)
+        self.assertEqual(self.client_for(self.other).get(url, HTTP_IF_NONE_MATCH=etag).status_code, 403)
+
+
+# Above the largest pid Linux hands out, so never a live process
+DEAD_PID = 4194400
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(email='admin@example.com', password=None, is_staff=True)
+        cls.user = CustomUser.objects.create_user(email='member@example.com', password=None)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.enterContext(override_settings(METRICS={'DIR': self.directory, 'TOKEN': None}))
+
+    def bearer(self, user):
+        return f'Bearer {ClaimsTokenObtainPairSerializer.get_token(user).access_token}'
+
+    def requests_total(self, client=None, **headers):
+        response = (client or Client()).get('/metrics', **headers)
+        self.assertEqual(response.status_code, 200)
+        line = next(line for line in response.content.decode().splitlines()
+                    if line.startswith('http_requests_total{') and 'view="dead"' in line)
+        return int(line.rsplit(' ', 1)[1])
+
+    def write_worker(self, pid, requests):
+        registry = metrics.MetricsRegistry(self.directory)
+        registry.inc('http_requests_total', requests, view='dead')
+        metrics._write_snapshot(metrics._snapshot_path(self.directory, pid), registry.snapshot())
+
+    def test_staff_only_without_a_token(self):
+        self.assertEqual(Client().get('/metrics').status_code, 403)
+        self.assertEqual(Client().get('/metrics', HTTP_AUTHORIZATION=self.bearer(self.user)).status_code, 403)
+        self.assertEqual(Client().get('/metrics', HTTP_AUTHORIZATION='Bearer nonsense').status_code, 403)
+        self.assertEqual(Client().get('/metrics', HTTP_AUTHORIZATION=self.bearer(self.admin)).status_code, 200)
+        session = Client()
+        session.force_login(self.admin, backend='django.contrib.auth.backends.ModelBackend')
+        self.assertEqual(session.get('/metrics').status_code, 200)
+
+    def test_configured_token_replaces_staff_access(self):
+        with override_settings(METRICS={'DIR': self.directory, 'TOKEN': 'scrape-secret'}):
+            self.assertEqual(Client().get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200)
+            self.assertEqual(Client().get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secreT').status_code, 403)
+            self.assertEqual(Client().get('/metrics', HTTP_AUTHORIZATION=self.bearer(self.admin)).status_code, 403)
+        with override_settings(METRICS={'ENABLED': False}):
+            self.assertEqual(Client().get('/metrics', HTTP_AUTHORIZATION=self.bearer(self.admin)).status_code, 404)
+
+    def test_dead_workers_are_folded_into_the_retired_totals(self):
+        auth = {'HTTP_AUTHORIZATION': self.bearer(self.admin)}
+        self.write_worker(DEAD_PID, 3)
+        self.write_worker(DEAD_PID + 1, 4)
+        self.assertEqual(self.requests_total(**auth), 7)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['.lock', 'metrics-retired.json'])
+
+        # A later worker reusing a dead pid adds to the totals instead of replacing them
+        self.write_worker(DEAD_PID, 5)
+        self.assertEqual(self.requests_total(**auth), 12)
+        self.assertEqual(self.requests_total(**auth), 12)
+
+    def test_reused_pid_of_this_process_is_retired_on_first_flush(self):
+        self.write_worker(os.getpid(), 6)
+        registry = metrics.get_registry()
+        registry.flush()
+        self.assertEqual(self.requests_total(HTTP_AUTHORIZATION=self.bearer(self.admin)), 6)
+
+    def test_gunicorn_hooks(self):
+        from configs import gunicorn
+
+        worker = mock.Mock(pid=DEAD_PID)
+        self.write_worker(DEAD_PID, 2)
+        gunicorn.child_exit(None, worker)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['.lock', 'metrics-retired.json'])
+        gunicorn.on_starting(None)
+        self.assertEqual(os.listdir(self.directory), ['.lock'])
+
+
+def route_reads_to_missing_replica():
+    """Send routed reads to an alias with no connection, so any that escape the primary fail"""
+    stack = contextlib.ExitStack()
+    stack.enter_context(override_settings(DB_REPLICAS={'ALIASES': ['replica']}))
+    stack.enter_context(mock.patch.object(PrimaryReplicaRouter, '_replicas', return_value=['replica']))
+    stack.enter_context(mock.patch.object(ReplicaHealth, 'is_healthy', return_value=True))
+    return stack
+
+
+class ReplicaRoutingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='reader@example.com', password=None)
+
+    def setUp(self):
+        self.addCleanup(route_reads_to_missing_replica().close)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_primary_reads_override_replica_routing(self):
+        router, request = PrimaryReplicaRouter(), RequestFactory().get('/')
+        request.user = self.user
+        token = db_routers._state.set(db_routers._ReadState(request, pinned=False))
+        self.addCleanup(db_routers._state.reset, token)
+        self.assertEqual(router.db_for_read(CustomUser), 'replica')
+        with primary_reads():
+            self.assertEqual(router.db_for_read(CustomUser), 'default')
+        self.assertEqual(router.db_for_read(CustomUser), 'replica')
+
+        # Counts are cached under a version stamp
+        view = type('View', (), {'count_version_key': 'test:users'})()
+        self.assertEqual(KeysetPagination().get_count(CustomUser.objects.all(), request, view), 1)
+
+    def test_validated_and_version_keyed_reads_come_from_the_primary(self):
+        self.assertEqual(self.client.get('/api/me/').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/users/{self.user.pk}/').status_code, 200)
+        self.assertFalse(self.user.has_perm('roles.view_role'))
+
+        self.client.force_authenticate(CustomUser.objects.create_user(
+            email='reader-admin@example.com', password=None, is_staff=True,
+        ))
+        cache.clear()
+        self.assertEqual(self.client.get('/api/roles/').status_code, 200)
+
+
+class AsyncMeViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='async-me@example.com', password=None, first_name='Élodie')
+        UserRole.objects.create(user=cls.user, role=Role.objects.create(name='Agent', code='agent', category='support'))
+        ZendeskProfile.objects.create(user=cls.user, employee_id='ZD7', country='KE', username='elodie')
+
+    def setUp(self):
+        token = ClaimsTokenObtainPairSerializer.get_token(self.user).access_token
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_same_bytes_and_validators_as_me(self):
+        sync, response = self.client.get('/api/me/'), self.client.get('/api/async/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, sync.content)
+        self.assertEqual((response['ETag'], response['Content-Type']), (sync['ETag'], sync['Content-Type']))
+
+        response = self.client.get('/api/async/me/', HTTP_IF_NONE_MATCH=sync['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_unauthenticated(self):
+        sync, response = Client().get('/api/me/'), Client().get('/api/async/me/')
+        self.assertEqual((response.status_code, response.content), (401, sync.content))
+        self.assertEqual(response['WWW-Authenticate'], sync['WWW-Authenticate'])
+
+
+@override_settings(
+    PASSWORD_HASHING={'WORKERS': 0, 'ITERATIONS': 1000}, AUDIT_LOG={'ASYNC': False},
+    ACCOUNT_LOCKOUT={'MAX_ATTEMPTS': 3, 'WINDOW': 900, 'LOCK_MINUTES': 15},
+)
+class LockoutTests(TestCase):
+    email = 'locked@example.com'
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email=self.email, password='Sk-lockout-2026')
+
+    def login(self, password):
+        with self.captureOnCommitCallbacks(execute=True):
+            return APIClient().post('/api/auth/token/', {'email': self.email, 'password': password}, format='json')
+
+    def test_repeated_failures_lock_the_account(self):
+        with self.assertLogs(lockout.logger, 'WARNING'):
+            for _ in range(3):
+                self.assertEqual(self.login('wrong').status_code, 401)
+        response = self.login('Sk-lockout-2026')
+        self.assertEqual(response.status_code, 403)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.failed_login_attempts, 3)
+        self.assertTrue(self.user.is_account_locked)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.unlock_account()
+        self.assertIsNone(locked_until(self.email))
+        self.assertEqual(failure_count(self.email), 0)
+        self.assertEqual(self.login('Sk-lockout-2026').status_code, 200)
+
+    def test_saving_an_unlocked_user_keeps_the_failure_window(self):
+        for _ in range(2):
+            self.login('wrong')
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.get(pk=self.user.pk).save()
+        self.assertEqual(failure_count(self.email), 2)
+        with self.assertLogs(lockout.logger, 'WARNING'):
+            self.login('wrong')
+        self.assertIsNotNone(locked_until(self.email))
+
+    def test_successful_login_resets_the_counters(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(failed_login_attempts=2)
+        self.login('wrong')
+        self.assertEqual(self.login('Sk-lockout-2026').status_code, 200)
+        self.assertEqual(failure_count(self.email), 0)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.failed_login_attempts, 0)
+
+
+def at(year, month, day=15):
+    return datetime.datetime(year, month, day, 12, tzinfo=datetime.timezone.utc)
+
+
+class AuditBucketTests(TestCase):
+    def test_bucket_arithmetic(self):
+        bucket = partitions.Bucket.for_datetime(at(2026, 12))
+        self.assertEqual(bucket.shift(1), partitions.Bucket(2027, 1))
+        self.assertEqual(bucket.shift(-12).label, '2025-12')
+        self.assertEqual((bucket.start, bucket.end), (at(2026, 12, 1).replace(hour=0), at(2027, 1, 1).replace(hour=0)))
+        self.assertEqual(partitions.Bucket.from_partition_name(bucket.partition_name), bucket)
+
+    def test_expired_buckets_are_archived_and_dropped(self):
+        for month in (1, 2, 9):
+            AuditLog.objects.bulk_create(AuditLog(event_type='login', timestamp=at(2026, month)) for _ in range(3))
+
+        now = at(2026, 10)
+        self.assertEqual(partitions.expired_buckets(6, now), [partitions.Bucket(2026, 1), partitions.Bucket(2026, 2)])
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('archive_audit_logs', retention_months=6, output_dir=directory, chunk_size=2,
+                         stdout=io.StringIO())
+            with gzip.open(f'{directory}/auditlog-2026-01.ndjson.gz') as archive:
+                rows = [json.loads(line) for line in archive]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['event_type'], 'login')
+        self.assertEqual(list(AuditLog.objects.dates('timestamp', 'month')), [datetime.date(2026, 9, 1)])
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'AuditLog is only partitioned on PostgreSQL')
+class AuditPartitionTests(TestCase):
+    def partition_of(self, entry):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT tableoid::regclass::text FROM {partitions.TABLE} WHERE id = %s', [entry.id],
+            )
+            return cursor.fetchone()[0]
+
+    def test_default_rows_move_into_their_partition(self):
+        self.assertTrue(partitions.is_partitioned())
+        stray = AuditLog.objects.create(event_type='login', timestamp=at(2001, 5))
+        self.assertEqual(self.partition_of(stray), partitions.DEFAULT_PARTITION)
+        self.assertIn(partitions.Bucket(2001, 5), partitions.default_buckets())
+
+        created = partitions.ensure_partitions(at(2026, 10), months_ahead=0)
+        self.assertIn(partitions.Bucket(2001, 5), created)
+        self.assertEqual(self.partition_of(stray), partitions.Bucket(2001, 5).partition_name)
+        self.assertEqual(partitions.default_buckets(), [])
+        self.assertIn(partitions.Bucket(2001, 5), partitions.list_buckets())
+
+        partitions.drop_bucket(partitions.Bucket(2001, 5))
+        self.assertFalse(AuditLog.objects.filter(id=stray.id).exists())
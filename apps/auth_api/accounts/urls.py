@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import UserListView, UserDetailView
+from .views import UserListView, UserDetailView, UserExportView, BulkUserProvisionView
 
 urlpatterns = [
     path('users/', UserListView.as_view(), name='user-list'),
+    path('users/export/', UserExportView.as_view(), name='user-export'),
+    path('users/bulk/', BulkUserProvisionView.as_view(), name='user-bulk-provision'),
     path('users/<uuid:pk>/', UserDetailView.as_view(), name='user-detail'),
 ]
@@ -1,34 +1,81 @@
 import logging
 
-from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.translation import gettext as _
 
 from rest_framework import status, generics
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
+from rest_framework.parsers import MultiPartParser
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from dj_rest_auth.views import (
+    LoginView as RestAuthLoginView,
+    PasswordChangeView as RestAuthPasswordChangeView,
+    PasswordResetConfirmView as RestAuthPasswordResetConfirmView,
+)
 from drf_spectacular.utils import extend_schema
 
+from configs.db_routers import primary_reads
+from configs.http_cache import conditional_response, set_validators
+from configs.instrumentation import TimedAPIViewMixin, TimedGenericAPIViewMixin, phase
+from configs.pagination import KeysetPagination
+from configs.renderers import OrjsonParser
+
 from google.auth.exceptions import TransportError
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
 
+from .audit import record_event
+from .blacklist import FilteredRefreshToken
+from .exports import FORMATS, export_queryset, iter_export
+from .freshness import user_validators
+from .provisioning import parse_csv, provision_users
+from .google_auth import InvalidIssuerError, get_google_verifier, login_claims_error
+from .lockout import clear_failures, locked_until, retry_after
 from .permissions import IsAdmin, IsOwnerOrAdmin
 from .models import CustomUser
+from .querysets import filter_users, parse_bool, with_roles_and_profile
+from .readers import user_data, user_values, users_data
 from .serializers import (
     UserRegistrationSerializer, 
+    BulkUserRowSerializer,
     UserSerializer, 
     UserDetailSerializer, 
     GoogleTokenSerializer, 
     GoogleAutoResponseSerializer, 
-    LogoutSerializer
+    LogoutSerializer,
+    ClaimsTokenObtainPairSerializer,
 )
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+def locked_response(identifier):
+    """403 for a locked login identifier, ``None`` if it may try to log in"""
+    until = locked_until(identifier)
+    if until is None:
+        return None
+    return Response(
+        {"detail": _("Account is temporarily locked. Try again later.")},
+        status=status.HTTP_403_FORBIDDEN,
+        headers={"Retry-After": str(retry_after(until))},
+    )
+
+def login_identifier(data, *fields):
+    """First non-empty of ``fields`` in the request body"""
+    if not hasattr(data, "get"):
+        return None
+    for field in fields:
+        value = data.get(field)
+        if value and isinstance(value, str):
+            return value
+    return None
+
 class RegisterView(APIView):
     """
     Register a new user account.
@@ -47,24 +94,120 @@ class RegisterView(APIView):
         serializer = UserRegistrationSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
+        record_event('register', request, user=user)
         return Response(UserSerializer(user).data, status=status.HTTP_201_CREATED)
     
-class MeView(APIView):
+class MeView(TimedAPIViewMixin, APIView):
     """ GET /api/me/ - used to return logged in user detail """
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        return Response(UserSerializer(request.user).data)
+        etag, last_modified = user_validators(request.user.pk, "me")
+        not_modified = conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+        # The body must match the stamps behind the ETag: no replica lag
+        with phase("serializer"), primary_reads():
+            data = user_data(CustomUser.objects.filter(pk=request.user.pk))
+            if data is None:
+                # Deleted since the token's user was cached
+                data = UserSerializer(request.user).data
+        return set_validators(Response(data), etag, last_modified)
     
-class UserListView(generics.ListAPIView):
-    """List all user (admin only)"""
-    queryset = CustomUser.objects.all()
+class UserCursorPagination(KeysetPagination):
+    """Keyset pagination over the unique email column"""
+    page_size = 50
+    max_page_size = 200
+    ordering = ("email",)
+
+
+class UserListView(TimedGenericAPIViewMixin, generics.ListAPIView):
+    """
+    List users (admin only)
+    Supports cursor pagination (?count=true adds a cached total) and optional
+    filtering by country, is_active or role (code)
+    """
+    queryset = with_roles_and_profile(CustomUser.objects.all())
     serializer_class = UserDetailSerializer
     permission_classes = [IsAdmin]
+    pagination_class = UserCursorPagination
+    
+    def get_queryset(self):
+        return filter_users(super().get_queryset(), self.request.query_params)
+    
+    def list(self, request, *args, **kwargs):
+        # Flat rows joined in Python; same data as UserDetailSerializer
+        rows = self.paginate_queryset(user_values(self.filter_queryset(self.get_queryset()), detail=True))
+        with phase("serializer"):
+            data = users_data(rows, detail=True)
+        return self.get_paginated_response(data)
+    
+class UserExportView(APIView):
+    """
+    GET /api/users/export/?export_format=csv|ndjson|json (admin only)
+    Streams every user with active role codes and Zendesk linkage.
+    Accepts the same country, is_active and role filters as the user list.
+    """
+    permission_classes = [IsAdmin]
+    
+    @extend_schema(
+        responses={200: None, 400: 'Bad Request'},
+        description='Stream all users with their roles and Zendesk profile as CSV, NDJSON or a JSON array',
+        summary='Export users'
+    )
+    def get(self, request):
+        export_format = request.query_params.get("export_format", "csv")
+        if export_format not in FORMATS:
+            return Response(
+                {"export_format": [f"Expected one of: {', '.join(FORMATS)}."]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        queryset = export_queryset(request.query_params)
+        response = StreamingHttpResponse(
+            iter_export(export_format, queryset),
+            content_type=FORMATS[export_format]
+        )
+        filename = f"users-{timezone.now():%Y%m%d}.{export_format}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+    
+class BulkUserProvisionView(APIView):
+    """
+    POST /api/users/bulk/ (admin only)
+    Body: {"users": [...]} as JSON, or a CSV upload in the "file" field
+    Validates every row like registration, then creates the valid ones with
+    their roles and Zendesk profiles. Pass ?dry_run=true to only validate.
+    """
+    permission_classes = [IsAdmin]
+    parser_classes = [OrjsonParser, MultiPartParser]
     
-class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
+    @extend_schema(
+        request=BulkUserRowSerializer(many=True),
+        responses={200: None, 201: None, 400: 'Bad Request'},
+        description='Create many users at once from JSON rows or a CSV file',
+        summary='Bulk provision users'
+    )
+    def post(self, request):
+        upload = request.FILES.get("file")
+        if upload is not None:
+            rows = parse_csv(upload.file)
+        else:
+            rows = request.data.get("users") if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list) or not rows:
+            return Response(
+                {"detail": "Provide a non-empty users list or a CSV file."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        dry_run = parse_bool(request.query_params.get("dry_run", "false"), "dry_run")
+        report = provision_users(rows, assigned_by=request.user, dry_run=dry_run)
+        created = report["created"] and not dry_run
+        return Response(report, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+    
+class UserDetailView(TimedGenericAPIViewMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update, or delete a user"""
-    queryset = CustomUser.objects.all()
+    queryset = with_roles_and_profile(CustomUser.objects.all())
     permission_classes = [IsOwnerOrAdmin]
     
     def get_serializer_class(self):
@@ -72,6 +215,22 @@ class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
             return UserDetailSerializer
         return UserSerializer
     
+    def retrieve(self, request, *args, **kwargs):
+        # Same outcome as IsOwnerOrAdmin, decided before the user is loaded
+        user_id = self.kwargs["pk"]
+        if not (request.user.is_staff or str(request.user.pk) == str(user_id)):
+            return super().retrieve(request, *args, **kwargs)
+        
+        etag, last_modified = user_validators(user_id, self.get_serializer_class().__name__)
+        not_modified = conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+        with phase("serializer"), primary_reads():
+            data = user_data(self.filter_queryset(self.get_queryset()).filter(pk=user_id), detail=request.user.is_staff)
+        if data is None:
+            raise NotFound()
+        return set_validators(Response(data), etag, last_modified)
+    
 class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
     
@@ -88,8 +247,9 @@ class LogoutView(APIView):
         refresh_token = serializer.validated_data["refresh_token"]
         
         try:
-            token = RefreshToken(refresh_token)
+            token = FilteredRefreshToken(refresh_token)
             token.blacklist()
+            record_event('logout', request, user=request.user)
             return Response(status=status.HTTP_204_NO_CONTENT)
         except TokenError as e:
             return Response({"error": "Invalid token"}, status=status.HTTP_400_BAD_REQUEST)
@@ -116,37 +276,25 @@ class GoogleLoginView(APIView):
         id_token_str = token_serializer.validated_data["id_token"]
         
         try:
-            id_info = id_token.verify_oauth2_token(
-                id_token_str,
-                google_requests.Request(),
-                settings.GOOGLE_CLIENT_ID
-            )
+            id_info = get_google_verifier().verify(id_token_str)
+        except InvalidIssuerError:
+            return Response({"detail": "Invalid Google token issuer"}, status=status.HTTP_400_BAD_REQUEST)
         except ValueError:
             return Response({"detail": "Invalid Google token"}, status=status.HTTP_400_BAD_REQUEST)
         except TransportError:
             logger.exception("Unable to reach Google to verify ID token")
             return Response({"detail": "Unable to verify Google token"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         
+        claims_error = login_claims_error(id_info)
+        if claims_error:
+            return Response({"detail": claims_error}, status=status.HTTP_400_BAD_REQUEST)
+        
         email = id_info.get("email")
+        locked = locked_response(email)
+        if locked is not None:
+            return locked
         first_name = id_info.get("given_name")
         last_name = id_info.get("family_name")
-        email_verified = id_info.get("email_verified")
-        issuer = id_info.get("iss")
-
-        if issuer not in {"accounts.google.com", "https://accounts.google.com"}:
-            return Response({"detail": "Invalid Google token issuer"}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if not email:
-            return Response(
-                {"detail": "Google token does not contain email"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        if not email_verified:
-            return Response(
-                {"detail": "Google account email is not verified"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
         user, created = User.objects.get_or_create(
             email=email,
             defaults={"first_name": first_name or "", "last_name": last_name or "", "is_active": True}
@@ -154,12 +302,82 @@ class GoogleLoginView(APIView):
         if not user.is_active:
             return Response({"detail": "Account is inactive"}, status=status.HTTP_403_FORBIDDEN)
         # Generate JWT Token
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsTokenObtainPairSerializer.get_token(user)
+        record_event('login', request, user=user, method='google', created=created)
         auth_data = {
             "access": str(refresh.access_token),
             "refresh": str(refresh),
-            "user": UserSerializer(user).data
+            "user": user
         }
         
         response_serializer = GoogleAutoResponseSerializer(auth_data)
-        return Response(response_serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(response_serializer.data, status=status.HTTP_200_OK)
+
+
+class AuditedTokenObtainPairView(TimedGenericAPIViewMixin, TokenObtainPairView):
+    """ POST /api/auth/token/ - simplejwt login that records the event in the audit log """
+    
+    def post(self, request, *args, **kwargs):
+        # Locked accounts are turned away before the password is hashed
+        identifier = login_identifier(request.data, User.USERNAME_FIELD)
+        locked = locked_response(identifier)
+        if locked is not None:
+            return locked
+        
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+        
+        # Failures are counted by the user_login_failed signal
+        clear_failures(identifier, serializer.user)
+        record_event('login', request, user=serializer.user, method='password')
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
+    
+class AuditedTokenRefreshView(TimedGenericAPIViewMixin, TokenRefreshView):
+    """ POST /api/auth/token/refresh/ - simplejwt refresh that records the event in the audit log """
+    
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+        
+        # The freshly issued access token was signed by us; no need to verify it again
+        access = AccessToken(serializer.validated_data["access"], verify=False)
+        record_event('token_refresh', request, user_id=access.get(jwt_settings.USER_ID_CLAIM))
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
+    
+class AuditedLoginView(RestAuthLoginView):
+    """ dj_rest_auth login that records the event in the audit log """
+    
+    def post(self, request, *args, **kwargs):
+        locked = locked_response(login_identifier(request.data, "email", "username"))
+        if locked is not None:
+            return locked
+        return super().post(request, *args, **kwargs)
+    
+    def login(self):
+        super().login()
+        clear_failures(login_identifier(self.request.data, "email", "username"), self.user)
+        record_event('login', self.request, user=self.user, method='rest_auth')
+        
+class AuditedPasswordChangeView(RestAuthPasswordChangeView):
+    """ dj_rest_auth password change that records the event in the audit log """
+    
+    def post(self, request, *args, **kwargs):
+        response = super().post(request, *args, **kwargs)
+        record_event('password_change', request, user=request.user)
+        return response
+    
+class AuditedPasswordResetConfirmView(RestAuthPasswordResetConfirmView):
+    """ dj_rest_auth password reset confirmation that records the event in the audit log """
+    
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        record_event('password_reset', request, user=serializer.user)
+        return Response({'detail': _('Password has been reset with the new password.')})
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class RolesConfig(AppConfig):
     name = 'apps.auth_api.roles'
+
+    def ready(self):
+        from . import signals  # noqa: F401
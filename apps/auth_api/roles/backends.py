@@ -0,0 +1,18 @@
+from django.contrib.auth.backends import BaseBackend
+
+from .resolver import get_effective_permissions
+
+
+class RolePermissionBackend(BaseBackend):
+    """
+    Authorization backend answering ``user.has_perm()`` from role grants.
+
+    It does not authenticate anyone; ``ModelBackend`` still handles
+    credentials. Permissions are resolved through the cached resolver, so
+    repeated checks do not hit the database.
+    """
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        return get_effective_permissions(user_obj).codenames()
@@ -0,0 +1,23 @@
+from rest_framework import permissions
+
+from .resolver import get_effective_permissions
+
+
+class HasRolePermission(permissions.BasePermission):
+    """
+    Allow access when the user's roles grant every permission listed in the
+    view's ``required_permissions`` (``"app_label.codename"`` strings).
+    Views may set ``required_permission_scope`` to require a specific scope.
+    """
+
+    def has_permission(self, request, view):
+        user = request.user
+        if not user or not user.is_authenticated:
+            return False
+        if user.is_superuser:
+            return True
+
+        required = getattr(view, 'required_permissions', ())
+        scope = getattr(view, 'required_permission_scope', None)
+        effective = get_effective_permissions(user)
+        return all(effective.has(perm, scope) for perm in required)
@@ -0,0 +1,75 @@
+"""
+Serializer-free read paths for roles.
+
+Role lists are fetched with one ``.values_list()`` query per page of users
+and grouped by user in Python, producing exactly the data of
+``SimpleRoleSerializer`` and ``UserWithRolesSerializer``. Both keep the
+``UserRole`` model ordering the prefetches use, so roles come out in the
+same order.
+"""
+from apps.auth_api.accounts.models import CustomUser
+from configs.readers import datetime_formatter
+from .models import UserRole
+
+ROLE_FIELDS = ('id', 'name', 'code', 'description', 'category', 'is_active')
+ROLE_COLUMNS = tuple(f'role__{name}' for name in ROLE_FIELDS)
+
+
+def role_data(role_id, name, code, description, category, is_active):
+    """``SimpleRoleSerializer`` data"""
+    return {
+        'id': str(role_id),
+        'name': name,
+        'code': code,
+        'description': description,
+        'category': category,
+        'is_active': is_active,
+    }
+
+
+def active_roles_by_user(user_ids):
+    """``{user_id: [role data]}`` of the active assignments, as ``UserSerializer.roles``"""
+    roles = {user_id: [] for user_id in user_ids}
+    if not roles:
+        return roles
+    rows = UserRole.objects.filter(user_id__in=roles, is_active=True).values_list('user_id', *ROLE_COLUMNS)
+    for user_id, *role in rows:
+        roles[user_id].append(role_data(*role))
+    return roles
+
+
+def users_with_roles_data(queryset):
+    """Data of ``UserWithRolesSerializer(many=True)`` for the users of ``queryset``"""
+    users = list(queryset.values_list('id', 'email', 'first_name', 'last_name'))
+    assignments = {user[0]: [] for user in users}
+    if assignments:
+        format_datetime = datetime_formatter()
+        rows = UserRole.objects.filter(user_id__in=assignments).values_list(
+            'user_id', *ROLE_COLUMNS, 'expires_at', 'is_active', 'assigned_at', 'assigned_by_id', 'notes',
+        )
+        for user_id, *columns in rows:
+            role, (expires_at, is_active, assigned_at, assigned_by_id, notes) = columns[:-5], columns[-5:]
+            assignments[user_id].append({
+                'role': role_data(*role),
+                'expires_at': format_datetime(expires_at),
+                'is_active': is_active,
+                'assigned_at': format_datetime(assigned_at),
+                'assigned_by': str(assigned_by_id) if assigned_by_id is not None else None,
+                'notes': notes,
+            })
+    return [
+        {
+            'id': str(user_id),
+            'email': email,
+            'first_name': first_name,
+            'last_name': last_name,
+            'roles': assignments[user_id],
+        }
+        for user_id, email, first_name, last_name in users
+    ]
+
+
+def user_with_roles_data(user_id):
+    """``UserWithRolesSerializer`` data of one user, or ``None`` if there is no such user"""
+    data = users_with_roles_data(CustomUser.objects.filter(pk=user_id))
+    return data[0] if data else None
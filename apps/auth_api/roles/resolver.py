@@ -0,0 +1,165 @@
+"""
+Effective permission resolution for Role-Based Access Control.
+
+A user's effective permissions are the union of the ``RolePermission`` grants
+reachable through their active, unexpired ``UserRole`` assignments on active
+roles. The resolved set is cached per user under the user's version stamp
+(bumped when their assignments change), together with the stamps of the roles
+it was built from (bumped when a role or its grants change). Editing a role
+therefore only re-resolves the users holding it. A third stamp covers
+``auth.Permission`` itself, which only changes on migrations. Checks on a warm
+cache cost no database queries. Stamps and entries live in the default cache,
+which must be shared by all workers for a bump to reach them.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from configs.cache_versions import bump_version, get_versions
+from configs.db_routers import primary_reads
+from .models import RolePermission, UserRole
+
+GLOBAL_SCOPE = 'global'
+
+USER_VERSION_KEY = 'rbac:user:{user_id}'
+ROLE_VERSION_KEY = 'rbac:role:{role_id}'
+PERMISSION_TABLE_VERSION_KEY = 'rbac:permission-table'
+# Keys the cached role and permission listings; bumped by any catalog edit
+CATALOG_VERSION_KEY = 'rbac:catalog'
+PERMISSIONS_KEY = 'rbac:perms:{user_id}:{user_version}:{table_version}'
+
+
+def _cache_timeout():
+    return getattr(settings, 'RBAC_PERMISSION_CACHE_TIMEOUT', 300)
+
+
+class EffectivePermissions:
+    """Resolved permissions of a user, as ``"app_label.codename"`` -> scopes"""
+
+    __slots__ = ('_scopes',)
+
+    def __init__(self, scopes=None):
+        self._scopes = scopes or {}
+
+    def __contains__(self, perm):
+        return perm in self._scopes
+
+    def __iter__(self):
+        return iter(self._scopes)
+
+    def __len__(self):
+        return len(self._scopes)
+
+    def codenames(self) -> set:
+        return set(self._scopes)
+
+    def scopes_for(self, perm: str) -> frozenset:
+        return frozenset(self._scopes.get(perm, ()))
+
+    def has(self, perm: str, scope: str = None) -> bool:
+        """
+        Check for ``perm``, optionally restricted to ``scope``.
+        A global grant satisfies any scope.
+        """
+        scopes = self._scopes.get(perm)
+        if scopes is None:
+            return False
+        return scope is None or scope in scopes or GLOBAL_SCOPE in scopes
+
+
+@primary_reads()
+def _load_permissions(user_id):
+    """
+    Resolve grants from the database, returning ``(role_versions, scopes,
+    timeout)``. ``role_versions`` maps the version key of every role the
+    user is assigned to, active or not, to its stamp before the grants were read.
+    """
+    now = timezone.now()
+    assignments = list(
+        UserRole.objects
+        .filter(user_id=user_id, is_active=True)
+        .filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now))
+        .values_list('role_id', 'expires_at', 'role__is_active')
+    )
+    timeout = _cache_timeout()
+    if not assignments:
+        return {}, {}, timeout
+
+    # The cached set must not outlive the first assignment that expires.
+    expiries = [expires_at for _, expires_at, _ in assignments if expires_at]
+    if expiries:
+        seconds_left = (min(expiries) - now).total_seconds()
+        timeout = max(1, min(timeout, int(seconds_left)))
+
+    # Read before the grants, so an edit racing the load leaves the entry
+    # under an already-outdated stamp.
+    role_versions = get_versions(*{ROLE_VERSION_KEY.format(role_id=role_id) for role_id, _, _ in assignments})
+    grants = (
+        RolePermission.objects
+        .filter(role_id__in={role_id for role_id, _, is_active in assignments if is_active})
+        .values_list('permission__content_type__app_label', 'permission__codename', 'scope')
+    )
+    scopes = {}
+    for app_label, codename, scope in grants:
+        scopes.setdefault(f'{app_label}.{codename}', set()).add(scope or GLOBAL_SCOPE)
+    return role_versions, {perm: sorted(values) for perm, values in scopes.items()}, timeout
+
+
+def get_effective_permissions(user) -> EffectivePermissions:
+    """
+    Return the effective permissions of ``user``.
+
+    The result is memoised on the user instance for the rest of the request,
+    mirroring ``ModelBackend``'s ``_perm_cache``.
+    """
+    if not user or not user.is_authenticated or not user.is_active:
+        return EffectivePermissions()
+
+    cached = getattr(user, '_rbac_perm_cache', None)
+    if cached is not None:
+        return cached
+
+    user_key = USER_VERSION_KEY.format(user_id=user.pk)
+    versions = get_versions(user_key, PERMISSION_TABLE_VERSION_KEY)
+    key = PERMISSIONS_KEY.format(
+        user_id=user.pk,
+        user_version=versions[user_key],
+        table_version=versions[PERMISSION_TABLE_VERSION_KEY],
+    )
+    entry = cache.get(key)
+    if entry is not None:
+        role_versions, scopes = entry
+        if role_versions and get_versions(*role_versions) != role_versions:
+            entry = None
+    if entry is None:
+        role_versions, scopes, timeout = _load_permissions(user.pk)
+        cache.set(key, (role_versions, scopes), timeout)
+
+    permissions = EffectivePermissions(scopes)
+    user._rbac_perm_cache = permissions
+    return permissions
+
+
+def invalidate_user_permissions(user_id):
+    """Drop the cached permissions of one user once the current transaction commits."""
+    transaction.on_commit(lambda: bump_version(USER_VERSION_KEY.format(user_id=user_id)))
+
+
+def invalidate_role_permissions(role_id):
+    """Drop the cached permissions of the users holding a role once the current transaction commits."""
+    def bump():
+        bump_version(ROLE_VERSION_KEY.format(role_id=role_id))
+        bump_version(CATALOG_VERSION_KEY)
+
+    transaction.on_commit(bump)
+
+
+def invalidate_all_permissions():
+    """Drop every cached permission set once the current transaction commits."""
+    def bump():
+        bump_version(PERMISSION_TABLE_VERSION_KEY)
+        bump_version(CATALOG_VERSION_KEY)
+
+    transaction.on_commit(bump)
@@ -1,7 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth.models import Permission
+from django.db import transaction
 from apps.auth_api.accounts.models import CustomUser
 from .models import Role, RolePermission, UserRole
+from .resolver import invalidate_role_permissions
+from .services import MODES, REPLACE
 
 
 class PermissionSerializer(serializers.ModelSerializer):
@@ -26,7 +29,7 @@ class RoleSerializer(serializers.ModelSerializer):
 
     permissions = PermissionSerializer(many=True, read_only=True)
     permission_ids = serializers.ListField(
-        child=serializers.UUIDField(),
+        child=serializers.IntegerField(),
         write_only=True,
         required=False,
         help_text="List of permission IDs to attach to the role",
@@ -62,29 +65,64 @@ class RoleSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'permissions', 'created_at', 'updated_at']
 
+    def validate_permission_ids(self, value):
+        permission_ids = set(value)
+        found = set(Permission.objects.filter(id__in=permission_ids).values_list('id', flat=True))
+        missing = sorted(permission_ids - found)
+        if missing:
+            raise serializers.ValidationError(f"Unknown permissions: {', '.join(map(str, missing))}")
+        return sorted(permission_ids)
+
     def _sync_permissions(self, role, permission_ids, scope, can_grant):
-        role.rolepermission_set.all().delete()
-        if not permission_ids:
-            return
-        perms = Permission.objects.filter(id__in=permission_ids)
-        RolePermission.objects.bulk_create(
-            [
+        """
+        Make ``permission_ids`` the role's grants with the given scope and
+        can_grant, touching only the rows that differ.
+        """
+        request = self.context.get('request')
+        granted_by = request.user if request is not None and request.user.is_authenticated else None
+        wanted = set(permission_ids)
+
+        with transaction.atomic():
+            current = {
+                grant.permission_id: grant
+                for grant in RolePermission.objects.select_for_update()
+                .filter(role=role)
+                .only('id', 'permission_id', 'scope', 'can_grant')
+            }
+            stale = [grant.pk for permission_id, grant in current.items() if permission_id not in wanted]
+            changed = [
+                grant.pk for permission_id, grant in current.items()
+                if permission_id in wanted and (grant.scope, grant.can_grant) != (scope, can_grant)
+            ]
+            new = [
                 RolePermission(
                     role=role,
-                    permission=perm,
+                    permission_id=permission_id,
                     scope=scope,
                     can_grant=can_grant,
+                    granted_by=granted_by,
                 )
-                for perm in perms
+                for permission_id in sorted(wanted - current.keys())
             ]
-        )
+
+            if stale:
+                RolePermission.objects.filter(pk__in=stale).delete()
+            if changed:
+                # Every changed grant gets the same values: one UPDATE
+                RolePermission.objects.filter(pk__in=changed).update(scope=scope, can_grant=can_grant)
+            if new:
+                RolePermission.objects.bulk_create(new)
+            if stale or changed or new:
+                # bulk operations send no post_save signals
+                invalidate_role_permissions(role.pk)
 
     def create(self, validated_data):
         permission_ids = validated_data.pop('permission_ids', [])
         scope = validated_data.pop('permission_scope', 'global')
         can_grant = validated_data.pop('permission_can_grant', True)
-        role = Role.objects.create(**validated_data)
-        self._sync_permissions(role, permission_ids, scope, can_grant)
+        with transaction.atomic():
+            role = Role.objects.create(**validated_data)
+            self._sync_permissions(role, permission_ids, scope, can_grant)
         return role
 
     def update(self, instance, validated_data):
@@ -94,10 +132,10 @@ class RoleSerializer(serializers.ModelSerializer):
 
         for field, value in validated_data.items():
             setattr(instance, field, value)
-        instance.save()
-
-        if permission_ids is not None:
-            self._sync_permissions(instance, permission_ids, scope, can_grant)
+        with transaction.atomic():
+            instance.save()
+            if permission_ids is not None:
+                self._sync_permissions(instance, permission_ids, scope, can_grant)
         return instance
 
 
@@ -111,6 +149,80 @@ class UserRoleAssignmentSerializer(serializers.Serializer):
     )
 
 
+class RoleAssignmentEntrySerializer(serializers.Serializer):
+    """Roles for one user within a bulk assignment"""
+
+    user_id = serializers.UUIDField()
+    role_ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=True)
+    expires_at = serializers.DateTimeField(required=False, allow_null=True, help_text="Applied to new assignments only")
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True, help_text="Applied to new assignments only")
+
+
+class BulkRoleAssignmentSerializer(serializers.Serializer):
+    """
+    Role changes for many users at once, either as per-user ``assignments``
+    or as the same ``role_ids`` for every user in ``user_ids``.
+    """
+
+    MAX_USERS = 5000
+
+    mode = serializers.ChoiceField(
+        choices=MODES,
+        default=REPLACE,
+        help_text="replace: set exactly these roles; add: grant them; remove: revoke them",
+    )
+    assignments = RoleAssignmentEntrySerializer(many=True, required=False)
+    user_ids = serializers.ListField(child=serializers.UUIDField(), required=False)
+    role_ids = serializers.ListField(child=serializers.UUIDField(), required=False)
+    expires_at = serializers.DateTimeField(required=False, allow_null=True)
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+    def validate(self, attrs):
+        assignments = attrs.get('assignments')
+        user_ids = attrs.pop('user_ids', None)
+        role_ids = attrs.pop('role_ids', None)
+        expires_at = attrs.pop('expires_at', None)
+        notes = attrs.pop('notes', None)
+
+        if assignments is not None and (user_ids is not None or role_ids is not None):
+            raise serializers.ValidationError("Send either assignments or user_ids/role_ids, not both.")
+        if assignments is None:
+            if user_ids is None or role_ids is None:
+                raise serializers.ValidationError("assignments, or both user_ids and role_ids, are required.")
+            assignments = [
+                {'user_id': user_id, 'role_ids': role_ids, 'expires_at': expires_at, 'notes': notes}
+                for user_id in dict.fromkeys(user_ids)
+            ]
+
+        if len(assignments) > self.MAX_USERS:
+            raise serializers.ValidationError(f"At most {self.MAX_USERS} users per request.")
+        seen = set()
+        for entry in assignments:
+            if entry['user_id'] in seen:
+                raise serializers.ValidationError(f"User {entry['user_id']} appears more than once.")
+            seen.add(entry['user_id'])
+
+        attrs['assignments'] = assignments
+        return attrs
+
+
+class AssignmentDeltaSerializer(serializers.Serializer):
+    """Changes applied for one user"""
+
+    user_id = serializers.UUIDField()
+    added = serializers.ListField(child=serializers.UUIDField())
+    reactivated = serializers.ListField(child=serializers.UUIDField())
+    removed = serializers.ListField(child=serializers.UUIDField())
+
+
+class BulkRoleAssignmentResultSerializer(serializers.Serializer):
+    """Outcome of a bulk role assignment"""
+
+    users = serializers.IntegerField()
+    changed = serializers.IntegerField(help_text="Users whose assignments changed")
+    results = AssignmentDeltaSerializer(many=True)
+
+
 class UserRoleSerializer(serializers.ModelSerializer):
     """User role link with role details"""
 
@@ -0,0 +1,139 @@
+"""
+Role assignment changes applied as a diff.
+
+``apply_role_assignments`` compares the requested roles of every user with
+their current ``UserRole`` rows and only inserts, reactivates or deletes what
+differs, so untouched assignments keep their ``assigned_at``, ``expires_at``
+and ``notes``; reactivated ones take the entry's like new ones. The whole
+batch runs in one transaction with a fixed number of queries however many
+users it covers. A pair inserted concurrently by another request is skipped
+and not reported as added.
+"""
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.utils.translation import gettext as _
+from rest_framework import serializers
+
+from apps.auth_api.accounts.models import CustomUser
+from .models import Role, UserRole
+from .resolver import invalidate_user_permissions
+
+REPLACE = 'replace'
+ADD = 'add'
+REMOVE = 'remove'
+MODES = (REPLACE, ADD, REMOVE)
+
+
+@dataclass
+class AssignmentDelta:
+    """What changed for one user"""
+    user_id: object
+    added: list = field(default_factory=list)
+    reactivated: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+
+    @property
+    def changed(self):
+        return bool(self.added or self.reactivated or self.removed)
+
+
+def _check_references(user_ids, role_ids):
+    """Reject unknown users and unknown or inactive roles (two queries)"""
+    found_users = set(CustomUser.objects.filter(id__in=user_ids).values_list('id', flat=True))
+    found_roles = set(Role.objects.filter(id__in=role_ids, is_active=True).values_list('id', flat=True))
+    errors = {}
+    missing_users = [str(user_id) for user_id in user_ids if user_id not in found_users]
+    missing_roles = [str(role_id) for role_id in role_ids if role_id not in found_roles]
+    if missing_users:
+        errors['user_ids'] = [_('Unknown users: %s') % ', '.join(missing_users)]
+    if missing_roles:
+        errors['role_ids'] = [_('Unknown or inactive roles: %s') % ', '.join(missing_roles)]
+    if errors:
+        raise serializers.ValidationError(errors)
+
+
+def apply_role_assignments(assignments, mode=REPLACE, assigned_by=None):
+    """
+    Apply ``assignments`` atomically and return one ``AssignmentDelta`` per user.
+
+    ``assignments`` is a list of dicts with ``user_id``, ``role_ids`` and
+    optional ``expires_at``/``notes`` used for created and reactivated rows. ``mode``
+    ``replace`` makes ``role_ids`` the user's exact set of roles, ``add`` only
+    grants them and ``remove`` only revokes them.
+    """
+    if mode not in MODES:
+        raise ValueError(f'Unknown assignment mode {mode!r}')
+
+    wanted = {entry['user_id']: entry for entry in assignments}
+    role_ids = {role_id for entry in assignments for role_id in entry['role_ids']}
+    if mode != REMOVE:
+        _check_references(list(wanted), sorted(role_ids, key=str))
+
+    deltas = {user_id: AssignmentDelta(user_id) for user_id in wanted}
+    to_create, to_reactivate, to_delete = [], [], []
+    with transaction.atomic():
+        current = {}
+        existing = (
+            UserRole.objects
+            .select_for_update()
+            .filter(user_id__in=wanted)
+            .only('id', 'user_id', 'role_id', 'is_active', 'expires_at', 'notes')
+        )
+        for user_role in existing:
+            current.setdefault(user_role.user_id, {})[user_role.role_id] = user_role
+
+        for user_id, entry in wanted.items():
+            requested = set(entry['role_ids'])
+            held = current.get(user_id, {})
+            delta = deltas[user_id]
+
+            if mode in (REPLACE, ADD):
+                for role_id in requested:
+                    user_role = held.get(role_id)
+                    if user_role is None:
+                        to_create.append(UserRole(
+                            user_id=user_id,
+                            role_id=role_id,
+                            assigned_by=assigned_by,
+                            expires_at=entry.get('expires_at'),
+                            notes=entry.get('notes'),
+                        ))
+                    elif not user_role.is_active:
+                        user_role.is_active = True
+                        user_role.expires_at = entry.get('expires_at')
+                        user_role.notes = entry.get('notes')
+                        to_reactivate.append(user_role)
+                        delta.reactivated.append(role_id)
+
+            if mode == REPLACE:
+                revoked = held.keys() - requested
+            elif mode == REMOVE:
+                revoked = held.keys() & requested
+            else:
+                revoked = ()
+            for role_id in revoked:
+                to_delete.append(held[role_id].pk)
+                delta.removed.append(role_id)
+
+        if to_delete:
+            UserRole.objects.filter(pk__in=to_delete).delete()
+        if to_reactivate:
+            UserRole.objects.bulk_update(to_reactivate, ['is_active', 'expires_at', 'notes'], batch_size=1000)
+        if to_create:
+            # A concurrent request may have inserted the same pair already;
+            # ids are generated here, so the rows actually inserted are ours.
+            UserRole.objects.bulk_create(to_create, batch_size=1000, ignore_conflicts=True)
+            inserted = set(
+                UserRole.objects.filter(pk__in=[user_role.pk for user_role in to_create]).values_list('pk', flat=True)
+            )
+            for user_role in to_create:
+                if user_role.pk in inserted:
+                    deltas[user_role.user_id].added.append(user_role.role_id)
+
+        # bulk operations send no signals
+        for delta in deltas.values():
+            if delta.changed:
+                invalidate_user_permissions(delta.user_id)
+
+    return list(deltas.values())
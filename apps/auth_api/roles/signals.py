@@ -0,0 +1,37 @@
+from django.contrib.auth.models import Permission
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from .models import Role, RolePermission, UserRole
+from .resolver import invalidate_all_permissions, invalidate_role_permissions, invalidate_user_permissions
+
+
+@receiver(post_save, sender=UserRole)
+@receiver(post_delete, sender=UserRole)
+def user_role_changed(sender, instance, **kwargs):
+    invalidate_user_permissions(instance.user_id)
+
+
+@receiver(post_save, sender=RolePermission)
+@receiver(post_delete, sender=RolePermission)
+def role_permission_changed(sender, instance, **kwargs):
+    invalidate_role_permissions(instance.role_id)
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def role_changed(sender, instance, **kwargs):
+    # Also bumps the catalog version keying the cached role listing, so any edit counts.
+    invalidate_role_permissions(instance.pk)
+
+
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def permission_changed(sender, instance, **kwargs):
+    invalidate_all_permissions()
+
+
+@receiver(post_migrate, dispatch_uid='roles.catalog_migrated')
+def catalog_migrated(sender, **kwargs):
+    # create_permissions() bulk-creates Permission rows without signals
+    invalidate_all_permissions()
@@ -1,3 +1,336 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Prefetch
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from apps.auth_api.accounts.models import CustomUser
+from .models import Role, RolePermission, UserRole
+from .permissions import HasRolePermission
+from .readers import active_roles_by_user, users_with_roles_data
+from .resolver import get_effective_permissions
+from .serializers import SimpleRoleSerializer, UserWithRolesSerializer
+from .services import ADD, REMOVE, apply_role_assignments
+
+
+def render(data):
+    return JSONRenderer().render(data)
+
+
+class RoleReaderParityTests(TestCase):
+    """The values() read paths render the same JSON as the role serializers"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(email='admin@example.com', password=None, is_staff=True)
+        cls.roles = [
+            Role.objects.create(name='Agent', code='agent', category='support'),
+            Role.objects.create(name='Lead', code='lead', category='support', description='Team lead'),
+            Role.objects.create(name='Old', code='old', category='legacy', is_active=False),
+        ]
+        cls.user = CustomUser.objects.create_user(email='member@example.com', password=None, first_name='Mem')
+        cls.bare = CustomUser.objects.create_user(email='bare@example.com', password=None)
+        UserRole.objects.create(user=cls.user, role=cls.roles[0], assigned_by=cls.admin)
+        UserRole.objects.create(
+            user=cls.user, role=cls.roles[1], notes='Acting',
+            expires_at=timezone.now() + timedelta(days=3, microseconds=1234),
+        )
+        UserRole.objects.create(user=cls.user, role=cls.roles[2], is_active=False)
+
+    def with_roles(self):
+        return CustomUser.objects.prefetch_related(
+            Prefetch('user_roles', queryset=UserRole.objects.select_related('role'))
+        ).order_by('email')
+
+    def test_users_with_roles_match_serializer(self):
+        expected = UserWithRolesSerializer(self.with_roles(), many=True).data
+        self.assertEqual(render(users_with_roles_data(CustomUser.objects.order_by('email'))), render(expected))
+
+    def test_active_roles_match_serializer(self):
+        active = UserRole.objects.filter(user=self.user, is_active=True).select_related('role')
+        expected = SimpleRoleSerializer([user_role.role for user_role in active], many=True).data
+        roles = active_roles_by_user([self.user.pk, self.bare.pk])
+        self.assertEqual(render(roles[self.user.pk]), render(expected))
+        self.assertEqual(roles[self.bare.pk], [])
+
+    def test_user_roles_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get(f'/api/users/{self.user.pk}/roles/')
+        expected = UserWithRolesSerializer(self.with_roles().get(pk=self.user.pk)).data
+        self.assertEqual(response.content, render(expected))
+
+        response = client.get(f'/api/users/{self.admin.pk.hex[::-1]}/roles/')
+        self.assertEqual(response.status_code, 404)
+
+
+class RBACResolverTests(TestCase):
+    """Effective permissions come from active grants and follow every change"""
+
+    @classmethod
+    def setUpTestData(cls):
+        content_type = ContentType.objects.get_for_model(Role)
+        cls.view_perm = Permission.objects.create(content_type=content_type, codename='view_report', name='View')
+        cls.edit_perm = Permission.objects.create(content_type=content_type, codename='edit_report', name='Edit')
+        cls.role = Role.objects.create(name='Analyst', code='analyst', category='ops')
+        RolePermission.objects.create(role=cls.role, permission=cls.view_perm)
+        RolePermission.objects.create(role=cls.role, permission=cls.edit_perm, scope='KE')
+        cls.user = CustomUser.objects.create_user(email='analyst@example.com', password=None)
+        cls.assignment = UserRole.objects.create(user=cls.user, role=cls.role)
+
+    def setUp(self):
+        cache.clear()
+
+    def fresh(self):
+        # A new instance per "request": the per-instance memo must not hide changes
+        return CustomUser.objects.get(pk=self.user.pk)
+
+    def test_grants_and_scopes(self):
+        user = self.fresh()
+        self.assertTrue(user.has_perm('roles.view_report'))
+        permissions = get_effective_permissions(user)
+        self.assertTrue(permissions.has('roles.edit_report', 'KE'))
+        self.assertFalse(permissions.has('roles.edit_report', 'UG'))
+        self.assertTrue(permissions.has('roles.view_report', 'UG'))
+
+    def test_warm_checks_cost_no_queries(self):
+        get_effective_permissions(self.fresh())
+        user = self.fresh()
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm('roles.view_report'))
+
+    def test_revoked_assignment(self):
+        self.assertTrue(self.fresh().has_perm('roles.view_report'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assignment.delete()
+        self.assertFalse(self.fresh().has_perm('roles.view_report'))
+
+    def test_deactivated_and_expired_assignment(self):
+        self.assertTrue(self.fresh().has_perm('roles.view_report'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assignment.is_active = False
+            self.assignment.save()
+        self.assertFalse(self.fresh().has_perm('roles.view_report'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assignment.is_active = True
+            self.assignment.expires_at = timezone.now() - timedelta(minutes=1)
+            self.assignment.save()
+        self.assertFalse(self.fresh().has_perm('roles.view_report'))
+
+    def test_grant_and_role_changes(self):
+        self.assertTrue(self.fresh().has_perm('roles.view_report'))
+        with self.captureOnCommitCallbacks(execute=True):
+            RolePermission.objects.get(role=self.role, permission=self.view_perm).delete()
+        self.assertFalse(self.fresh().has_perm('roles.view_report'))
+        self.assertTrue(self.fresh().has_perm('roles.edit_report'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.role.is_active = False
+            self.role.save()
+        self.assertFalse(self.fresh().has_perm('roles.edit_report'))
+
+    def test_role_edits_only_reach_the_roles_holders(self):
+        other = Role.objects.create(name='Other', code='other', category='ops')
+        get_effective_permissions(self.fresh())
+        with self.captureOnCommitCallbacks(execute=True):
+            RolePermission.objects.create(role=other, permission=self.view_perm, scope='UG')
+            other.description = 'Edited'
+            other.save()
+        user = self.fresh()
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm('roles.view_report'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RolePermission.objects.filter(role=self.role, permission=self.view_perm).update(scope='KE')
+            self.role.save()
+        user = self.fresh()
+        with self.assertNumQueries(2):
+            self.assertEqual(get_effective_permissions(user).scopes_for('roles.view_report'), {'KE'})
+
+    def test_reactivated_role_is_picked_up(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.role.is_active = False
+            self.role.save()
+        self.assertFalse(self.fresh().has_perm('roles.view_report'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.role.is_active = True
+            self.role.save()
+        self.assertTrue(self.fresh().has_perm('roles.view_report'))
+
+    def test_inactive_user_has_nothing(self):
+        user = self.fresh()
+        user.is_active = False
+        self.assertFalse(user.has_perm('roles.view_report'))
+
+    def test_drf_permission(self):
+        view = type('View', (), {'required_permissions': ['roles.edit_report'], 'required_permission_scope': 'KE'})()
+        request = type('Request', (), {'user': self.fresh()})()
+        self.assertTrue(HasRolePermission().has_permission(request, view))
+        view.required_permission_scope = 'UG'
+        self.assertFalse(HasRolePermission().has_permission(request, view))
+
+
+class RoleAssignmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(email='admin@example.com', password=None, is_staff=True)
+        cls.agent, cls.lead, cls.auditor = (
+            Role.objects.create(name=name, code=name.lower(), category='support')
+            for name in ('Agent', 'Lead', 'Auditor')
+        )
+        cls.retired = Role.objects.create(name='Retired', code='retired', category='legacy', is_active=False)
+        cls.users = [
+            CustomUser.objects.create_user(email=f'staff{number}@example.com', password=None)
+            for number in range(6)
+        ]
+
+    def roles_of(self, user):
+        return set(UserRole.objects.filter(user=user, is_active=True).values_list('role__code', flat=True))
+
+    def test_replace_only_writes_the_difference(self):
+        user = self.users[0]
+        kept = UserRole.objects.create(user=user, role=self.agent, notes='Original')
+        UserRole.objects.create(user=user, role=self.lead, is_active=False)
+        UserRole.objects.create(user=user, role=self.auditor)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            [delta] = apply_role_assignments(
+                [{'user_id': user.pk, 'role_ids': [self.agent.pk, self.lead.pk]}], assigned_by=self.admin,
+            )
+        self.assertEqual((delta.added, delta.reactivated, delta.removed), ([], [self.lead.pk], [self.auditor.pk]))
+        self.assertEqual(self.roles_of(user), {'agent', 'lead'})
+        self.assertEqual(UserRole.objects.get(pk=kept.pk).assigned_at, kept.assigned_at)
+        self.assertEqual(UserRole.objects.get(pk=kept.pk).notes, 'Original')
+
+        [delta] = apply_role_assignments([{'user_id': user.pk, 'role_ids': [self.agent.pk, self.lead.pk]}])
+        self.assertFalse(delta.changed)
+
+    def test_reactivation_takes_the_entry_expiry_and_notes(self):
+        user = self.users[1]
+        lapsed = UserRole.objects.create(user=user, role=self.agent, is_active=False, notes='Old',
+                                         expires_at=timezone.now() - timedelta(days=30))
+        until = timezone.now() + timedelta(days=90)
+        [delta] = apply_role_assignments(
+            [{'user_id': user.pk, 'role_ids': [self.agent.pk], 'expires_at': until, 'notes': 'Back'}], mode=ADD,
+        )
+        self.assertEqual(delta.reactivated, [self.agent.pk])
+        lapsed.refresh_from_db()
+        self.assertEqual((lapsed.is_active, lapsed.expires_at, lapsed.notes, lapsed.is_expired),
+                         (True, until, 'Back', False))
+
+    def test_pairs_inserted_concurrently_are_not_reported_as_added(self):
+        user = self.users[2]
+        bulk_create = UserRole.objects.bulk_create
+
+        def race(objs, **kwargs):
+            # Another request inserts one of the pairs first
+            UserRole.objects.create(user=user, role=self.agent)
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(UserRole.objects, 'bulk_create', side_effect=race), \
+                self.captureOnCommitCallbacks(execute=True):
+            [delta] = apply_role_assignments([{'user_id': user.pk, 'role_ids': [self.agent.pk, self.lead.pk]}])
+        self.assertEqual(delta.added, [self.lead.pk])
+        self.assertEqual(self.roles_of(user), {'agent', 'lead'})
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        def queries(users):
+            assignments = [{'user_id': user.pk, 'role_ids': [self.agent.pk, self.lead.pk]} for user in users]
+            with CaptureQueriesContext(connection) as captured:
+                apply_role_assignments(assignments, mode=ADD)
+            return len(captured)
+
+        self.assertEqual(queries(self.users[:1]), queries(self.users[1:]))
+        self.assertEqual(UserRole.objects.filter(role=self.lead).count(), len(self.users))
+
+    def test_endpoint_modes_and_validation(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        user_ids = [str(user.pk) for user in self.users[:3]]
+        body = {'mode': ADD, 'user_ids': user_ids, 'role_ids': [str(self.agent.pk)], 'notes': 'Rollout'}
+
+        response = client.post('/api/roles/assignments/', body, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['users'], response.data['changed']), (3, 3))
+        self.assertEqual(UserRole.objects.filter(role=self.agent, notes='Rollout').count(), 3)
+
+        response = client.post('/api/roles/assignments/', {**body, 'mode': REMOVE, 'user_ids': user_ids[:1]},
+                               format='json')
+        self.assertEqual(response.data['changed'], 1)
+        self.assertEqual(self.roles_of(self.users[0]), set())
+
+        response = client.post('/api/roles/assignments/', {**body, 'role_ids': [str(self.retired.pk)]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('role_ids', response.data)
+        self.assertFalse(UserRole.objects.filter(role=self.retired).exists())
+
+    def test_assignment_invalidates_cached_permissions(self):
+        permission = Permission.objects.create(
+            codename='audit_report', name='Audit report',
+            content_type=ContentType.objects.get_for_model(Role),
+        )
+        RolePermission.objects.create(role=self.auditor, permission=permission)
+        user = self.users[0]
+        self.assertFalse(CustomUser.objects.get(pk=user.pk).has_perm('roles.audit_report'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_role_assignments([{'user_id': user.pk, 'role_ids': [self.auditor.pk]}])
+        self.assertTrue(CustomUser.objects.get(pk=user.pk).has_perm('roles.audit_report'))
+
+
+class RoleSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(email='admin@example.com', password=None, is_staff=True)
+        content_type = ContentType.objects.get_for_model(Role)
+        cls.permissions = [
+            Permission.objects.create(codename=f'task_{number}', name=f'Task {number}', content_type=content_type)
+            for number in range(4)
+        ]
+        cls.role = Role.objects.create(name='Agent', code='agent', category='support')
+        cls.grant = RolePermission.objects.create(role=cls.role, permission=cls.permissions[0])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def list_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get('/api/roles/').status_code, 200)
+        return len(captured)
+
+    def test_listing_roles_costs_a_fixed_number_of_queries(self):
+        few = self.list_queries()
+        for number in range(5):
+            role = Role.objects.create(name=f'Role {number}', code=f'role-{number}', category='support')
+            role.permissions.add(*self.permissions[:2], through_defaults={})
+        self.assertEqual(self.list_queries(), few)
+
+    def test_permission_sync_only_touches_what_changed(self):
+        url = f'/api/roles/{self.role.pk}/'
+        ids = [self.permissions[0].pk, self.permissions[1].pk]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(url, {'permission_ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        grants = {grant.permission_id: grant for grant in RolePermission.objects.filter(role=self.role)}
+        self.assertEqual(set(grants), set(ids))
+        self.assertEqual(grants[self.permissions[0].pk].granted_at, self.grant.granted_at)
+        self.assertEqual(grants[self.permissions[1].pk].granted_by, self.admin)
+
+        response = self.client.patch(url, {'permission_ids': ids[1:], 'permission_scope': 'KE'}, format='json')
+        self.assertEqual(list(RolePermission.objects.filter(role=self.role).values_list('permission', 'scope')),
+                         [(ids[1], 'KE')])
 
-# Create your tests here.
+        response = self.client.patch(url, {'permission_ids': [ids[1], 999999]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('999999', str(response.data['permission_ids']))
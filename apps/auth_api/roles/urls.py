@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import RoleListView, RoleDetailView, PermissionListView, assign_user_roles, user_roles
+from .views import RoleListView, RoleDetailView, PermissionListView, assign_user_roles, bulk_assign_roles, user_roles
 
 urlpatterns = [
     path('roles/', RoleListView.as_view(), name='role-list'),
+    path('roles/assignments/', bulk_assign_roles, name='role-assignments-bulk'),
     path('roles/<uuid:pk>/', RoleDetailView.as_view(), name='role-detail'),
     path('permissions/', PermissionListView.as_view(), name='permissions-list'),
     path('users/<uuid:user_id>/roles/', user_roles, name='user-roles'),
@@ -2,40 +2,57 @@ from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.contrib.auth.models import Permission
+from django.db.models import Prefetch
 from drf_spectacular.utils import extend_schema
 from apps.auth_api.accounts.models import CustomUser
-from .models import Role, UserRole
+from configs.http_cache import VersionedResponseCacheMixin
+from configs.instrumentation import TimedGenericAPIViewMixin
+from .models import Role
+from .readers import user_with_roles_data
+from .resolver import CATALOG_VERSION_KEY
+from .services import REPLACE, apply_role_assignments
 
 from .serializers import (
     PermissionSerializer, 
     RoleSerializer, 
     UserRoleAssignmentSerializer, 
-    UserWithRolesSerializer
+    UserWithRolesSerializer,
+    BulkRoleAssignmentSerializer,
+    BulkRoleAssignmentResultSerializer,
 )
 
 from apps.auth_api.accounts.permissions import IsAdmin
 
 # Create your views here.
 
-class RoleListView(generics.ListCreateAPIView):
-    """Create and list roles"""
+def roles_with_permissions():
+    """Roles with their permissions (and content types) loaded in one extra query"""
+    return Role.objects.prefetch_related(
+        Prefetch('permissions', queryset=Permission.objects.select_related('content_type'))
+    )
+
 
-    queryset = Role.objects.all()
+class RoleListView(TimedGenericAPIViewMixin, VersionedResponseCacheMixin, generics.ListCreateAPIView):
+    """Create and list roles (listing served from cache until the catalog changes)"""
+
+    cache_version_key = CATALOG_VERSION_KEY
+    queryset = roles_with_permissions()
     serializer_class = RoleSerializer
     permission_classes = [IsAdmin]
 
 
-class RoleDetailView(generics.RetrieveUpdateDestroyAPIView):
+class RoleDetailView(TimedGenericAPIViewMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update, or delete roles"""
 
-    queryset = Role.objects.all()
+    queryset = roles_with_permissions()
     serializer_class = RoleSerializer
     permission_classes = [IsAdmin]
 
 
-class PermissionListView(generics.ListAPIView):
-    """List all available permissions"""
+class PermissionListView(TimedGenericAPIViewMixin, VersionedResponseCacheMixin, generics.ListAPIView):
+    """List all available permissions (served from cache until the catalog changes)"""
 
+    cache_version_key = CATALOG_VERSION_KEY
     queryset = Permission.objects.all()
     serializer_class = PermissionSerializer
     permission_classes = [IsAdmin]
@@ -51,24 +68,51 @@ class PermissionListView(generics.ListAPIView):
 def assign_user_roles(request, user_id):
     """Assign roles to users (replaces existing assignments)"""
 
-    try:
-        user = CustomUser.objects.get(id=user_id)
-    except CustomUser.DoesNotExist:
+    if not CustomUser.objects.filter(id=user_id).exists():
         return Response({"error": "user not found"}, status=status.HTTP_404_NOT_FOUND)
 
     serializer = UserRoleAssignmentSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
 
-    role_ids = serializer.validated_data['role_ids']
-    roles = Role.objects.filter(id__in=role_ids, is_active=True)
-
-    # Replace assignments
-    user.user_roles.all().delete()
-    UserRole.objects.bulk_create(
-        [UserRole(user=user, role=role, assigned_by=request.user) for role in roles]
+    # Inactive or unknown roles are skipped, as before
+    role_ids = list(
+        Role.objects.filter(id__in=serializer.validated_data['role_ids'], is_active=True)
+        .values_list('id', flat=True)
     )
+    apply_role_assignments(
+        [{'user_id': user_id, 'role_ids': role_ids}], mode=REPLACE, assigned_by=request.user
+    )
+
+    return Response(user_with_roles_data(user_id))
 
-    return Response(UserWithRolesSerializer(user).data)
+
+@api_view(['POST'])
+@permission_classes([IsAdmin])
+@extend_schema(
+    request=BulkRoleAssignmentSerializer,
+    responses={200: BulkRoleAssignmentResultSerializer},
+    summary="Assign roles to many users",
+)
+def bulk_assign_roles(request):
+    """
+    Add, remove or replace the roles of many users in one transaction.
+    Only the difference with the current assignments is written.
+    """
+
+    serializer = BulkRoleAssignmentSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    deltas = apply_role_assignments(
+        serializer.validated_data['assignments'],
+        mode=serializer.validated_data['mode'],
+        assigned_by=request.user,
+    )
+    result = {
+        "users": len(deltas),
+        "changed": sum(delta.changed for delta in deltas),
+        "results": deltas,
+    }
+    return Response(BulkRoleAssignmentResultSerializer(result).data)
 
 
 @api_view(['GET'])
@@ -80,9 +124,8 @@ def assign_user_roles(request, user_id):
 def user_roles(request, user_id):
     """Get roles for a specific user."""
 
-    try:
-        user = CustomUser.objects.get(id=user_id)
-    except CustomUser.DoesNotExist:
+    data = user_with_roles_data(user_id)
+    if data is None:
         return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
-    return Response(UserWithRolesSerializer(user).data)
\ No newline at end of file
+    return Response(data)
\ No newline at end of file
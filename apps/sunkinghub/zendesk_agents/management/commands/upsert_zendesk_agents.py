@@ -0,0 +1,41 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.auth_api.accounts.provisioning import parse_csv
+from apps.sunkinghub.zendesk_agents.provisioning import DEFAULT_CHUNK_SIZE, parse_json, upsert_profiles
+
+
+class Command(BaseCommand):
+    help = "Create or update Zendesk agent profiles from a Zendesk agent export (CSV or JSON)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='.csv file, or .json holding a list (or {"agents"|"users": [...]})')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--json', action='store_true', help='Print the full report as JSON')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'{path} does not exist')
+
+        with path.open(encoding='utf-8-sig', newline='') as stream:
+            rows = parse_csv(stream) if path.suffix.lower() == '.csv' else parse_json(stream)
+
+        report = upsert_profiles(rows, dry_run=options['dry_run'], chunk_size=options['chunk_size'])
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, default=str))
+            return
+
+        for error in report['errors']:
+            self.stderr.write(f"row {error['row']}: {json.dumps(error['errors'])}")
+        for row in report['unmatched_rows']:
+            self.stderr.write(f"row {row['row']}: no user with email {row['email']!r} or employee id {row['employee_id']!r}")
+        prefix = 'Would upsert' if report['dry_run'] else 'Upserted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {report['created'] + report['updated']} of {report['total']} agents: "
+            f"{report['created']} created, {report['updated']} updated, "
+            f"{report['unmatched']} unmatched, {report['failed']} failed"
+        ))
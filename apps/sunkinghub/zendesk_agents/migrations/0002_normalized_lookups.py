@@ -0,0 +1,90 @@
+# Generated by Django 4.2 on 2026-10-17 18:30
+"""
+Normalized lookup columns for ZendeskProfile, backfilled from the existing
+rows, plus prefix-search indexes on the user columns the agent search
+matches (PostgreSQL only; other backends skip them).
+"""
+from django.db import migrations, models
+
+USER_TABLE = 'accounts_customuser'
+USER_SEARCH_INDEXES = {
+    'accounts_cu_email_lower_idx': 'email',
+    'accounts_cu_first_lower_idx': 'first_name',
+    'accounts_cu_last_lower_idx': 'last_name',
+}
+
+
+def backfill_normalized(apps, schema_editor):
+    ZendeskProfile = apps.get_model('zendesk_agents', 'ZendeskProfile')
+    fields = ('employee_id', 'role', 'country', 'username')
+    profiles = []
+    for profile in ZendeskProfile.objects.only('pk', *fields).iterator(chunk_size=2000):
+        for field in fields:
+            setattr(profile, f'normalized_{field}', (getattr(profile, field) or '').strip().lower())
+        profiles.append(profile)
+    ZendeskProfile.objects.bulk_update(profiles, [f'normalized_{field}' for field in fields], batch_size=2000)
+
+
+def create_user_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in USER_SEARCH_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {USER_TABLE} (lower({column}) text_pattern_ops)'
+        )
+
+
+def drop_user_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in USER_SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_partition_auditlog'),
+        ('zendesk_agents', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='zendeskprofile',
+            name='normalized_country',
+            field=models.CharField(default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='zendeskprofile',
+            name='normalized_employee_id',
+            field=models.CharField(default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='zendeskprofile',
+            name='normalized_role',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='zendeskprofile',
+            name='normalized_username',
+            field=models.CharField(default='', editable=False, max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='zendeskprofile',
+            index=models.Index(fields=['normalized_employee_id'], name='zendesk_emp_norm_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='zendeskprofile',
+            index=models.Index(fields=['normalized_role'], name='zendesk_role_norm_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='zendeskprofile',
+            index=models.Index(fields=['normalized_country'], name='zendesk_country_norm_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='zendeskprofile',
+            index=models.Index(fields=['normalized_username'], name='zendesk_username_norm_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(backfill_normalized, migrations.RunPython.noop),
+        migrations.RunPython(create_user_search_indexes, drop_user_search_indexes),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zendesk_agents', '0002_normalized_lookups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='zendeskprofile',
+            index=models.Index(fields=['-created_at', '-id'], name='zendesk_created_id_idx'),
+        ),
+    ]
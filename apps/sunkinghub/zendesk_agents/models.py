@@ -27,6 +27,21 @@ class ZendeskProfile(UUIDModel):
     username = models.CharField(max_length=50, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    # Trimmed, lower-cased copies of the filterable fields, kept in sync by
+    # save(). Case-insensitive filters become plain comparisons on these,
+    # which their indexes can serve (prefix matches too, on PostgreSQL).
+    normalized_employee_id = models.CharField(max_length=20, default='', editable=False)
+    normalized_role = models.CharField(max_length=100, default='', editable=False)
+    normalized_country = models.CharField(max_length=200, default='', editable=False)
+    normalized_username = models.CharField(max_length=50, default='', editable=False)
+    
+    NORMALIZED_FIELDS = {
+        'employee_id': 'normalized_employee_id',
+        'role': 'normalized_role',
+        'country': 'normalized_country',
+        'username': 'normalized_username',
+    }
+    
     class Meta:
         verbose_name = "Zendesk Agent"
         verbose_name_plural = "Zendesk Agents"
@@ -34,8 +49,34 @@ class ZendeskProfile(UUIDModel):
         indexes = [
             models.Index(fields=['employee_id']),
             models.Index(fields=['user']),
+            # Keyset pagination order (see configs.pagination)
+            models.Index(fields=['-created_at', '-id'], name='zendesk_created_id_idx'),
+            # varchar_pattern_ops lets PostgreSQL use them for LIKE 'prefix%'
+            # as well as equality; other backends ignore opclasses.
+            models.Index(fields=['normalized_employee_id'], name='zendesk_emp_norm_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['normalized_role'], name='zendesk_role_norm_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['normalized_country'], name='zendesk_country_norm_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['normalized_username'], name='zendesk_username_norm_idx', opclasses=['varchar_pattern_ops']),
         ]
     
     def __str__(self):
         return f"{self.user.email} - Zendesk Agent"
+    
+    @staticmethod
+    def normalize(value):
+        return (value or '').strip().lower()
+    
+    def normalize_fields(self):
+        """Refresh the normalized copies; needed before bulk writes, which skip save()"""
+        for source, target in self.NORMALIZED_FIELDS.items():
+            setattr(self, target, self.normalize(getattr(self, source)))
+    
+    def save(self, *args, update_fields=None, **kwargs):
+        self.normalize_fields()
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            update_fields |= {
+                target for source, target in self.NORMALIZED_FIELDS.items() if source in update_fields
+            }
+        super().save(*args, update_fields=update_fields, **kwargs)
 
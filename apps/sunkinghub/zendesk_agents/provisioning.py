@@ -0,0 +1,170 @@
+"""
+Bulk upsert of Zendesk agent profiles from an agent export.
+
+Rows (parsed from CSV or JSON, or posted to the API) are flattened into one
+shape by ``normalize_row``, validated, matched to users by email or employee
+id with a single query, and written with ``bulk_create(update_conflicts=True)``
+keyed on the user, so an existing profile is updated in place and a missing
+one is created by the same statement. An update only touches the columns the
+row provides; rows are grouped by that set, one statement per group. Each
+chunk runs in its own transaction: a chunk the database rejects is reported
+as failed without undoing the others.
+"""
+import json
+
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from apps.auth_api.accounts.freshness import invalidate_user_profile
+from apps.auth_api.accounts.models import CustomUser
+from .models import ZendeskProfile
+from .querysets import invalidate_profiles
+from .serializers import ZendeskAgentRowSerializer
+
+DEFAULT_CHUNK_SIZE = 500
+
+# Columns a row may leave out; an update keeps their current values
+OPTIONAL_FIELDS = ('role', 'country', 'username')
+
+# Column names used by Zendesk's own user export
+EXPORT_ALIASES = {
+    'external_id': 'employee_id',
+    'alias': 'username',
+}
+
+
+def parse_json(stream):
+    """A list of agents, or ``{"agents"|"users": [...]}`` as Zendesk exports it"""
+    data = json.load(stream)
+    if isinstance(data, dict):
+        data = data.get('agents', data.get('users', []))
+    return data
+
+
+def normalize_row(record):
+    """Flatten the nested ``user_fields`` of a Zendesk export and rename its columns"""
+    if not isinstance(record, dict):
+        return record
+    # Custom user fields (e.g. country) are nested, and null when unset
+    user_fields = record.get('user_fields')
+    row = {**(user_fields if isinstance(user_fields, dict) else {}), **record}
+    row.pop('user_fields', None)
+    return {EXPORT_ALIASES.get(key, key): value for key, value in row.items()}
+
+
+def _update_fields(present):
+    """Columns an upsert of a row providing ``present`` may overwrite"""
+    fields = ['employee_id', *present]
+    return fields + [ZendeskProfile.NORMALIZED_FIELDS[field] for field in fields]
+
+
+def _validate(rows):
+    valid, errors = [], []
+    for index, row in enumerate(rows, start=1):
+        serializer = ZendeskAgentRowSerializer(data=normalize_row(row))
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'row': index, 'errors': serializer.errors})
+    return valid, errors
+
+
+def _match_users(valid):
+    """Map each row to a user id, by email first, then employee id (one query)"""
+    emails = {data['email'].lower() for _, data in valid if data.get('email')}
+    employee_ids = {data['employee_id'] for _, data in valid}
+    users = (
+        CustomUser.objects
+        .alias(email_lower=Lower('email'))
+        .filter(Q(email_lower__in=emails) | Q(employee_id__in=employee_ids))
+        .values_list('pk', 'email', 'employee_id')
+    )
+    by_email, by_employee_id = {}, {}
+    for pk, email, employee_id in users:
+        by_email[email.lower()] = pk
+        if employee_id:
+            by_employee_id[employee_id] = pk
+
+    matched, unmatched, errors = [], [], []
+    seen = set()
+    for index, data in valid:
+        user_id = by_email.get((data.get('email') or '').lower()) or by_employee_id.get(data['employee_id'])
+        if user_id is None:
+            unmatched.append({'row': index, 'email': data.get('email'), 'employee_id': data['employee_id']})
+        elif user_id in seen:
+            errors.append({'row': index, 'errors': {'non_field_errors': ['Duplicate of an earlier row for the same user.']}})
+        else:
+            seen.add(user_id)
+            matched.append((index, user_id, data))
+    return matched, unmatched, errors
+
+
+def upsert_profiles(rows, dry_run=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Create or update Zendesk profiles from ``rows`` and return a summary of
+    created, updated, unmatched and failed rows.
+    """
+    valid, errors = _validate(rows)
+    matched, unmatched, match_errors = _match_users(valid) if valid else ([], [], [])
+    errors += match_errors
+
+    existing = set(
+        ZendeskProfile.objects.filter(user_id__in=[user_id for _, user_id, _ in matched])
+        .values_list('user_id', flat=True)
+    ) if matched else set()
+
+    report = {
+        'total': len(rows),
+        'created': 0,
+        'updated': 0,
+        'unmatched': len(unmatched),
+        'failed': 0,
+        'dry_run': dry_run,
+        'errors': errors,
+        'unmatched_rows': unmatched,
+    }
+
+    for start in range(0, len(matched), chunk_size):
+        chunk = matched[start:start + chunk_size]
+        profiles, groups = [], {}
+        for _, user_id, data in chunk:
+            profile = ZendeskProfile(
+                user_id=user_id,
+                employee_id=data['employee_id'],
+                role=data.get('role') or 'Agent',
+                country=data.get('country'),
+                username=data.get('username'),
+            )
+            profile.normalize_fields()
+            profiles.append(profile)
+            present = tuple(field for field in OPTIONAL_FIELDS if field in data)
+            groups.setdefault(present, []).append(profile)
+
+        created = sum(1 for profile in profiles if profile.user_id not in existing)
+        if not dry_run:
+            try:
+                with transaction.atomic():
+                    for present, group in groups.items():
+                        ZendeskProfile.objects.bulk_create(
+                            group,
+                            update_conflicts=True,
+                            unique_fields=['user'],
+                            update_fields=_update_fields(present),
+                        )
+                    # bulk_create sends no signals
+                    for profile in profiles:
+                        invalidate_user_profile(profile.user_id)
+                    invalidate_profiles()
+            except DatabaseError as exc:
+                errors.extend(
+                    {'row': index, 'errors': {'non_field_errors': [f'Chunk could not be written: {exc}']}}
+                    for index, _, _ in chunk
+                )
+                continue
+        report['created'] += created
+        report['updated'] += len(chunk) - created
+
+    report['failed'] = len(errors)
+    report['errors'] = sorted(errors, key=lambda error: error['row'])
+    return report
@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from configs.cache_versions import bump_version
+from .models import ZendeskProfile
+
+# Changes whenever any profile does; keys the cached directory counts
+PROFILES_VERSION_KEY = 'zendesk:profiles'
+
+# Query parameters filtering on a normalized column; each takes several
+# values, repeated (?country=KE&country=UG) or comma-separated (?country=KE,UG)
+MULTI_VALUE_FILTERS = {
+    'employee_id': 'normalized_employee_id',
+    'country': 'normalized_country',
+    'role': 'normalized_role',
+    'username': 'normalized_username',
+}
+MAX_FILTER_VALUES = 100
+MAX_SEARCH_TERMS = 5
+
+
+def invalidate_profiles():
+    """Mark the profile directory as changed once the transaction commits"""
+    transaction.on_commit(lambda: bump_version(PROFILES_VERSION_KEY))
+
+
+def query_values(params, name):
+    """Normalized, de-duplicated values of a repeatable, comma-separated parameter"""
+    values = []
+    for raw in params.getlist(name):
+        for value in raw.split(','):
+            value = ZendeskProfile.normalize(value)
+            if value and value not in values:
+                values.append(value)
+    return values[:MAX_FILTER_VALUES]
+
+
+def _matching_profile_ids(term):
+    """
+    Ids of profiles where a searched column starts with ``term``. Neither arm
+    of the union joins: the first reads the profile table's prefix indexes,
+    the second finds users through the ``lower(...)`` indexes on the user
+    table and takes their profiles by ``user_id``. OR-ing across a join
+    could use neither.
+    """
+    own = ZendeskProfile.objects.filter(
+        Q(normalized_employee_id__startswith=term) | Q(normalized_username__startswith=term)
+    )
+    users = get_user_model().objects.alias(
+        email_lower=Lower('email'),
+        first_name_lower=Lower('first_name'),
+        last_name_lower=Lower('last_name'),
+    ).filter(
+        Q(email_lower__startswith=term)
+        | Q(first_name_lower__startswith=term)
+        | Q(last_name_lower__startswith=term)
+    )
+    by_user = ZendeskProfile.objects.filter(user_id__in=users.order_by().values('pk'))
+    return own.order_by().values('pk').union(by_user.order_by().values('pk'))
+
+
+def search_profiles(queryset, search):
+    """Keep profiles matching every word of ``search`` as a prefix of some searched column"""
+    terms = ZendeskProfile.normalize(search).split()[:MAX_SEARCH_TERMS]
+    for term in terms:
+        queryset = queryset.filter(pk__in=_matching_profile_ids(term))
+    return queryset
+
+
+def filter_profiles(queryset, params):
+    """Apply the multi-value filters and the ``search`` prefix search"""
+    for param, column in MULTI_VALUE_FILTERS.items():
+        values = query_values(params, param)
+        if len(values) == 1:
+            queryset = queryset.filter(**{column: values[0]})
+        elif values:
+            queryset = queryset.filter(**{f'{column}__in': values})
+
+    search = params.get('search')
+    if search:
+        queryset = search_profiles(queryset, search)
+    return queryset
@@ -0,0 +1,54 @@
+"""
+Serializer-free read path for Zendesk profiles.
+
+List responses query flat ``.values()`` rows and turn them into exactly the
+data ``ZendeskProfileSerializer`` renders, without building model instances
+or running DRF's per-field machinery for every row. The serializer stays the
+reference (and handles writes); the parity tests compare both.
+"""
+from configs.readers import datetime_formatter
+
+# Columns of the profile itself plus the user MinimalUserSerializer renders
+PROFILE_FIELDS = (
+    'id', 'user_id', 'user__email', 'user__first_name', 'user__last_name',
+    'employee_id', 'role', 'country', 'username', 'created_at',
+)
+
+def profile_data(profile_id, user, employee_id, role, country, username, created_at, format_datetime):
+    """
+    ``ZendeskProfileSerializer`` data; ``user`` is the MinimalUserSerializer
+    dict and ``format_datetime`` a ``datetime_formatter()``
+    """
+    return {
+        'id': str(profile_id),
+        'user': user,
+        'employee_id': employee_id,
+        'role': role,
+        'country': country,
+        'username': username,
+        'created_at': format_datetime(created_at),
+    }
+
+
+def profile_values(queryset):
+    """``queryset`` as the rows ``profiles_data`` takes"""
+    return queryset.values(*PROFILE_FIELDS)
+
+
+def profiles_data(rows):
+    """Data of ``ZendeskProfileSerializer(many=True)`` for ``profile_values`` rows"""
+    format_datetime = datetime_formatter()
+    return [
+        profile_data(
+            row['id'],
+            {
+                'id': str(row['user_id']),
+                'email': row['user__email'],
+                'first_name': row['user__first_name'],
+                'last_name': row['user__last_name'],
+            },
+            row['employee_id'], row['role'], row['country'], row['username'], row['created_at'],
+            format_datetime,
+        )
+        for row in rows
+    ]
@@ -54,3 +54,12 @@ class ZendeskProfileSerializer(serializers.ModelSerializer):
             setattr(instance, attr, val)
         instance.save()
         return instance
+
+
+class ZendeskAgentRowSerializer(serializers.Serializer):
+    """One agent of a Zendesk agent export, for bulk upserts"""
+    email = serializers.EmailField(required=False, allow_blank=True)
+    employee_id = serializers.CharField(max_length=20)
+    role = serializers.CharField(max_length=100, required=False, allow_blank=True, allow_null=True)
+    country = serializers.CharField(max_length=200, required=False, allow_blank=True, allow_null=True)
+    username = serializers.CharField(max_length=50, required=False, allow_blank=True, allow_null=True)
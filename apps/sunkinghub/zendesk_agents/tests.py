@@ -1,3 +1,233 @@
+import io
+import json
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .models import ZendeskProfile
+from .provisioning import upsert_profiles
+from .querysets import _matching_profile_ids, search_profiles
+from .readers import profile_values, profiles_data
+from .serializers import ZendeskProfileSerializer
+from .views import ZendeskProfilePagination
+
+User = get_user_model()
+
+
+def render(data):
+    return JSONRenderer().render(data)
+
+
+class ProfileReaderParityTests(TestCase):
+    """The values() read path renders the same JSON as ZendeskProfileSerializer"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(email='admin@example.com', password=None, is_staff=True)
+        for index in range(5):
+            user = User.objects.create_user(
+                email=f'agent{index}@example.com', password=None,
+                first_name=f'First{index}', last_name=f'Last{index}', employee_id=f'E{index}',
+            )
+            ZendeskProfile.objects.create(
+                user=user, employee_id=f'ZD{index}',
+                role='Team Lead' if index % 2 else None,
+                country=['KE', 'UG', None][index % 3],
+                username=f'agent.{index}' if index != 3 else None,
+            )
+
+    def ordered(self):
+        return ZendeskProfile.objects.select_related('user').order_by('-created_at', '-id')
+
+    def test_rows_match_serializer(self):
+        expected = ZendeskProfileSerializer(self.ordered(), many=True).data
+        self.assertEqual(render(profiles_data(profile_values(self.ordered()))), render(expected))
+
+    def test_list_endpoint_matches_serializer(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/api/zendesk/profiles/', {'page_size': 3})
+        expected = ZendeskProfileSerializer(self.ordered()[:3], many=True).data
+        self.assertEqual(render(response.data['results']), render(expected))
+
+        response = client.get('/api/zendesk/profiles/', {'page': 1, 'page_size': 10, 'country': 'ke,ug'})
+        expected = ZendeskProfileSerializer(self.ordered().exclude(country=None), many=True).data
+        self.assertEqual(sorted(render(row) for row in response.data['results']), sorted(render(row) for row in expected))
+
+
+class ProfileSearchTests(TestCase):
+    """Every search word must prefix the employee id, username, email or a name"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(email='admin@example.com', password=None, is_staff=True)
+        people = [
+            ('Grace.Hopper@example.com', 'Grace', 'Hopper', 'KE-100', 'ghopper'),
+            ('alan@example.com', 'Alan', 'Turing', 'UG-200', 'aturing'),
+            ('ada@example.com', 'Ada', 'Grace', 'KE-300', None),
+        ]
+        for email, first_name, last_name, employee_id, username in people:
+            user = User.objects.create_user(email=email, password=None, first_name=first_name, last_name=last_name)
+            ZendeskProfile.objects.create(user=user, employee_id=employee_id, username=username)
+
+    def search(self, term):
+        found = search_profiles(ZendeskProfile.objects.all(), term)
+        return sorted(found.values_list('employee_id', flat=True))
+
+    def test_prefix_search(self):
+        self.assertEqual(self.search('grace'), ['KE-100', 'KE-300'])
+        self.assertEqual(self.search('GRACE.h'), ['KE-100'])
+        self.assertEqual(self.search('ke-'), ['KE-100', 'KE-300'])
+        self.assertEqual(self.search('aturing'), ['UG-200'])
+        self.assertEqual(self.search('ke- ada'), ['KE-300'])
+        self.assertEqual(self.search('race'), [])
+
+    def test_arms_do_not_join(self):
+        sql = str(_matching_profile_ids('grace').query).upper()
+        self.assertNotIn('JOIN', sql)
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/api/zendesk/profiles/', {'search': 'turing'})
+        self.assertEqual([row['employee_id'] for row in response.data['results']], ['UG-200'])
+
+
+class ProfileUpsertTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(email='admin@example.com', password=None, is_staff=True)
+        cls.linked = User.objects.create_user(email='Linked@example.com', password=None, employee_id='E1')
+        cls.new = User.objects.create_user(email='new@example.com', password=None, employee_id='E2')
+        ZendeskProfile.objects.create(user=cls.linked, employee_id='ZD1', role='Lead', country='KE', username='link')
+
+    def profile(self, user):
+        fields = ('employee_id', 'role', 'country', 'username', 'normalized_employee_id')
+        return ZendeskProfile.objects.values(*fields).get(user=user)
+
+    def test_updates_only_touch_the_columns_a_row_provides(self):
+        report = upsert_profiles([
+            {'email': 'linked@example.com', 'employee_id': 'ZD1-B'},
+            {'email': 'new@example.com', 'employee_id': 'ZD2', 'country': 'UG'},
+        ])
+        self.assertEqual((report['created'], report['updated'], report['failed']), (1, 1, 0))
+        self.assertEqual(self.profile(self.linked), {
+            'employee_id': 'ZD1-B', 'role': 'Lead', 'country': 'KE', 'username': 'link',
+            'normalized_employee_id': 'zd1-b',
+        })
+        self.assertEqual(self.profile(self.new)['role'], 'Agent')
+
+        upsert_profiles([{'employee_id': 'E1', 'email': 'linked@example.com', 'country': 'TZ', 'role': 'Agent'}])
+        self.assertEqual(self.profile(self.linked), {
+            'employee_id': 'E1', 'role': 'Agent', 'country': 'TZ', 'username': 'link', 'normalized_employee_id': 'e1',
+        })
+
+    def test_api_and_command_flatten_zendesk_exports(self):
+        agents = [
+            {'email': 'linked@example.com', 'external_id': 'ZD1', 'user_fields': {'country': 'RW'}},
+            {'email': 'new@example.com', 'external_id': 'ZD2', 'alias': 'newbie', 'user_fields': None},
+            {'email': 'nobody@example.com', 'external_id': 'ZD3'},
+        ]
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.post('/api/zendesk/profiles/bulk/', {'agents': agents}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['unmatched']), (1, 1, 1))
+        self.assertEqual(self.profile(self.linked)['country'], 'RW')
+        self.assertEqual(self.profile(self.new)['username'], 'newbie')
+
+        agents[0]['user_fields'] = {'country': 'BJ'}
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as export:
+            json.dump({'users': agents}, export)
+            export.flush()
+            out = io.StringIO()
+            call_command('upsert_zendesk_agents', export.name, json=True, stdout=out, stderr=io.StringIO())
+        self.assertEqual(json.loads(out.getvalue())['updated'], 2)
+        self.assertEqual(self.profile(self.linked), {
+            'employee_id': 'ZD1', 'role': 'Lead', 'country': 'BJ', 'username': 'link', 'normalized_employee_id': 'zd1',
+        })
+
+
+class ProfileListPagingTests(TestCase):
+    """Keyset cursors walk the directory in -created_at, -id order; counts are cached"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(email='admin@example.com', password=None, is_staff=True)
+        for index in range(7):
+            user = User.objects.create_user(email=f'paged{index}@example.com', password=None)
+            ZendeskProfile.objects.create(user=user, employee_id=f'P{index}', country='KE')
+        # Ties on created_at are broken by id
+        ZendeskProfile.objects.update(created_at=timezone.now())
+        cls.member = user
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row['employee_id'] for row in response.data['results'])
+            url, previous = response.data['next'], response.data['previous']
+        return seen, previous
+
+    def test_cursor_walk(self):
+        expected = list(ZendeskProfile.objects.order_by('-created_at', '-id').values_list('employee_id', flat=True))
+        seen, previous = self.walk('/api/zendesk/profiles/?cursor=&page_size=3')
+        self.assertEqual(seen, expected)
+        response = self.client.get(previous)
+        self.assertEqual([row['employee_id'] for row in response.data['results']], expected[3:6])
+        # Back on the first page the links stay in keyset mode
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([row['employee_id'] for row in response.data['results']], expected[:3])
+        self.assertNotIn('count', response.data)
+        self.assertIn('cursor=', response.data['next'])
+        self.assertEqual(self.client.get('/api/zendesk/profiles/?cursor=not-a-cursor').status_code, 404)
+
+    def test_count_is_cached_until_profiles_change(self):
+        def get():
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get('/api/zendesk/profiles/', {'cursor': '', 'count': 'true', 'country': 'ke'})
+            return response.data['count'], len(captured)
+
+        count, cold = get()
+        self.assertEqual(count, 7)
+        self.assertEqual(get(), (7, cold - 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ZendeskProfile.objects.filter(employee_id='P0').delete()
+        self.assertEqual(get(), (6, cold))
+
+    def test_search_counts_are_only_cached_briefly(self):
+        # Renaming a user changes what a search matches without bumping the profile stamp
+        with mock.patch('configs.pagination.cache', wraps=cache) as counts:
+            for params in ({'search': 'paged1'}, {'country': 'ke'}):
+                self.client.get('/api/zendesk/profiles/', {'cursor': '', 'count': 'true', **params})
+        timeouts = [call.args[2] for call in counts.set.call_args_list]
+        self.assertEqual(timeouts, [ZendeskProfilePagination.count_cache_timeout,
+                                    ZendeskProfilePagination.versioned_count_timeout])
+
+    def test_members_only_see_their_own_profile(self):
+        client = APIClient()
+        client.force_authenticate(self.member)
+        response = client.get('/api/zendesk/profiles/', {'cursor': '', 'count': 'true'})
+        self.assertEqual((response.data['count'], len(response.data['results'])), (1, 1))
 
-# Create your tests here.
+    def test_page_numbers_stay_the_default(self):
+        response = self.client.get('/api/zendesk/profiles/', {'page_size': 3})
+        self.assertEqual(list(response.data), ['count', 'next', 'previous', 'results'])
+        self.assertEqual(response.data['count'], 7)
+        self.assertIn('page=2', response.data['next'])
@@ -2,9 +2,20 @@ from rest_framework import status, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination 
-from drf_spectacular.utils import extend_schema
+from rest_framework.parsers import MultiPartParser
+from rest_framework.utils.urls import replace_query_param
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from apps.auth_api.accounts.permissions import IsAdmin
+from apps.auth_api.accounts.provisioning import parse_csv
+from apps.auth_api.accounts.querysets import parse_bool
+from configs.instrumentation import TimedAPIViewMixin, phase
+from configs.pagination import KeysetPagination
+from configs.renderers import OrjsonParser
 from .models import ZendeskProfile
-from .serializers import ZendeskProfileSerializer
+from .provisioning import upsert_profiles
+from .querysets import MULTI_VALUE_FILTERS, PROFILES_VERSION_KEY, filter_profiles
+from .readers import profile_values, profiles_data
+from .serializers import ZendeskAgentRowSerializer, ZendeskProfileSerializer
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -34,7 +45,10 @@ class LinkZendeskUserView(APIView):
             if not request.user.is_staff:
                 return Response({"detail": "You are not allowed to link other users."},
                                 status=status.HTTP_403_FORBIDDEN)
-            target_user = User.objects.get(id=data["user_id"])
+            target_user = User.objects.filter(id=data["user_id"]).first()
+            if target_user is None:
+                return Response({"user_id": ["User with the id does not exist"]},
+                                status=status.HTTP_400_BAD_REQUEST)
         else:
             target_user = request.user
 
@@ -59,23 +73,84 @@ class LinkZendeskUserView(APIView):
         out_serializer = ZendeskProfileSerializer(profile, context={"request": request})
         return Response(out_serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
+class BulkZendeskProfileUpsertView(APIView):
+    """
+    POST /api/zendesk/profiles/bulk/ (admin only)
+    Body: {"agents": [...]} as JSON, or a Zendesk agent export (CSV) in the "file" field
+    Matches agents to users by email or employee_id and creates or updates
+    their profiles. Pass ?dry_run=true to only report what would change.
+    """
+    permission_classes = [IsAdmin]
+    parser_classes = [OrjsonParser, MultiPartParser]
+
+    @extend_schema(
+        request=ZendeskAgentRowSerializer(many=True),
+        responses={200: None, 400: "Bad Request"},
+        summary="Bulk upsert Zendesk profiles",
+    )
+    def post(self, request):
+        upload = request.FILES.get("file")
+        if upload is not None:
+            rows = parse_csv(upload.file)
+        elif isinstance(request.data, dict):
+            rows = request.data.get("agents", request.data.get("users"))
+        else:
+            rows = request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({"detail": "Provide a non-empty agents list or a CSV file."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run = parse_bool(request.query_params.get("dry_run", "false"), "dry_run")
+        return Response(upsert_profiles(rows, dry_run=dry_run), status=status.HTTP_200_OK)
+
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = "page_size"
     max_page_size = 100
 
+class ZendeskProfilePagination(KeysetPagination):
+    """Keyset pagination in the model's -created_at order"""
+    ordering = ("-created_at", "-id")
+    page_size = 20
+    max_page_size = 100
+    # A search also matches user names and e-mails, which do not bump the stamp
+    unversioned_count_params = ("search",)
 
-class ZendeskProfileListView(APIView):
+    def get_previous_link(self):
+        if self.has_previous and not self.page:
+            # Keep an empty cursor: without one the view pages by number
+            return replace_query_param(self.base_url, self.cursor_query_param, "")
+        return super().get_previous_link()
+
+
+class ZendeskProfileListView(TimedAPIViewMixin, APIView):
     """
     GET /api/zendesk/profiles/
     - Admin: lists all linked Zendesk profiles
     - Normal users: lists only their own profile
-    Supports pagination and optional filtering by employee_id or country
+    Supports case-insensitive filtering by employee_id, country, role or
+    username (several values comma-separated or repeated) and a ``search``
+    prefix match on username, employee_id, email and name.
+    Pages by number with a total count, as it always has. Sending ``cursor``
+    (empty for the first page) switches to keyset cursors instead: every
+    page costs the same however deep, next/previous links carry the cursor
+    and ?count=true adds a cached total.
     """
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = StandardResultsSetPagination
+    keyset_pagination_class = ZendeskProfilePagination
+    count_version_key = PROFILES_VERSION_KEY
 
     @extend_schema(
+        parameters=[
+            *(
+                OpenApiParameter(name, str, many=True, explode=False, description=f"One or more {name} values, case-insensitive")
+                for name in MULTI_VALUE_FILTERS
+            ),
+            OpenApiParameter("search", str, description="Prefix of username, employee_id, email, first or last name"),
+            OpenApiParameter("cursor", str, description="Keyset cursor from a next/previous link; empty for the first page"),
+            OpenApiParameter("count", bool, description="With cursor: include the cached total count"),
+        ],
         responses={200: ZendeskProfileSerializer(many=True)},
         summary="List Zendesk profiles",
     )
@@ -87,16 +162,15 @@ class ZendeskProfileListView(APIView):
             # Normal user: only their own profile
             qs = ZendeskProfile.objects.select_related("user").filter(user=request.user)
 
-        # Optional filters
-        employee_id = request.query_params.get("employee_id")
-        country = request.query_params.get("country")
-        if employee_id:
-            qs = qs.filter(employee_id__iexact=employee_id)
-        if country:
-            qs = qs.filter(country__iexact=country)
+        # Optional filters, all served by the normalized column indexes
+        qs = filter_profiles(qs, request.query_params)
 
         # Pagination
-        paginator = self.pagination_class()
-        page = paginator.paginate_queryset(qs, request, view=self)
-        serializer = ZendeskProfileSerializer(page, many=True, context={"request": request})
-        return paginator.get_paginated_response(serializer.data)
+        if self.keyset_pagination_class.cursor_query_param in request.query_params:
+            paginator = self.keyset_pagination_class()
+        else:
+            paginator = self.pagination_class()
+        page = paginator.paginate_queryset(profile_values(qs), request, view=self)
+        with phase("serializer"):
+            data = profiles_data(page)
+        return paginator.get_paginated_response(data)
@@ -0,0 +1,332 @@
+"""
+Endpoint benchmarks: one or more scenarios per route of ``configs/urls.py``.
+
+``SCENARIOS`` says how to call each route against the seeded dataset
+(``seed.seed_dataset``); ``SKIPPED`` lists the routes deliberately left out
+and why. ``uncovered_routes`` reports any route in neither, so a new URL
+cannot silently escape the benchmark suite.
+
+Each scenario is measured with the Django test client: latency over a
+number of timed requests, the queries they ran, and the peak memory
+``tracemalloc`` saw during a few extra requests. Budgets hold the
+median rather than a tail percentile: over a few dozen requests p95 and p99
+mostly measure garbage collector pauses.
+"""
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Optional
+
+from django.contrib.auth.tokens import default_token_generator
+from django.db import connections
+from django.test import Client
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.auth_api.accounts.models import CustomUser
+from apps.sunkinghub.zendesk_agents.models import ZendeskProfile
+from .utils import summarize
+
+ADMIN = 'admin'
+MEMBER = 'member'
+ANONYMOUS = 'anonymous'
+ADMIN_SESSION = 'admin-session'
+
+# dj_rest_auth routes that an audited view registered earlier answers instead
+SHADOWED = 'shadowed by the audited view routed before dj_rest_auth.urls'
+SKIPPED = {
+    'api/auth/login/?$': SHADOWED,
+    'api/auth/logout/?$': SHADOWED,
+    'api/auth/password/change/?$': SHADOWED,
+    'api/auth/password/reset/confirm/?$': SHADOWED,
+    # The reset e-mail reverses 'password_reset_confirm', which no route defines
+    'api/auth/password/reset/?$': 'fails with NoReverseMatch until a password_reset_confirm route exists',
+}
+
+
+@dataclass
+class Scenario:
+    """How to call ``route``; ``path`` and ``data`` may be ``(context, iteration) -> value``"""
+    route: str
+    path: object
+    method: str = 'get'
+    auth: str = ADMIN
+    data: object = None
+    expect: tuple = (200,)
+    # Overrides the run's iteration count for slow endpoints (password hashing, exports)
+    iterations: Optional[int] = None
+    label: str = ''
+
+    @property
+    def name(self):
+        return f"{self.method.upper()} {self.label or self.route}"
+
+    def build(self, context, iteration):
+        path = self.path(context, iteration) if callable(self.path) else self.path
+        data = self.data(context, iteration) if callable(self.data) else self.data
+        return path, data
+
+
+class BenchContext:
+    """Clients and handles on the seeded dataset shared by the scenarios"""
+
+    def __init__(self, dataset, google_stub=None, google_audience=None):
+        self.dataset = dataset
+        self.password = dataset['password']
+        self.user_ids = [str(pk) for pk in dataset['user_ids']]
+        self.role_ids = [str(pk) for pk in dataset['role_ids']]
+        self.admin = CustomUser.objects.get(email=dataset['admin_email'])
+        self.member = CustomUser.objects.get(email=dataset['member_email'])
+        self.google_stub = google_stub
+        self.google_audience = google_audience
+        self.run_id = time.monotonic_ns()
+        self._deep_profile_page = None
+
+        self.clients = {
+            ANONYMOUS: Client(),
+            ADMIN: Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.admin).access_token}'),
+            MEMBER: Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.member).access_token}'),
+            ADMIN_SESSION: Client(),
+        }
+        self.clients[ADMIN_SESSION].force_login(self.admin, backend='django.contrib.auth.backends.ModelBackend')
+
+    def user_id(self, iteration):
+        return self.user_ids[iteration % len(self.user_ids)]
+
+    def role_id(self, iteration):
+        return self.role_ids[iteration % len(self.role_ids)]
+
+    def unique(self, iteration):
+        return f'{self.run_id}-{iteration}'
+
+    def deep_profile_page(self, iteration):
+        """Admin profile directory keyset page 4,000 rows in, found once by following next links"""
+        if self._deep_profile_page is None:
+            path = '/api/zendesk/profiles/?cursor=&page_size=100'
+            for _ in range(40):
+                path = self.clients[ADMIN].get(path).json()['next'] or path
+            self._deep_profile_page = path
+        return self._deep_profile_page
+
+    def refresh_token(self, user):
+        return str(RefreshToken.for_user(user))
+
+    def google_token(self, iteration):
+        return self.google_stub.issue(
+            f'google-{self.unique(iteration)}@bench.example.com', audience=self.google_audience,
+            given_name='Bench', family_name='Google',
+        )
+
+
+def _register(context, iteration):
+    unique = context.unique(iteration)
+    return {
+        'email': f'register-{unique}@bench.example.com', 'password': context.password,
+        'password2': context.password, 'first_name': 'Bench', 'last_name': 'Register',
+        'employee_id': f'REG-{unique}', 'country': 'KE',
+    }
+
+
+def _provision(context, iteration):
+    unique = context.unique(iteration)
+    return {'users': [
+        {
+            'email': f'bulk-{unique}-{row}@bench.example.com', 'password': context.password,
+            'first_name': 'Bench', 'last_name': 'Bulk', 'employee_id': f'BULK-{unique}-{row}',
+            'country': 'UG', 'zendesk_employee_id': f'ZB{row}', 'zendesk_username': f'bulk{row}',
+        }
+        for row in range(5)
+    ]}
+
+
+def _zendesk_agents(context, iteration):
+    profiles = ZendeskProfile.objects.select_related('user').order_by('created_at', 'id')[:100]
+    return {'agents': [
+        {'email': profile.user.email, 'employee_id': profile.employee_id,
+         'role': ('Agent', 'Team Lead')[iteration % 2], 'country': profile.country, 'username': profile.username}
+        for profile in profiles
+    ]}
+
+
+def _bulk_roles(context, iteration):
+    # Alternate between two role sets so every call writes a real delta
+    return {
+        'mode': 'replace',
+        'user_ids': [context.user_id(2 + offset) for offset in range(100)],
+        'role_ids': [context.role_id(iteration % 2), context.role_id(2 + iteration % 2)],
+    }
+
+
+def _password_reset_confirm(context, iteration):
+    user = CustomUser.objects.get(pk=context.member.pk)
+    return {
+        'uid': urlsafe_base64_encode(force_bytes(user.pk)),
+        'token': default_token_generator.make_token(user),
+        'new_password1': context.password,
+        'new_password2': context.password,
+    }
+
+
+SCENARIOS = [
+    Scenario('admin/', '/admin/', auth=ADMIN_SESSION),
+    Scenario('admin/', '/admin/accounts/customuser/', auth=ADMIN_SESSION, label='admin/ (user changelist)'),
+    Scenario('metrics', '/metrics'),
+    Scenario('api/schema/', '/api/schema/', auth=ANONYMOUS, iterations=5),
+    Scenario('api/docs/', '/api/docs/', auth=ANONYMOUS),
+    Scenario('api/redoc/', '/api/redoc/', auth=ANONYMOUS),
+
+    Scenario('api/auth/register/', '/api/auth/register/', 'post', ANONYMOUS, _register, (201,), iterations=10),
+    Scenario('api/auth/token/', '/api/auth/token/', 'post', ANONYMOUS,
+             lambda context, i: {'email': context.member.email, 'password': context.password}, iterations=10),
+    Scenario('api/auth/token/refresh/', '/api/auth/token/refresh/', 'post', ANONYMOUS,
+             lambda context, i: {'refresh': context.refresh_token(context.member)}),
+    Scenario('api/auth/logout/', '/api/auth/logout/', 'post', MEMBER,
+             lambda context, i: {'refresh_token': context.refresh_token(context.member)}, (204,)),
+    Scenario('api/auth/login/', '/api/auth/login/', 'post', ANONYMOUS,
+             lambda context, i: {'email': context.member.email, 'password': context.password}, iterations=10),
+    Scenario('api/auth/password/change/', '/api/auth/password/change/', 'post', MEMBER,
+             lambda context, i: {'new_password1': context.password, 'new_password2': context.password},
+             iterations=10),
+    Scenario('api/auth/password/reset/confirm/', '/api/auth/password/reset/confirm/', 'post', ANONYMOUS,
+             _password_reset_confirm, iterations=10),
+    Scenario('api/auth/user/?$', '/api/auth/user/', auth=MEMBER),
+    Scenario('api/auth/google/login/', '/api/auth/google/login/', 'post', ANONYMOUS,
+             lambda context, i: {'id_token': context.google_token(i)}),
+    Scenario('api/async/me/', '/api/async/me/', auth=MEMBER),
+    Scenario('api/async/auth/google/login/', '/api/async/auth/google/login/', 'post', ANONYMOUS,
+             lambda context, i: {'id_token': context.google_token(i)}),
+
+    Scenario('api/me/', '/api/me/', auth=MEMBER),
+    Scenario('api/users/', '/api/users/'),
+    Scenario('api/users/', '/api/users/?page_size=200&count=true', label='api/users/ (200 rows, count)'),
+    Scenario('api/users/export/', '/api/users/export/?export_format=ndjson', iterations=3),
+    Scenario('api/users/bulk/', '/api/users/bulk/', 'post', ADMIN, _provision, (201,), iterations=3),
+    Scenario('api/users/<uuid:pk>/', lambda context, i: f'/api/users/{context.user_id(i)}/'),
+    Scenario('api/zendesk/link/', '/api/zendesk/link/', 'post', MEMBER,
+             lambda context, i: {'employee_id': 'ZD000001', 'country': 'KE', 'username': f'member{i % 2}'},
+             (200, 201)),
+    Scenario('api/zendesk/profiles/', '/api/zendesk/profiles/'),
+    Scenario('api/zendesk/profiles/', lambda context, i: context.deep_profile_page(i),
+             label='api/zendesk/profiles/ (keyset, 100 rows, 4000 deep)'),
+    Scenario('api/zendesk/profiles/', '/api/zendesk/profiles/?cursor=&count=true',
+             label='api/zendesk/profiles/ (keyset, count)'),
+    Scenario('api/zendesk/profiles/', '/api/zendesk/profiles/?country=ke,ug&search=gr',
+             label='api/zendesk/profiles/ (filtered search)'),
+    Scenario('api/zendesk/profiles/', '/api/zendesk/profiles/', auth=MEMBER, label='api/zendesk/profiles/ (member)'),
+    Scenario('api/zendesk/profiles/bulk/', '/api/zendesk/profiles/bulk/', 'post', ADMIN, _zendesk_agents,
+             iterations=10),
+
+    Scenario('api/roles/', '/api/roles/'),
+    Scenario('api/roles/assignments/', '/api/roles/assignments/', 'post', ADMIN, _bulk_roles, iterations=10),
+    Scenario('api/roles/<uuid:pk>/', lambda context, i: f'/api/roles/{context.role_id(i)}/'),
+    Scenario('api/permissions/', '/api/permissions/'),
+    Scenario('api/users/<uuid:user_id>/roles/', lambda context, i: f'/api/users/{context.user_id(i)}/roles/'),
+    Scenario('api/users/<uuid:user_id>/roles/assign/',
+             lambda context, i: f'/api/users/{context.user_id(2 + i)}/roles/assign/', 'post', ADMIN,
+             lambda context, i: {'role_ids': [context.role_id(i), context.role_id(i + 1)]}),
+]
+
+
+def iter_routes(patterns=None, prefix=''):
+    """Route patterns of the URLconf; the admin site counts as one route"""
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace == 'admin':
+                yield route
+            else:
+                yield from iter_routes(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern):
+            yield route
+
+
+def uncovered_routes():
+    covered = {scenario.route for scenario in SCENARIOS} | set(SKIPPED)
+    return [route for route in iter_routes() if route not in covered]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _send(client, scenario, path, data):
+    method = getattr(client, scenario.method)
+    if data is None:
+        response = method(path)
+    else:
+        response = method(path, data, content_type='application/json')
+    if response.streaming:
+        # Exports do their work while the body is consumed
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def _request(client, scenario, context, iteration):
+    """Send one request; return its duration and query count"""
+    path, data = scenario.build(context, iteration)
+    counter = QueryCounter()
+    started = time.perf_counter()
+    with connections['default'].execute_wrapper(counter):
+        response = _send(client, scenario, path, data)
+    elapsed = time.perf_counter() - started
+    if response.status_code not in scenario.expect:
+        raise AssertionError(f'{scenario.name} answered {response.status_code}: {response.content[:500]!r}')
+    return elapsed, counter.count
+
+
+def run_scenario(scenario, context, iterations, warmup=2, memory_runs=3):
+    """
+    Latency summary, queries per request and peak memory (KiB) of
+    ``scenario``. Query counts and peaks are medians, so an occasional cache
+    reload does not count as a regression.
+    """
+    client = context.clients[scenario.auth]
+    iterations = scenario.iterations or iterations
+    for iteration in range(warmup):
+        _request(client, scenario, context, iteration)
+
+    samples, counts = [], []
+    for iteration in range(warmup, warmup + iterations):
+        elapsed, count = _request(client, scenario, context, iteration)
+        samples.append(elapsed)
+        counts.append(count)
+
+    # Traced separately: tracemalloc slows every allocation down
+    peaks = []
+    for iteration in range(warmup + iterations, warmup + iterations + memory_runs):
+        tracemalloc.start()
+        try:
+            start = tracemalloc.get_traced_memory()[0]
+            _request(client, scenario, context, iteration)
+            peaks.append(tracemalloc.get_traced_memory()[1] - start)
+        finally:
+            tracemalloc.stop()
+    peak = sorted(peaks)[len(peaks) // 2]
+    queries = sorted(counts)[len(counts) // 2]
+    return {**summarize(samples), 'queries': queries, 'peak_kib': round(peak / 1024, 1)}
+
+
+def compare(results, baseline, latency_tolerance, memory_tolerance):
+    """Budget regressions of ``results`` against ``baseline['endpoints']``, as messages"""
+    regressions = []
+    for name, result in results.items():
+        budget = baseline.get('endpoints', {}).get(name)
+        if budget is None:
+            continue
+        if result['queries'] > budget['queries']:
+            regressions.append(f"{name}: {result['queries']} queries, budget {budget['queries']}")
+        if result['p50_ms'] > budget['p50_ms'] * (1 + latency_tolerance):
+            regressions.append(f"{name}: p50 {result['p50_ms']:.2f}ms, budget {budget['p50_ms']:.2f}ms "
+                               f"+{latency_tolerance:.0%}")
+        if result['peak_kib'] > budget['peak_kib'] * (1 + memory_tolerance):
+            regressions.append(f"{name}: peak {result['peak_kib']:.1f}KiB, budget {budget['peak_kib']:.1f}KiB "
+                               f"+{memory_tolerance:.0%}")
+    return regressions
@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from apps.tooling.benchmarks.endpoints import SCENARIOS, BenchContext, compare, run_scenario, uncovered_routes
+from apps.tooling.benchmarks.seed import DEFAULT_SEED, seed_dataset
+from apps.tooling.benchmarks.utils import benchmark_database
+from apps.tooling.google_stub import GoogleCertsStub
+
+BASELINE = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, 'baseline.json')
+GOOGLE_AUDIENCE = 'bench-client.apps.googleusercontent.com'
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every route of configs/urls.py against a seeded database and "
+        "compare latency, query counts and peak memory with the committed baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--roles', type=int, default=200)
+        parser.add_argument('--permissions', type=int, default=2000)
+        parser.add_argument('--profiles', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per scenario')
+        parser.add_argument('--only', help='Run scenarios whose name contains this text')
+        parser.add_argument('--baseline', default=os.path.normpath(BASELINE), help='Budget file')
+        parser.add_argument('--update-baseline', action='store_true', help='Write the results as the new budgets')
+        parser.add_argument('--latency-tolerance', type=float, help='Allowed median slowdown (default from baseline)')
+        parser.add_argument('--memory-tolerance', type=float, help='Allowed peak memory growth (default from baseline)')
+        parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+
+    def handle(self, *args, **options):
+        missing = uncovered_routes()
+        if missing:
+            raise CommandError(f"Routes without a benchmark scenario or skip reason: {', '.join(missing)}")
+
+        scenarios = [s for s in SCENARIOS if not options['only'] or options['only'] in s.name]
+        dataset_options = {key: options[key] for key in ('users', 'roles', 'permissions', 'profiles', 'seed')}
+        results = {}
+        # Metrics snapshots go to a scratch directory: files left by earlier
+        # runs would make the /metrics scenario slower on every run
+        with benchmark_database(), GoogleCertsStub() as stub, tempfile.TemporaryDirectory() as metrics_dir, \
+                override_settings(
+                    AUDIT_LOG={'ASYNC': False}, GOOGLE_CLIENT_ID=GOOGLE_AUDIENCE, GOOGLE_CERTS_URL=stub.url,
+                    METRICS={**getattr(settings, 'METRICS', {}), 'DIR': metrics_dir},
+                ):
+            dataset = seed_dataset(**dataset_options)
+            self.stderr.write(f"Seeded {', '.join(f'{v} {k}' for k, v in dataset['counts'].items())}")
+            context = BenchContext(dataset, google_stub=stub, google_audience=GOOGLE_AUDIENCE)
+            for scenario in scenarios:
+                results[scenario.name] = run_scenario(scenario, context, options['iterations'], options['warmup'])
+                if not options['json']:
+                    self.stdout.write(self.fmt(scenario.name, results[scenario.name]))
+
+        if options['json']:
+            self.stdout.write(json.dumps({'dataset': dataset_options, 'endpoints': results}, indent=2))
+
+        if options['update_baseline']:
+            self.write_baseline(options['baseline'], dataset_options, results)
+            return
+        self.check_budgets(options, dataset_options, results)
+
+    @staticmethod
+    def fmt(name, result):
+        return (
+            '{name:<58} p50={p50_ms:>8.2f}ms p95={p95_ms:>8.2f}ms p99={p99_ms:>8.2f}ms '
+            'queries={queries:<4} peak={peak_kib:>8.1f}KiB'.format(name=name, **result)
+        )
+
+    def load_baseline(self, path):
+        try:
+            with open(path) as stream:
+                return json.load(stream)
+        except FileNotFoundError:
+            return None
+
+    def write_baseline(self, path, dataset_options, results):
+        baseline = self.load_baseline(path) or {'latency_tolerance': 0.5, 'memory_tolerance': 0.25}
+        baseline['dataset'] = dataset_options
+        endpoints = baseline.setdefault('endpoints', {})
+        for name, result in results.items():
+            endpoints[name] = {key: result[key] for key in ('p50_ms', 'queries', 'peak_kib')}
+        baseline['endpoints'] = dict(sorted(endpoints.items()))
+        with open(path, 'w') as stream:
+            json.dump(baseline, stream, indent=2)
+            stream.write('\n')
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(results)} budgets to {path}'))
+
+    def check_budgets(self, options, dataset_options, results):
+        baseline = self.load_baseline(options['baseline'])
+        if baseline is None:
+            self.stderr.write(self.style.WARNING(f"No baseline at {options['baseline']}; nothing to compare"))
+            return
+        if baseline.get('dataset') != dataset_options:
+            self.stderr.write(self.style.WARNING('Baseline was recorded on a different dataset; not comparing'))
+            return
+
+        new = sorted(set(results) - set(baseline.get('endpoints', {})))
+        if new:
+            self.stderr.write(self.style.WARNING(f"No budget yet for: {', '.join(new)}"))
+        regressions = compare(
+            results, baseline,
+            options['latency_tolerance'] if options['latency_tolerance'] is not None else baseline['latency_tolerance'],
+            options['memory_tolerance'] if options['memory_tolerance'] is not None else baseline['memory_tolerance'],
+        )
+        if regressions:
+            for message in regressions:
+                self.stderr.write(self.style.ERROR(message))
+            raise CommandError(f'{len(regressions)} budget regression(s)')
+        self.stdout.write(self.style.SUCCESS(f'{len(results)} endpoints within budget'))
@@ -0,0 +1,118 @@
+import io
+import json
+import time
+import tracemalloc
+
+from django.contrib.auth.models import Permission
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from apps.auth_api.accounts.models import CustomUser
+from apps.auth_api.accounts.readers import user_values, users_data
+from apps.auth_api.roles.serializers import PermissionSerializer
+from apps.tooling.benchmarks.seed import DEFAULT_SEED, seed_dataset
+from apps.tooling.benchmarks.utils import benchmark_database, summarize
+from configs import renderers
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF's JSONRenderer/JSONParser with the orjson-backed classes on "
+        "the user and permission list payloads, and streamed against whole-body rendering."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--permissions', type=int, default=2000)
+        parser.add_argument('--page-size', type=int, default=200, help='Rows in the user list page payload')
+        parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            raise CommandError('orjson is not installed: both sides would use the json module')
+
+        with benchmark_database():
+            seed_dataset(
+                users=options['users'], roles=200, permissions=options['permissions'],
+                profiles=options['users'] // 2, seed=options['seed'],
+            )
+            users = users_data(list(user_values(CustomUser.objects.order_by('email'), detail=True)), detail=True)
+            permissions = PermissionSerializer(Permission.objects.all(), many=True).data
+
+        payloads = {
+            f'users ({options["page_size"]}-row page)': {
+                'next': 'http://testserver/api/users/?cursor=eyJ2IjpbInVzZXIiXSwiciI6MH0', 'previous': None,
+                'results': users[:options['page_size']],
+            },
+            f'users (all {len(users)})': users,
+            f'permissions ({len(permissions)})': permissions,
+        }
+        results = {name: self.measure(data, options['iterations']) for name, data in payloads.items()}
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for name, result in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name}: {result['kib']:.1f}KiB"))
+            for step in ('encode', 'decode'):
+                before, after = result[step]['json'], result[step]['orjson']
+                self.stdout.write(
+                    f"  {step}  json p50={before['p50_ms']:>8.2f}ms  orjson p50={after['p50_ms']:>8.2f}ms  "
+                    f"x{before['p50_ms'] / max(after['p50_ms'], 0.01):.1f}"
+                )
+            if 'stream' in result:
+                stream = result['stream']
+                self.stdout.write(
+                    f"  stream p50={stream['p50_ms']:>8.2f}ms  peak={stream['peak_kib']:.1f}KiB "
+                    f"(whole body peak={result['render_peak_kib']:.1f}KiB)"
+                )
+
+    @staticmethod
+    def timed(function, iterations):
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            function()
+            samples.append(time.perf_counter() - started)
+        return summarize(samples)
+
+    @staticmethod
+    def peak_kib(function):
+        tracemalloc.start()
+        try:
+            function()
+            return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        finally:
+            tracemalloc.stop()
+
+    def measure(self, data, iterations):
+        baseline, fast = JSONRenderer(), renderers.OrjsonRenderer()
+        body = baseline.render(data)
+        if fast.render(data) != body:
+            raise CommandError('OrjsonRenderer output differs from JSONRenderer')
+
+        result = {
+            'kib': round(len(body) / 1024, 1),
+            'encode': {
+                'json': self.timed(lambda: baseline.render(data), iterations),
+                'orjson': self.timed(lambda: fast.render(data), iterations),
+            },
+            'decode': {
+                'json': self.timed(lambda: JSONParser().parse(io.BytesIO(body)), iterations),
+                'orjson': self.timed(lambda: renderers.OrjsonParser().parse(io.BytesIO(body)), iterations),
+            },
+        }
+        if isinstance(data, list):
+            def drain():
+                # A StreamingHttpResponse hands each chunk to the server and drops it
+                for _ in renderers.iter_json_array(data):
+                    pass
+
+            if b''.join(renderers.iter_json_array(data)) != body:
+                raise CommandError('iter_json_array output differs from JSONRenderer')
+            result['stream'] = {**self.timed(drain, iterations), 'peak_kib': self.peak_kib(drain)}
+            result['render_peak_kib'] = self.peak_kib(lambda: fast.render(data))
+        return result
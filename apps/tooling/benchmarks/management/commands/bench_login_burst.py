@@ -0,0 +1,110 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+
+from apps.auth_api.accounts.hashing import get_hashing_pool, hashing_settings
+from apps.tooling.benchmarks.utils import benchmark_database, summarize
+
+PASSWORD = 'Bench-pass-123!'
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure /api/me/ latency while a burst of password logins hits "
+        "/api/auth/token/, with hashing inline (before) and in the pool (after)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=40, help='Logins in the burst')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent login threads')
+        parser.add_argument('--workers', type=int, default=hashing_settings()['WORKERS'] or 2,
+                            help='Hashing processes for the pooled run')
+        parser.add_argument('--modes', default='inline,pooled', help='Comma-separated: inline, pooled')
+        parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+
+    def handle(self, *args, **options):
+        results = {}
+        with benchmark_database(), override_settings(AUDIT_LOG={'ASYNC': False}):
+            get_user_model().objects.create_user(
+                email='bench@example.com', password=PASSWORD,
+                first_name='Bench', last_name='User', employee_id='BENCH-1', country='KE',
+            )
+            for mode in options['modes'].split(','):
+                workers = 0 if mode == 'inline' else options['workers']
+                with override_settings(PASSWORD_HASHING={**hashing_settings(), 'WORKERS': workers}):
+                    results[mode] = self.run_burst(options['logins'], options['concurrency'])
+                    results[mode]['pool'] = get_hashing_pool().stats()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for mode, result in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{mode} hashing'))
+            self.stdout.write(f"  /api/me/ idle         {self.fmt(result['me_idle'])}")
+            self.stdout.write(f"  /api/me/ during burst {self.fmt(result['me_burst'])}")
+            self.stdout.write(f"  /api/auth/token/      {self.fmt(result['login'])}")
+            self.stdout.write(f"  burst wall time       {result['burst_seconds']:.2f}s")
+            pool = result['pool']
+            self.stdout.write(
+                f"  hashing pool          workers={pool['workers']} submitted={pool['submitted']} "
+                f"inline={pool['inline']} max_in_flight={pool['max_in_flight']} "
+                f"wait={pool['wait_seconds_total']:.2f}s"
+            )
+
+    @staticmethod
+    def fmt(summary):
+        return 'n={count:<5} p50={p50_ms:>8.2f}ms p95={p95_ms:>8.2f}ms p99={p99_ms:>8.2f}ms'.format(**summary)
+
+    def login(self):
+        started = time.perf_counter()
+        response = Client().post(
+            '/api/auth/token/',
+            {'email': 'bench@example.com', 'password': PASSWORD},
+            content_type='application/json',
+        )
+        elapsed = time.perf_counter() - started
+        connections.close_all()
+        assert response.status_code == 200, response.content
+        return elapsed, response.json()['access']
+
+    def probe(self, access, stop, samples):
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {access}')
+        while not stop.is_set():
+            started = time.perf_counter()
+            client.get('/api/me/')
+            samples.append(time.perf_counter() - started)
+        connections.close_all()
+
+    def sample_idle(self, access, seconds=1.0):
+        stop, samples = threading.Event(), []
+        timer = threading.Timer(seconds, stop.set)
+        timer.start()
+        self.probe(access, stop, samples)
+        return samples
+
+    def run_burst(self, logins, concurrency):
+        _, access = self.login()
+        idle = self.sample_idle(access)
+
+        stop, me_samples = threading.Event(), []
+        prober = threading.Thread(target=self.probe, args=(access, stop, me_samples))
+        prober.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            login_samples = [elapsed for elapsed, _ in pool.map(lambda _: self.login(), range(logins))]
+        burst_seconds = time.perf_counter() - started
+        stop.set()
+        prober.join()
+
+        return {
+            'me_idle': summarize(idle),
+            'me_burst': summarize(me_samples),
+            'login': summarize(login_samples),
+            'burst_seconds': burst_seconds,
+        }
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.auth_api.accounts.models import CustomUser
+from apps.tooling.benchmarks.seed import ADMIN_EMAIL, CHUNK_SIZE, DEFAULT_SEED, PASSWORD, seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the configured database with deterministic synthetic users, roles, "
+        "permissions, Zendesk profiles and audit history for scale testing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--roles', type=int, default=500)
+        parser.add_argument('--permissions', type=int, default=2000)
+        parser.add_argument('--profiles', type=int, default=50000, help='Users given a Zendesk profile')
+        parser.add_argument('--audit-events', type=int, default=1000000)
+        parser.add_argument('--audit-days', type=int, default=180, help='Days of audit history')
+        parser.add_argument('--expired-fraction', type=float, default=0.05,
+                            help='Share of role assignments already expired (as many again expire later)')
+        parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows per bulk_create')
+
+    def handle(self, *args, **options):
+        if CustomUser.objects.filter(email=ADMIN_EMAIL).exists():
+            raise CommandError('Synthetic data is already present; generate into an empty database.')
+        if not 0 <= options['expired_fraction'] <= 0.5:
+            raise CommandError('--expired-fraction must be between 0 and 0.5.')
+
+        started = last = time.perf_counter()
+
+        def progress(table, rows):
+            nonlocal last
+            now = time.perf_counter()
+            self.stdout.write(f'  {table:<18} {rows:>10,} rows {now - last:>8.2f}s')
+            last = now
+
+        dataset = seed_dataset(
+            users=options['users'],
+            roles=options['roles'],
+            permissions=options['permissions'],
+            profiles=options['profiles'],
+            audit_events=options['audit_events'],
+            audit_days=options['audit_days'],
+            expired_fraction=options['expired_fraction'],
+            seed=options['seed'],
+            chunk_size=options['chunk_size'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {sum(dataset['counts'].values()):,} rows in {time.perf_counter() - started:.1f}s. "
+            f"Sign in as {dataset['admin_email']} or {dataset['member_email']} with password {PASSWORD!r}."
+        ))
@@ -0,0 +1,257 @@
+"""
+Deterministic synthetic data for benchmarks and scale tests.
+
+``seed_dataset`` fills an empty database with users, permissions, roles,
+role grants, role assignments, Zendesk profiles and audit history drawn from
+a seeded random generator, so two runs with the same arguments produce the
+same rows (primary keys included; only timestamps follow the clock).
+
+Every table is written in chunks inside one transaction per table, and rows
+are built one chunk at a time so memory stays flat however many are asked
+for: ``bulk_create`` for the model tables, a plain ``executemany`` of
+prepared values for the audit history, where the ORM's per-field work
+would cost more than the inserts. No signals are sent, and all users share
+one precomputed password hash, so generation is never bound by PBKDF2.
+"""
+import datetime
+import itertools
+import json
+import random
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, transaction
+from django.utils import timezone
+
+from apps.auth_api.accounts.models import AuditLog, CustomUser
+from apps.auth_api.accounts.partitions import Bucket, ensure_partitions
+from apps.auth_api.roles.models import Role, RolePermission, UserRole
+from apps.sunkinghub.zendesk_agents.models import ZendeskProfile
+
+DEFAULT_SEED = 20240601
+PASSWORD = 'Bench-pass-123!'
+CHUNK_SIZE = 5000
+
+ADMIN_EMAIL = 'admin@bench.example.com'
+MEMBER_EMAIL = 'member@bench.example.com'
+
+COUNTRIES = ['KE', 'UG', 'TZ', 'NG', 'RW', 'ZM', 'MW', 'MZ', 'CI', 'TG', 'BJ', 'IN', 'MM', 'GH', 'SN', 'CM',
+             'BF', 'ML', 'NE', 'CD', 'CG', 'SL', 'LR', 'ET', 'SS', 'BI', 'ZW', 'BW', 'NA', 'MG', 'PK', 'BD']
+# Markets are skewed too: a few hold most of the staff
+COUNTRY_WEIGHTS = [1 / (rank + 1) ** 0.8 for rank in range(len(COUNTRIES))]
+FIRST_NAMES = ['Amina', 'Brian', 'Chidi', 'Dorcas', 'Esther', 'Felix', 'Grace', 'Hassan', 'Irene', 'Joseph',
+               'Kwame', 'Lilian', 'Moses', 'Njeri', 'Otieno', 'Precious', 'Ravi', 'Sarah', 'Tendai', 'Wanjiru']
+LAST_NAMES = ['Achieng', 'Banda', 'Chukwu', 'Diallo', 'Eze', 'Kamau', 'Mensah', 'Mwangi', 'Nakato', 'Okafor',
+              'Omondi', 'Phiri', 'Sharma', 'Tembo', 'Uwase', 'Wekesa']
+CATEGORIES = ['operations', 'support', 'sales', 'finance', 'engineering']
+ZENDESK_ROLES = ['Agent', 'Agent', 'Agent', 'Team Lead', 'Supervisor']
+
+AUDIT_EVENTS = ['login', 'token_refresh', 'login_failed', 'logout', 'password_change', 'password_reset', 'register']
+AUDIT_WEIGHTS = [50, 30, 8, 8, 2, 1, 1]
+AUDIT_COLUMNS = ['user', 'event_type', 'ip_address', 'user_agent', 'metadata', 'timestamp']
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36',
+    'Mozilla/5.0 (Linux; Android 13) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_5) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Safari/605.1.15',
+    'python-requests/2.32.3',
+]
+
+
+def _uuid(rng):
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def _bulk_insert(model, objects, chunk_size=CHUNK_SIZE):
+    """``bulk_create`` the (lazy) ``objects`` chunk by chunk in one transaction"""
+    total = 0
+    objects = iter(objects)
+    with transaction.atomic():
+        while True:
+            chunk = list(itertools.islice(objects, chunk_size))
+            if not chunk:
+                return total
+            model.objects.bulk_create(chunk, batch_size=chunk_size)
+            total += len(chunk)
+
+
+def _users(rng, count, password, users):
+    # ``users`` collects (pk, employee_id, country, first_name, last_name)
+    for index in range(count):
+        email = {0: ADMIN_EMAIL, 1: MEMBER_EMAIL}.get(index, f'user{index:07d}@bench.example.com')
+        user = CustomUser(
+            id=_uuid(rng),
+            email=email,
+            password=password,
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            country=rng.choices(COUNTRIES, COUNTRY_WEIGHTS)[0],
+            employee_id=f'EMP{index:07d}',
+            is_staff=index == 0,
+            is_superuser=index == 0,
+            is_verified=rng.random() < 0.8,
+            is_active=index < 2 or rng.random() < 0.95,
+        )
+        users.append((user.pk, user.employee_id, user.country, user.first_name, user.last_name))
+        yield user
+
+
+def _roles(rng, count, role_ids):
+    for index in range(count):
+        role_ids.append(_uuid(rng))
+        yield Role(
+            id=role_ids[-1],
+            name=f'Bench role {index:04d}',
+            code=f'bench-role-{index:04d}',
+            category=rng.choice(CATEGORIES),
+            is_active=rng.random() < 0.9,
+        )
+
+
+def _grants(rng, role_ids, permission_ids):
+    for role_id in role_ids:
+        for permission_id in rng.sample(permission_ids, min(len(permission_ids), rng.randint(5, 30))):
+            yield RolePermission(id=_uuid(rng), role_id=role_id, permission_id=permission_id)
+
+
+def _assignments(rng, users, role_ids, expired_fraction, now):
+    # Few roles are held by most users, most roles by few
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(role_ids))))
+    for user_id, *_ in users:
+        held = {rng.choices(role_ids, cum_weights=weights)[0] for _ in range(rng.randint(1, 3))}
+        for role_id in sorted(held):
+            expires_at = None
+            draw = rng.random()
+            if draw < expired_fraction:
+                expires_at = now - datetime.timedelta(days=rng.randint(1, 365))
+            elif draw < expired_fraction * 2:
+                expires_at = now + datetime.timedelta(days=rng.randint(1, 365))
+            yield UserRole(id=_uuid(rng), user_id=user_id, role_id=role_id, expires_at=expires_at)
+
+
+def _profiles(rng, users, count):
+    chosen = [users[1], *rng.sample(users[2:], min(len(users) - 2, max(count - 1, 0)))] if count else []
+    for user_id, employee_id, country, first_name, last_name in chosen:
+        profile = ZendeskProfile(
+            id=_uuid(rng),
+            user_id=user_id,
+            employee_id=f'ZD{employee_id[3:]}',
+            role=rng.choice(ZENDESK_ROLES),
+            country=country,
+            username=f'{first_name}.{last_name}{rng.randint(1, 999)}'.lower(),
+        )
+        profile.normalize_fields()
+        yield profile
+
+
+def _audit_rows(rng, users, count, start, seconds):
+    """
+    Audit rows as tuples of database values (see ``AUDIT_COLUMNS``), in
+    timestamp order like real history
+    """
+    connection = connections['default']
+    user_field = AuditLog._meta.get_field('user')
+    user_ids = [user_field.get_db_prep_value(user_id, connection) for user_id, *_ in users] or [None]
+    # Some users log in far more than others
+    user_weights = list(itertools.accumulate(1 / (rank + 1) ** 0.5 for rank in range(len(user_ids))))
+    event_weights = list(itertools.accumulate(AUDIT_WEIGHTS))
+    addresses = [f'10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}' for _ in range(4096)]
+    metadata = {False: json.dumps({}), True: json.dumps({'method': 'google'})}
+    adapt_datetime = connection.ops.adapt_datetimefield_value
+
+    offset, rate = 0.0, count / seconds
+    for _ in range(count):
+        offset += rng.expovariate(rate)
+        event_type = rng.choices(AUDIT_EVENTS, cum_weights=event_weights)[0]
+        yield (
+            rng.choices(user_ids, cum_weights=user_weights)[0],
+            event_type,
+            rng.choice(addresses),
+            rng.choice(USER_AGENTS),
+            metadata[event_type == 'login' and rng.random() < 0.3],
+            adapt_datetime(start + datetime.timedelta(seconds=min(offset, seconds))),
+        )
+
+
+def _insert_rows(model, columns, rows, chunk_size=CHUNK_SIZE):
+    """
+    ``executemany`` INSERT of ready-made database values, chunked, in one
+    transaction. For tables where ``bulk_create``'s per-field preparation
+    would dominate: it is most of the time for a million audit rows.
+    """
+    connection = connections['default']
+    qn = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        qn(model._meta.db_table),
+        ', '.join(qn(model._meta.get_field(name).column) for name in columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+    total = 0
+    rows = iter(rows)
+    with transaction.atomic(), connection.cursor() as cursor:
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                return total
+            cursor.executemany(sql, chunk)
+            total += len(chunk)
+
+
+def seed_dataset(users=10000, roles=200, permissions=2000, profiles=5000, audit_events=0,
+                 audit_days=180, expired_fraction=0.05, seed=DEFAULT_SEED, chunk_size=CHUNK_SIZE,
+                 progress=None):
+    """
+    Create the dataset and return what the benchmarks need to address it:
+    the admin and member emails, the shared password, primary keys and row
+    counts. User 0 is a superuser and user 1 a plain member with a Zendesk
+    profile. ``progress(table, rows)`` is called after each table.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    progress = progress or (lambda table, rows: None)
+    counts = {}
+
+    def insert(label, model, objects):
+        counts[label] = _bulk_insert(model, objects, chunk_size)
+        progress(label, counts[label])
+
+    user_rows = []
+    insert('users', CustomUser, _users(rng, max(users, 2), make_password(PASSWORD), user_rows))
+
+    content_type = ContentType.objects.get_for_model(Role)
+    insert('permissions', Permission, (
+        Permission(content_type=content_type, codename=f'bench_action_{index:05d}', name=f'Can run bench action {index}')
+        for index in range(permissions)
+    ))
+    # Not every backend returns ids from bulk_create
+    permission_ids = list(
+        Permission.objects.filter(content_type=content_type, codename__startswith='bench_action_')
+        .order_by('codename').values_list('pk', flat=True)
+    )
+
+    role_ids = []
+    insert('roles', Role, _roles(rng, roles, role_ids))
+    insert('role_permissions', RolePermission, _grants(rng, role_ids, permission_ids))
+    if role_ids:
+        insert('user_roles', UserRole, _assignments(rng, user_rows, role_ids, expired_fraction, now))
+    insert('zendesk_profiles', ZendeskProfile, _profiles(rng, user_rows, profiles))
+
+    if audit_events:
+        start = now - datetime.timedelta(days=audit_days)
+        # PostgreSQL routes rows to monthly partitions; create them up front
+        first, last = Bucket.for_datetime(start), Bucket.for_datetime(now)
+        ensure_partitions(start, months_ahead=(last.year - first.year) * 12 + last.month - first.month)
+        rows = _audit_rows(rng, user_rows, audit_events, start, audit_days * 86400)
+        counts['audit_logs'] = _insert_rows(AuditLog, AUDIT_COLUMNS, rows, chunk_size)
+        progress('audit_logs', counts['audit_logs'])
+
+    return {
+        'seed': seed,
+        'password': PASSWORD,
+        'admin_email': ADMIN_EMAIL,
+        'member_email': MEMBER_EMAIL,
+        'user_ids': [user_id for user_id, *_ in user_rows],
+        'role_ids': role_ids,
+        'counts': counts,
+    }
@@ -0,0 +1,63 @@
+"""
+Helpers shared by the benchmark management commands.
+
+Benchmarks never touch the configured database: they run against a throwaway
+copy created the same way the test runner creates its test database.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+
+@contextmanager
+def benchmark_database():
+    """Create a scratch database (and test environment) for the duration of the block"""
+    test_settings = settings.DATABASES['default'].setdefault('TEST', {})
+    scratch = None
+    if connections['default'].vendor == 'sqlite' and not test_settings.get('NAME'):
+        # A file rather than shared-cache memory, so concurrent threads get
+        # SQLite's busy timeout instead of immediate "table is locked" errors.
+        handle, scratch = tempfile.mkstemp(prefix='bench-', suffix='.sqlite3')
+        os.close(handle)
+        test_settings['NAME'] = scratch
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+        if scratch:
+            test_settings.pop('NAME', None)
+            if os.path.exists(scratch):
+                os.remove(scratch)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an unsorted list"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def summarize(seconds):
+    """Latency summary in milliseconds"""
+    return {
+        'count': len(seconds),
+        'p50_ms': round(percentile(seconds, 50) * 1000, 2),
+        'p95_ms': round(percentile(seconds, 95) * 1000, 2),
+        'p99_ms': round(percentile(seconds, 99) * 1000, 2),
+        'max_ms': round(max(seconds, default=0) * 1000, 2),
+    }
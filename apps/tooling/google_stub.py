@@ -0,0 +1,113 @@
+"""
+Local stand-in for Google's ID token signing certificate endpoint.
+
+Point ``GOOGLE_CERTS_URL`` at ``GoogleCertsStub().url`` and sign tokens with
+``issue()`` to exercise the Google login endpoints (sync or async) without
+network access (the tests and the endpoint benchmarks both do). Each
+instance generates its own RSA key and self-signed certificate; set
+``status`` or ``body`` to make it misbehave. It is development tooling:
+no application module imports it.
+"""
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt
+
+
+def _self_signed_certificate(key):
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'google-certs-stub')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=30))
+        .sign(key, hashes.SHA256())
+    )
+    return certificate.public_bytes(serialization.Encoding.PEM).decode()
+
+
+class GoogleCertsStub:
+    """Serve ``{kid: certificate}`` over HTTP from a background thread"""
+
+    def __init__(self, key_id='stub-key', max_age=3600, delay=0.0, host='127.0.0.1', port=0):
+        self.key_id = key_id
+        self.max_age = max_age
+        # Seconds to wait before answering, to mimic Google's latency
+        self.delay = delay
+        self.request_count = 0
+        self.status = 200
+
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        private_pem = key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        self._signer = crypt.RSASigner.from_string(private_pem, key_id=key_id)
+        self.body = json.dumps({key_id: _self_signed_certificate(key)}).encode()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.request_count += 1
+                if stub.delay:
+                    time.sleep(stub.delay)
+                self.send_response(stub.status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Cache-Control', f'public, max-age={stub.max_age}')
+                self.send_header('Content-Length', str(len(stub.body)))
+                self.end_headers()
+                self.wfile.write(stub.body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/certs'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='google-certs-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def issue(self, email, audience, lifetime=3600, **claims):
+        """Signed ID token for ``email`` that the verifier accepts"""
+        now = int(time.time())
+        payload = {
+            'iss': 'https://accounts.google.com',
+            'aud': audience,
+            'sub': email,
+            'email': email,
+            'email_verified': True,
+            'iat': now,
+            'exp': now + lifetime,
+            **claims,
+        }
+        return jwt.encode(self._signer, payload).decode()
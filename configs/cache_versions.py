@@ -0,0 +1,72 @@
+"""
+Version stamps stored in the shared cache.
+
+A version stamp is a monotonically increasing integer (microseconds since the
+epoch at the time of the last bump) kept under a cache key. Cached data is
+stored under keys that embed the current stamp, so bumping the stamp
+invalidates every dependent entry at once without having to find or delete
+them. Because the value is a timestamp it can also be used as a
+``Last-Modified`` value.
+
+A missing stamp (cold or evicted cache) is initialised with the current time,
+which is always newer than any stamp previously handed out, so eviction can
+never resurrect stale entries.
+"""
+import time
+
+from django.core.cache import cache
+
+# Stamps outlive the entries that depend on them; they are tiny.
+VERSION_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def _now():
+    return time.time_ns() // 1000
+
+
+def get_version(key: str) -> int:
+    """Return the current stamp for ``key``, initialising it if needed."""
+    return get_versions(key)[key]
+
+
+def get_versions(*keys: str) -> dict:
+    """Return the current stamps for several keys in a single cache round-trip."""
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            now = _now()
+            # ``add`` keeps a value written concurrently by another process.
+            if not cache.add(key, now, VERSION_TIMEOUT):
+                now = cache.get(key, now)
+            versions[key] = now
+    return versions
+
+
+async def aget_version(key: str) -> int:
+    """``get_version`` for async code."""
+    return (await aget_versions(key))[key]
+
+
+async def aget_versions(*keys: str) -> dict:
+    """``get_versions`` for async code."""
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            now = _now()
+            if not await cache.aadd(key, now, VERSION_TIMEOUT):
+                now = await cache.aget(key, now)
+            versions[key] = now
+    return versions
+
+
+def bump_version(key: str) -> int:
+    """
+    Move ``key`` to a new stamp and return it.
+
+    The read-modify-write is not atomic, but every writer stores a value that
+    differs from the one it read, which is all invalidation needs.
+    """
+    current = cache.get(key, 0)
+    version = max(_now(), current + 1)
+    cache.set(key, version, VERSION_TIMEOUT)
+    return version
@@ -0,0 +1,252 @@
+"""
+Primary/replica database routing.
+
+Reads made while handling a safe request (GET, HEAD, OPTIONS) go to one of
+the replicas listed in ``settings.DB_REPLICAS['ALIASES']``; everything else -
+writes, unsafe requests, management commands, background threads - uses
+``default``. ``ReplicaRoutingMiddleware`` marks the request being handled.
+
+Read-your-writes: after a client writes, its reads stay on the primary for
+``PIN_SECONDS``. The pin is remembered per user in the shared cache and per
+client in a cookie. The user is only known once DRF has authenticated the
+request, so reads made before that (authentication itself) use the primary
+too. A safe request that writes anything is pinned for its remainder.
+
+A replica that cannot be reached, or lags by more than ``MAX_LAG_SECONDS``
+(PostgreSQL only), is skipped until the next check ``HEALTH_CHECK_INTERVAL``
+seconds later; with no healthy replica reads use the primary.
+
+Data cached under a version stamp, and responses carrying an ETag derived
+from stamps, must be read from the primary: a lagging replica would store
+the old rows under the new stamp, where they stay until the next bump.
+Such reads go inside ``primary_reads()``.
+
+For local testing, set ``DB_REPLICA_SQLITE`` to a second SQLite file: it is
+registered as the ``replica`` alias (kept in sync by hand, since SQLite has
+no replication). The test runner mirrors it onto the test database; tests
+exercising it need ``TransactionTestCase`` with
+``databases = {'default', 'replica'}``, as uncommitted ``TestCase`` writes
+lock the tables against the second connection.
+"""
+import contextlib
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.functional import SimpleLazyObject, empty
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ALIASES': [],
+    'PIN_SECONDS': 5,
+    'PIN_COOKIE': 'db_pin',
+    'HEALTH_CHECK_INTERVAL': 10,
+    'MAX_LAG_SECONDS': 5,
+}
+
+PIN_KEY = 'db:pin:user:{user_id}'
+SAFE_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+_UNRESOLVED = object()
+
+
+def replica_settings():
+    return {**DEFAULTS, **getattr(settings, 'DB_REPLICAS', {})}
+
+
+class _ReadState:
+    """Routing decision for the request being handled"""
+
+    __slots__ = ('request', 'pinned', 'checked_user')
+
+    def __init__(self, request, pinned):
+        self.request = request
+        self.pinned = pinned
+        self.checked_user = False
+
+
+_state = contextvars.ContextVar('db_read_state', default=None)
+_primary_reads = contextvars.ContextVar('db_primary_reads', default=False)
+
+
+@contextlib.contextmanager
+def primary_reads():
+    """Send the reads made inside the block (or decorated function) to the primary"""
+    token = _primary_reads.set(True)
+    try:
+        yield
+    finally:
+        _primary_reads.reset(token)
+
+
+def _resolved_user_id(request):
+    """The user id once authentication has run, without triggering it"""
+    user = request.__dict__.get('user')
+    if isinstance(user, SimpleLazyObject):
+        user = user._wrapped
+        if user is empty:
+            return _UNRESOLVED
+    if user is None:
+        return _UNRESOLVED
+    return user.pk if user.is_authenticated else None
+
+
+class ReplicaHealth:
+    """Per-process view of which replicas are usable"""
+
+    def __init__(self, check_interval=10, max_lag=5):
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self._status = {}
+        self._lock = threading.Lock()
+
+    def _probe(self, alias):
+        connection = connections[alias]
+        try:
+            connection.ensure_connection()
+            if connection.vendor == 'postgresql' and self.max_lag is not None:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)'
+                    )
+                    lag = float(cursor.fetchone()[0])
+                if lag > self.max_lag:
+                    logger.warning('Replica %s lags by %.1fs; reading from the primary', alias, lag)
+                    return False
+            return True
+        except DatabaseError:
+            logger.warning('Replica %s is unreachable; reading from the primary', alias, exc_info=True)
+            return False
+
+    def is_healthy(self, alias):
+        healthy, checked_at = self._status.get(alias, (None, 0.0))
+        if healthy is None or time.monotonic() - checked_at >= self.check_interval:
+            with self._lock:
+                healthy = self._probe(alias)
+                self._status[alias] = (healthy, time.monotonic())
+        return healthy
+
+    def healthy_aliases(self, aliases):
+        return [alias for alias in aliases if self.is_healthy(alias)]
+
+
+_health = None
+
+
+def get_replica_health():
+    global _health
+    if _health is None:
+        options = replica_settings()
+        _health = ReplicaHealth(options['HEALTH_CHECK_INTERVAL'], options['MAX_LAG_SECONDS'])
+    return _health
+
+
+def pin_to_primary(user_id, seconds=None):
+    """Send ``user_id``'s reads to the primary for the next ``seconds``"""
+    seconds = seconds or replica_settings()['PIN_SECONDS']
+    cache.set(PIN_KEY.format(user_id=user_id), True, seconds)
+
+
+class PrimaryReplicaRouter:
+    """Route safe-request reads to a healthy replica, everything else to ``default``"""
+
+    def _replicas(self):
+        return [alias for alias in replica_settings()['ALIASES'] if alias in connections.settings]
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.pinned or _primary_reads.get():
+            return DEFAULT_DB_ALIAS
+
+        if not state.checked_user:
+            user_id = _resolved_user_id(state.request)
+            if user_id is _UNRESOLVED:
+                return DEFAULT_DB_ALIAS
+            state.checked_user = True
+            if user_id is not None and cache.get(PIN_KEY.format(user_id=user_id)):
+                state.pinned = True
+                return DEFAULT_DB_ALIAS
+
+        replicas = get_replica_health().healthy_aliases(self._replicas())
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *self._replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive schema changes through replication
+        if db in self._replicas():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Mark safe requests as eligible for replica reads and pin clients after writes"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _enter(self, request, options):
+        safe = request.method in SAFE_METHODS
+        pinned = not safe or options['PIN_COOKIE'] in request.COOKIES
+        return _state.set(_ReadState(request, pinned))
+
+    def _after_response(self, request, response, options):
+        if request.method in SAFE_METHODS:
+            return response
+        user_id = _resolved_user_id(request)
+        if user_id not in (None, _UNRESOLVED):
+            pin_to_primary(user_id, options['PIN_SECONDS'])
+        response.set_cookie(
+            options['PIN_COOKIE'], '1',
+            max_age=options['PIN_SECONDS'], httponly=True, samesite='Lax',
+            secure=request.is_secure(),
+        )
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        options = replica_settings()
+        if not options['ALIASES']:
+            return self.get_response(request)
+
+        token = self._enter(request, options)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._after_response(request, response, options)
+
+    async def __acall__(self, request):
+        options = replica_settings()
+        if not options['ALIASES']:
+            return await self.get_response(request)
+
+        token = self._enter(request, options)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._after_response(request, response, options)
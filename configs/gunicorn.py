@@ -0,0 +1,22 @@
+"""
+gunicorn server hooks: ``gunicorn -c python:configs.gunicorn configs.wsgi``
+
+The master clears the metrics directory when it starts and folds the
+snapshot of every worker that exits into the retired totals, so ``/metrics``
+counters survive worker restarts without files piling up (``configs.metrics``).
+"""
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'configs.settings')
+
+
+def on_starting(server):
+    from configs.metrics import clear_directory
+
+    clear_directory()
+
+
+def child_exit(server, worker):
+    from configs.metrics import retire_worker
+
+    retire_worker(worker.pid)
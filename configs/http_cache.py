@@ -0,0 +1,98 @@
+"""
+HTTP caching helpers for DRF views backed by version stamps.
+
+A version stamp (``configs.cache_versions``) changes whenever the data behind
+a response changes, so it makes a cheap strong validator: the ETag is derived
+from the stamp plus whatever else selects the representation, and a matching
+``If-None-Match`` can be answered with 304 before any query or serializer
+runs.
+
+``VersionedResponseCacheMixin`` goes one step further for list views whose
+content is the same for every caller: the rendered body is kept in the cache
+under the stamp, so a changed ETag is still served without the database.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from configs.cache_versions import get_version
+from configs.db_routers import primary_reads
+
+
+def _digest(*parts):
+    return hashlib.blake2b(':'.join(map(str, parts)).encode(), digest_size=16).hexdigest()
+
+
+def strong_etag(*parts):
+    """Quoted strong ETag built from ``parts``"""
+    return quote_etag(_digest(*parts))
+
+
+def conditional_response(request, etag=None, last_modified=None):
+    """
+    Return a 304 (or 412) response if the request's validators match,
+    otherwise ``None``. ``last_modified`` is a Unix timestamp.
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag=None, last_modified=None):
+    """Add ``ETag``/``Last-Modified`` and ask clients to revalidate every time"""
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+class VersionedResponseCacheMixin:
+    """
+    Serve ``list()`` from a pre-rendered body cached under a version stamp.
+
+    Set ``cache_version_key`` to the stamp that changes with the listed data.
+    The body must not depend on who is asking (permissions still run as
+    usual). Responses carry the stamp in ``version_header``.
+    """
+    cache_version_key = None
+    cache_key_prefix = None
+    version_header = 'X-Catalog-Version'
+    # Entries under an outdated stamp are never read again; this bounds how
+    # long they occupy the cache (every query string gets its own entry).
+    response_cache_timeout = 60 * 10
+
+    def list(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if renderer.format != 'json':
+            # The browsable API embeds per-request forms; never cache it.
+            return super().list(request, *args, **kwargs)
+
+        version = get_version(self.cache_version_key)
+        digest = _digest(version, request.get_full_path(), renderer.media_type)
+        etag = quote_etag(digest)
+        not_modified = conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified[self.version_header] = version
+            return not_modified
+
+        prefix = self.cache_key_prefix or f'{type(self).__module__}.{type(self).__name__}'
+        key = f'response:{prefix}:{digest}'
+        body = cache.get(key)
+        if body is None:
+            # Cached under the stamp: a lagging replica would pin old rows to it
+            with primary_reads():
+                response = super().list(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            body = renderer.render(response.data, renderer.media_type, self.get_renderer_context())
+            cache.set(key, body, self.response_cache_timeout)
+
+        response = HttpResponse(body, content_type=renderer.media_type)
+        response[self.version_header] = version
+        return set_validators(response, etag)
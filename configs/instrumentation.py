@@ -0,0 +1,211 @@
+"""
+Per-request timing breakdown.
+
+``RequestTimingMiddleware`` times every request and counts its database
+queries through ``connection.execute_wrapper`` on every configured database.
+Views using ``TimedAPIViewMixin`` add authentication, permission and render
+phases, ``TimedGenericAPIViewMixin`` serializer ones too; other code can time
+a block with ``phase(name)``.
+
+The breakdown is sent in a ``Server-Timing`` header to staff (see
+``METRICS['SERVER_TIMING']``) and feeds the per-view histograms exposed at
+``/metrics`` (``configs.metrics``). Phases are wall-clock time and may
+contain queries, so ``db`` overlaps them.
+"""
+import contextvars
+import functools
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.utils.functional import SimpleLazyObject, empty
+
+from configs.metrics import get_registry, metrics_settings
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Phase durations and query counts of the request being handled"""
+
+    __slots__ = ('phases', 'active', 'db_queries', 'db_seconds')
+
+    def __init__(self):
+        self.phases = {}
+        self.active = set()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+
+def current_timings():
+    return _current.get()
+
+
+@contextmanager
+def phase(name):
+    """Add the block's duration to phase ``name``; nested blocks of a phase count once"""
+    timings = _current.get()
+    if timings is None or name in timings.active:
+        yield
+        return
+    timings.active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.active.discard(name)
+        timings.add(name, time.perf_counter() - start)
+
+
+class QueryTimer:
+    """``execute_wrapper`` counting queries and the time spent in them"""
+
+    def __init__(self, timings):
+        self.timings = timings
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.timings.db_queries += 1
+            self.timings.db_seconds += time.perf_counter() - start
+
+
+def _is_staff(request):
+    # Only look at a user authentication already resolved; never trigger it
+    user = request.__dict__.get('user')
+    if isinstance(user, SimpleLazyObject):
+        user = None if user._wrapped is empty else user._wrapped
+    return bool(getattr(user, 'is_staff', False))
+
+
+def server_timing_header(timings, total):
+    entries = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings.phases.items()]
+    entries.append(f'db;dur={timings.db_seconds * 1000:.2f};desc="{timings.db_queries} queries"')
+    entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
+
+
+class RequestTimingMiddleware:
+    """Record request timings and send them as ``Server-Timing`` to those allowed"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        options = metrics_settings()
+        if not options['ENABLED']:
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                timer = QueryTimer(timings)
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(timer))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._record(request, response, timings, time.perf_counter() - start, options)
+
+    async def __acall__(self, request):
+        options = metrics_settings()
+        if not options['ENABLED']:
+            return await self.get_response(request)
+
+        # Async views run their queries in worker threads, whose connections
+        # this coroutine cannot wrap; they get phases and totals only.
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._record(request, response, timings, time.perf_counter() - start, options)
+
+    def _record(self, request, response, timings, total, options):
+        match = request.resolver_match
+        view = match.route if match is not None else 'unmatched'
+        registry = get_registry()
+        registry.inc('http_requests_total', view=view, method=request.method, status=response.status_code)
+        registry.observe('http_request_duration_seconds', total, view=view, method=request.method)
+        registry.observe('http_request_db_queries', timings.db_queries, view=view)
+        registry.observe('http_request_phase_seconds', timings.db_seconds, view=view, phase='db')
+        for name, seconds in timings.phases.items():
+            registry.observe('http_request_phase_seconds', seconds, view=view, phase=name)
+        registry.maybe_flush()
+
+        mode = options['SERVER_TIMING']
+        if mode == 'all' or (mode == 'staff' and _is_staff(request)):
+            response['Server-Timing'] = server_timing_header(timings, total)
+        return response
+
+
+@functools.lru_cache(maxsize=None)
+def timed_serializer_class(serializer_class):
+    """Subclass of ``serializer_class`` timing ``to_representation`` as ``serializer``"""
+    def to_representation(self, instance):
+        with phase('serializer'):
+            return super(timed, self).to_representation(instance)
+
+    timed = type(serializer_class.__name__, (serializer_class,), {
+        '__module__': serializer_class.__module__,
+        '__qualname__': serializer_class.__qualname__,
+        'to_representation': to_representation,
+    })
+    return timed
+
+
+class TimedAPIViewMixin:
+    """
+    Time authentication, permission checks and rendering of a DRF view;
+    wrap serialization in ``phase('serializer')``.
+    """
+
+    def perform_authentication(self, request):
+        with phase('auth'):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        with phase('permissions'):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with phase('permissions'):
+            super().check_object_permissions(request, obj)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        timings = _current.get()
+        if timings is not None and not getattr(response, 'is_rendered', True):
+            start = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: timings.add('render', time.perf_counter() - start))
+        return response
+
+
+class TimedGenericAPIViewMixin(TimedAPIViewMixin):
+    """``TimedAPIViewMixin`` also timing the serializers built by ``get_serializer``"""
+
+    def get_serializer(self, *args, **kwargs):
+        # Not get_serializer_class(): schema generation names components
+        # after the class it returns
+        if _current.get() is None:
+            return super().get_serializer(*args, **kwargs)
+        serializer_class = timed_serializer_class(self.get_serializer_class())
+        kwargs.setdefault('context', self.get_serializer_context())
+        return serializer_class(*args, **kwargs)
@@ -0,0 +1,433 @@
+"""
+Request metrics in the Prometheus text format, aggregated across workers.
+
+Each process keeps its histograms and counters in memory and writes a
+snapshot to ``METRICS['DIR']`` (one JSON file per pid) at most every
+``FLUSH_INTERVAL`` seconds and at exit. ``/metrics`` merges every snapshot
+with the live state of the process answering, so whichever gunicorn worker
+is scraped reports the whole server. Prometheus counters must not go
+backwards, so the histograms and counters of exited workers are folded into
+one ``metrics-retired.json`` instead of being dropped: by the gunicorn
+``child_exit`` hook (``configs.gunicorn``), by a scrape finding a file whose
+process is gone, and by a new worker finding a file under its own (reused)
+pid. ``on_starting`` clears the directory, so a restart starts from zero.
+
+Runtime components register a ``stats()`` callable with
+``register_component``; numeric values are exported as
+``app_component_stat{component=...,stat=...}``, summed over workers.
+Deployment-wide values (table sizes, ...) are registered with
+``register_collector`` instead: only the process answering the scrape calls
+them, and they are exported unsummed as ``app_shared_stat``.
+"""
+import atexit
+import contextlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single development server, nothing to race
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Directory shared by all workers of one server
+    'DIR': os.path.join(tempfile.gettempdir(), 'bms-metrics'),
+    'FLUSH_INTERVAL': 5,
+    # Bearer token Prometheus scrapes with; without one only staff may read
+    'TOKEN': None,
+    # Who gets Server-Timing headers: 'staff', 'all' or 'none'
+    'SERVER_TIMING': 'staff',
+}
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': ('Time spent handling requests', DURATION_BUCKETS),
+    'http_request_phase_seconds': ('Time spent per request phase (phases may overlap db)', DURATION_BUCKETS),
+    'http_request_db_queries': ('Database queries per request', QUERY_COUNT_BUCKETS),
+}
+COUNTERS = {
+    'http_requests_total': 'Requests handled',
+}
+
+RETIRED = 'retired'
+
+
+def metrics_settings():
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _read_stats(sources):
+    """Numeric values of every ``{name: get_stats}`` source, keyed ``name:stat``"""
+    values = {}
+    for name, get_stats in sources.items():
+        try:
+            stats = get_stats() or {}
+        except Exception:
+            logger.warning('Could not collect stats of %s', name, exc_info=True)
+            continue
+        for stat, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values[f'{name}:{stat}'] = value
+    return values
+
+
+class MetricsRegistry:
+    """Per-process histograms and counters, flushed to a shared directory"""
+
+    def __init__(self, directory, flush_interval=5):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._histograms = {}
+        self._counters = {}
+        self._components = {}
+        self._lock = threading.Lock()
+        # Set on the first flush of each process
+        self._pid = None
+        self._flushed_at = time.monotonic()
+
+    def observe(self, name, value, **labels):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, _label_key(labels))
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = {'buckets': [0] * (len(buckets) + 1), 'sum': 0.0, 'count': 0}
+            entry['buckets'][bisect_left(buckets, value)] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def register_component(self, name, get_stats):
+        self._components[name] = get_stats
+
+    def component_stats(self):
+        return _read_stats(self._components)
+
+    # ------------------------------------------------------------------
+    # Snapshots
+    # ------------------------------------------------------------------
+    def snapshot(self):
+        with self._lock:
+            histograms = [
+                [name, labels, {**entry, 'buckets': list(entry['buckets'])}]
+                for (name, labels), entry in self._histograms.items()
+            ]
+            counters = [[name, labels, value] for (name, labels), value in self._counters.items()]
+        return {'histograms': histograms, 'counters': counters, 'components': self.component_stats()}
+
+    def _path(self, pid):
+        return _snapshot_path(self.directory, pid)
+
+    def flush(self):
+        try:
+            pid = os.getpid()
+            if self._pid != pid:
+                # A file under our pid is a dead worker's whose pid was reused
+                with _directory_lock(self.directory):
+                    _retire(self.directory, pid)
+                self._pid = pid
+            _write_snapshot(self._path(pid), self.snapshot())
+        except OSError:
+            logger.warning('Could not write metrics to %s', self.directory, exc_info=True)
+        self._flushed_at = time.monotonic()
+
+    def maybe_flush(self):
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def collect(self):
+        """Snapshots of every worker, the live state replacing this process's file"""
+        snapshots = []
+        own = os.getpid()
+        try:
+            # Locked, so a scrape never sees a file and its retired copy at once
+            with _directory_lock(self.directory):
+                for pid in _worker_pids(self.directory):
+                    if pid == own and self._pid == own:
+                        continue
+                    # Before our first flush a file under our pid is a dead worker's too
+                    if pid == own or not _alive(pid):
+                        _retire(self.directory, pid)
+                        continue
+                    snapshot = _read_snapshot(_snapshot_path(self.directory, pid))
+                    if snapshot is not None:
+                        snapshots.append(snapshot)
+                # Read after retiring, which rewrites it
+                snapshot = _read_snapshot(_snapshot_path(self.directory, RETIRED))
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+        except OSError:
+            logger.warning('Could not read metrics from %s', self.directory, exc_info=True)
+        snapshots.append(self.snapshot())
+        return snapshots
+
+
+# ----------------------------------------------------------------------
+# Snapshot files
+# ----------------------------------------------------------------------
+def _snapshot_path(directory, key):
+    return os.path.join(directory, f'metrics-{key}.json')
+
+
+def _worker_pids(directory):
+    """The pid of every worker snapshot file in ``directory``"""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    keys = [name[len('metrics-'):-len('.json')] for name in names
+            if name.startswith('metrics-') and name.endswith('.json')]
+    return [int(key) for key in keys if key.isdigit()]
+
+
+def _read_snapshot(path):
+    try:
+        with open(path) as stream:
+            return json.load(stream)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_snapshot(path, snapshot):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+    with os.fdopen(fd, 'w') as stream:
+        json.dump(snapshot, stream)
+    # Atomic, so a scrape never reads a half-written file
+    os.replace(tmp, path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextlib.contextmanager
+def _directory_lock(directory):
+    """Serialize retiring and reading snapshot files across processes"""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, '.lock'), 'a') as stream:
+        fcntl.flock(stream, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(stream, fcntl.LOCK_UN)
+
+
+def _retire(directory, pid):
+    """Fold the histograms and counters of worker ``pid`` into the retired file (under the lock)"""
+    path = _snapshot_path(directory, pid)
+    snapshot = _read_snapshot(path)
+    if snapshot is None:
+        return
+    retired_path = _snapshot_path(directory, RETIRED)
+    # Component stats are gauges of a live process: not carried over
+    histograms, counters, _ = _merge([_read_snapshot(retired_path) or {}, snapshot])
+    _write_snapshot(retired_path, {
+        'histograms': [[name, labels, entry] for (name, labels), entry in histograms.items()],
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+    })
+    os.remove(path)
+
+
+def retire_worker(pid, directory=None):
+    """Fold the snapshot of the exited worker ``pid`` into the retired totals"""
+    directory = directory or metrics_settings()['DIR']
+    try:
+        with _directory_lock(directory):
+            _retire(directory, pid)
+    except OSError:
+        logger.warning('Could not retire the metrics of worker %s', pid, exc_info=True)
+
+
+def clear_directory(directory=None):
+    """Remove every snapshot, for a server (re)starting from zero"""
+    directory = directory or metrics_settings()['DIR']
+    try:
+        with _directory_lock(directory):
+            for name in os.listdir(directory):
+                if name.startswith(('metrics-', '.metrics-')):
+                    os.remove(os.path.join(directory, name))
+    except OSError:
+        logger.warning('Could not clear metrics in %s', directory, exc_info=True)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _format_number(value):
+    if isinstance(value, float):
+        return repr(round(value, 9))
+    return str(value)
+
+
+def _merge(snapshots):
+    histograms, counters, components = {}, {}, {}
+    for snapshot in snapshots:
+        for name, labels, entry in snapshot.get('histograms', ()):
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, {'buckets': [0] * len(entry['buckets']), 'sum': 0.0, 'count': 0})
+            merged['buckets'] = [a + b for a, b in zip(merged['buckets'], entry['buckets'])]
+            merged['sum'] += entry['sum']
+            merged['count'] += entry['count']
+        for name, labels, value in snapshot.get('counters', ()):
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for key, value in snapshot.get('components', {}).items():
+            components[key] = components.get(key, 0) + value
+    return histograms, counters, components
+
+
+def render_prometheus(snapshots, shared=None):
+    histograms, counters, components = _merge(snapshots)
+    lines = []
+    for metric, (help_text, buckets) in HISTOGRAMS.items():
+        series = sorted((labels, entry) for (name, labels), entry in histograms.items() if name == metric)
+        if not series:
+            continue
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} histogram']
+        for labels, entry in series:
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), entry['buckets']):
+                cumulative += count
+                lines.append(f'{metric}_bucket{_format_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{metric}_sum{_format_labels(labels)} {_format_number(entry["sum"])}')
+            lines.append(f'{metric}_count{_format_labels(labels)} {entry["count"]}')
+    for metric, help_text in COUNTERS.items():
+        series = sorted((labels, value) for (name, labels), value in counters.items() if name == metric)
+        if not series:
+            continue
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+        lines += [f'{metric}{_format_labels(labels)} {value}' for labels, value in series]
+    if components:
+        lines += ['# HELP app_component_stat Runtime component statistics, summed over workers',
+                  '# TYPE app_component_stat gauge']
+        for key, value in sorted(components.items()):
+            component, stat = key.split(':', 1)
+            lines.append(f'app_component_stat{_format_labels((), component=component, stat=stat)} {_format_number(value)}')
+    if shared:
+        lines += ['# HELP app_shared_stat Deployment-wide statistics, read by the process answering',
+                  '# TYPE app_shared_stat gauge']
+        for key, value in sorted(shared.items()):
+            component, stat = key.split(':', 1)
+            lines.append(f'app_shared_stat{_format_labels((), component=component, stat=stat)} {_format_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+_registry = None
+_registry_lock = threading.Lock()
+_components = {}
+_collectors = {}
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                options = metrics_settings()
+                registry = MetricsRegistry(options['DIR'], options['FLUSH_INTERVAL'])
+                for name, get_stats in _components.items():
+                    registry.register_component(name, get_stats)
+                atexit.register(registry.flush)
+                _registry = registry
+    return _registry
+
+
+def register_component(name, get_stats):
+    """Export ``get_stats()`` (a dict of numbers) under ``component=name``"""
+    _components[name] = get_stats
+    if _registry is not None:
+        _registry.register_component(name, get_stats)
+
+
+def register_collector(name, collect):
+    """Export ``collect()`` (a dict of numbers) under ``component=name``, once per scrape"""
+    _collectors[name] = collect
+
+
+def collect_shared():
+    return _read_stats(_collectors)
+
+
+@receiver(setting_changed)
+def _reset_registry(setting, **kwargs):
+    global _registry
+    if setting == 'METRICS':
+        if _registry is not None:
+            # The replaced registry must not flush into its directory at exit
+            atexit.unregister(_registry.flush)
+        _registry = None
+
+
+def _authorized(request, token):
+    if token:
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        return header.startswith('Bearer ') and constant_time_compare(header[7:], token)
+    # No token configured: staff only (JWT or session)
+    from rest_framework.exceptions import APIException
+    from rest_framework.settings import api_settings
+
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and user.is_staff:
+        return True
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authentication_class().authenticate(request)
+        except APIException:
+            return False
+        if result is not None:
+            return result[0].is_staff
+    return False
+
+
+def metrics_view(request):
+    """GET /metrics - Prometheus text exposition of every worker's metrics"""
+    options = metrics_settings()
+    if not options['ENABLED']:
+        return HttpResponse(status=404)
+    if not _authorized(request, options['TOKEN']):
+        return HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+    body = render_prometheus(get_registry().collect(), collect_shared())
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,207 @@
+"""
+Keyset pagination for DRF list views.
+
+``PageNumberPagination`` runs ``COUNT(*)`` for every page and skips rows with
+``OFFSET``, so deep pages get slower. ``KeysetPagination`` orders by a unique
+tuple of columns and asks for the rows after (or before) the last one seen::
+
+    created_at <= :c AND (created_at < :c OR id < :id)
+
+The first condition is an index range bound, the second only breaks ties, so
+with an index on the ordering columns every page costs the same. Cursors are
+opaque, URL-safe tokens holding the boundary row's values.
+
+Totals are off by default. With ``?count=true`` the count is computed once
+and cached under the SQL of the filtered query - so each filter combination
+(and each permission scope) gets its own entry - and the view's
+``count_version_key`` stamp, if any, or for ``count_cache_timeout`` seconds.
+Queries using one of the pagination's ``unversioned_count_params`` (filters
+on data the stamp does not cover) always get the short timeout.
+"""
+import base64
+import binascii
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from configs.cache_versions import get_version
+from configs.db_routers import primary_reads
+
+TRUE_VALUES = {'1', 'true', 'yes'}
+
+
+def _encode(values, reverse):
+    payload = json.dumps({'v': values, 'r': int(reverse)}, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def _decode(token):
+    token += '=' * (-len(token) % 4)
+    payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+    return payload['v'], bool(payload.get('r'))
+
+
+def keyset_filter(fields, values):
+    """
+    ``Q`` selecting rows strictly after ``values`` in the order given by
+    ``fields`` (``'-name'`` for descending), as a range bound on the first
+    field plus tie-breakers.
+    """
+    (field, *rest_fields), (value, *rest_values) = fields, values
+    name = field.lstrip('-')
+    strict, inclusive = ('lt', 'lte') if field.startswith('-') else ('gt', 'gte')
+    after = Q(**{f'{name}__{strict}': value})
+    if rest_fields:
+        after |= keyset_filter(rest_fields, rest_values)
+        return Q(**{f'{name}__{inclusive}': value}) & after
+    return after
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a unique ``ordering`` tuple, e.g.
+    ``('-created_at', '-id')``; add a matching composite index.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    count_cache_timeout = 60
+    unversioned_count_params = ()
+    versioned_count_timeout = 60 * 60 * 24
+    invalid_cursor_message = _('Invalid cursor')
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def _field_values(self, row):
+        # Model instances, or dicts when paginating .values() rows
+        if isinstance(row, dict):
+            return [row[field.lstrip('-')] for field in self.ordering]
+        return [getattr(row, field.lstrip('-')) for field in self.ordering]
+
+    def _decode_cursor(self, request, model):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            values, reverse = _decode(token)
+            if len(values) != len(self.ordering):
+                raise ValueError
+            values = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (ValueError, TypeError, KeyError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.view = view
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.count = self.get_count(queryset, request, view) if self.wants_count(request) else None
+
+        values, reverse = self._decode_cursor(request, queryset.model)
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(keyset_filter(ordering, values))
+
+        # One extra row tells whether there is another page
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.page = rows
+        self.has_next = has_more if not reverse else values is not None
+        self.has_previous = values is not None if not reverse else has_more
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        token = _encode(self._field_values(self.page[-1]), reverse=False)
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        token = _encode(self._field_values(self.page[0]), reverse=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    # ------------------------------------------------------------------
+    # Counts
+    # ------------------------------------------------------------------
+    def wants_count(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in TRUE_VALUES
+
+    def get_count(self, queryset, request, view=None):
+        """``queryset.count()``, cached per distinct query"""
+        sql, params = queryset.order_by().query.sql_with_params()
+        version_key = getattr(view, 'count_version_key', None)
+        if any(request.query_params.get(param) for param in self.unversioned_count_params):
+            version_key = None
+        version = get_version(version_key) if version_key else ''
+        digest = hashlib.blake2b(
+            f'{version}:{sql}:{params!r}'.encode(), digest_size=16
+        ).hexdigest()
+        key = f'pagination:count:{queryset.model._meta.label_lower}:{digest}'
+        count = cache.get(key)
+        if count is None:
+            with primary_reads():
+                count = queryset.count()
+            # Under a version stamp the entry only goes stale by being replaced
+            timeout = self.versioned_count_timeout if version_key else self.count_cache_timeout
+            cache.set(key, count, timeout)
+        return count
+
+    def get_paginated_response(self, data):
+        body = {'next': self.get_next_link(), 'previous': self.get_previous_link()}
+        if self.count is not None:
+            body['count'] = self.count
+        body['results'] = data
+        return Response(body)
+
+    def get_paginated_response_schema(self, schema):
+        properties = {
+            'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+            'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+            'count': {'type': 'integer', 'description': f'Only with ?{self.count_query_param}=true'},
+            'results': schema,
+        }
+        return {'type': 'object', 'required': ['results'], 'properties': properties}
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': self.cursor_query_param, 'required': False, 'in': 'query',
+             'description': 'Pagination cursor from a next/previous link', 'schema': {'type': 'string'}},
+            {'name': self.page_size_query_param, 'required': False, 'in': 'query',
+             'description': 'Number of results per page', 'schema': {'type': 'integer'}},
+            {'name': self.count_query_param, 'required': False, 'in': 'query',
+             'description': 'Include the (cached) total count', 'schema': {'type': 'boolean'}},
+        ]
@@ -0,0 +1,16 @@
+"""
+Helpers shared by the serializer-free read paths (the apps' ``readers``
+modules), which build response data from ``.values()`` rows.
+"""
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers
+
+
+def datetime_formatter():
+    """
+    ``DateTimeField().to_representation`` with the current timezone looked
+    up once, not per value. Get one per response, not at import time.
+    """
+    current = timezone.get_current_timezone() if settings.USE_TZ else None
+    return serializers.DateTimeField(default_timezone=current).to_representation
@@ -56,9 +56,14 @@ INSTALLED_APPS = [
     'apps.auth_api.roles',
     'apps.auth_api.accounts',
     'apps.sunkinghub.zendesk_agents',
+    
+    # Internal tooling (benchmark commands)
+    'apps.tooling.benchmarks',
 ]
 
 MIDDLEWARE = [
+    # Request timing breakdown: Server-Timing headers and /metrics (see METRICS)
+    'configs.instrumentation.RequestTimingMiddleware',
     # Allow communication from browsers
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
@@ -68,6 +73,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Read replica routing and read-your-writes pinning (see DB_REPLICAS)
+    'configs.db_routers.ReplicaRoutingMiddleware',
 ]
 
 # Roots endpoints of the api: can be found in configs-> urls.py
@@ -117,6 +124,46 @@ DATABASES = {
     }
 } """
 
+# Read replicas: extra DATABASES aliases receiving safe-request reads
+DATABASE_ROUTERS = ['configs.db_routers.PrimaryReplicaRouter']
+DB_REPLICAS = {
+    'ALIASES': [],
+    # Seconds a client's reads stay on the primary after it writes
+    'PIN_SECONDS': 5,
+    # Seconds between health/lag checks of each replica
+    'HEALTH_CHECK_INTERVAL': 10,
+    'MAX_LAG_SECONDS': 5,
+}
+# Local stand-in: a second SQLite file acting as the replica
+if os.environ.get("DB_REPLICA_SQLITE"):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ["DB_REPLICA_SQLITE"],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DB_REPLICAS['ALIASES'] = ['replica']
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# RBAC and JWT user invalidation, blacklist markers, lockout counters and
+# the response caches all go through this cache, so with more than one
+# worker process it must be shared: set REDIS_URL. Local memory is only
+# correct for a single process (runserver, tests); `check --deploy` fails on it.
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'bms-backend',
+        }
+    }
+
 # ----- Our Custom User Added ---------
 # We are telling django to use our custom user model not the default one
 
@@ -140,6 +187,27 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Same pbkdf2_sha256 format as Django's default hasher, derived in a bounded
+# process pool (apps.auth_api.accounts.hashing). It replaces Django's
+# PBKDF2PasswordHasher: hashers are looked up by algorithm name and the last
+# one listed wins, so listing both would verify every password without the pool.
+PASSWORD_HASHERS = [
+    'apps.auth_api.accounts.hashers.PooledPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+PASSWORD_HASHING = {
+    # Hashing processes per worker; 0 hashes inline in the request thread
+    'WORKERS': 2,
+    # Hashes allowed to wait for a process before callers block
+    'MAX_PENDING': 64,
+    # PBKDF2 iterations for new hashes; None uses Django's default
+    'ITERATIONS': None,
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -186,12 +254,23 @@ CORS_ALLOWED_ORIGINS = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         # Telling Django to use simple jwt for all API views
-        'rest_framework_simplejwt.authentication.JWTAuthentication'
+        # Simple jwt, with users served from a short-lived cache (see JWT_USER_CACHE)
+        'apps.auth_api.accounts.authentication.CachedJWTAuthentication'
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         # Making all endpoint protected by default. ie user must be authenticated
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    # orjson-backed JSON (falls back to DRF's json-module classes without orjson)
+    'DEFAULT_RENDERER_CLASSES': [
+        'configs.renderers.OrjsonRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'configs.renderers.OrjsonParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     # The below is for the browser API documentation end
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
@@ -206,7 +285,54 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
-    'AUTH_HEADER_TYPES': ('Bearer', )
+    'AUTH_HEADER_TYPES': ('Bearer', ),
+    # Adds email/name/staff claims used by stateless authentication
+    'TOKEN_OBTAIN_SERIALIZER': 'apps.auth_api.accounts.serializers.ClaimsTokenObtainPairSerializer',
+    # Blacklist checks go through an in-memory filter (see JWT_BLACKLIST_FILTER)
+    'TOKEN_REFRESH_SERIALIZER': 'apps.auth_api.accounts.serializers.FilteredTokenRefreshSerializer',
+    'TOKEN_VERIFY_SERIALIZER': 'apps.auth_api.accounts.serializers.FilteredTokenVerifySerializer',
+}
+
+# Authenticated user cache (apps.auth_api.accounts.authentication)
+JWT_USER_CACHE = {
+    # True builds request.user from token claims and never queries the database
+    'STATELESS': False,
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+}
+
+# Blacklisted token filter (apps.auth_api.accounts.blacklist)
+JWT_BLACKLIST_FILTER = {
+    # False checks the database on every refresh/verify
+    'ENABLED': True,
+    # Seconds between loads of newly blacklisted token ids
+    'REFRESH_INTERVAL': 30,
+    # Seconds between rebuilds of the whole set (drops expired ids)
+    'FULL_RELOAD_INTERVAL': 600,
+}
+
+# Request metrics (configs.metrics, configs.instrumentation)
+METRICS = {
+    'ENABLED': True,
+    # Shared by all workers of one server; configs.gunicorn clears it on start
+    'DIR': os.environ.get('METRICS_DIR', os.path.join(BASE_DIR, '.metrics')),
+    'FLUSH_INTERVAL': 5,
+    # Bearer token for Prometheus scrapes; without one /metrics is staff-only
+    'TOKEN': os.environ.get('METRICS_TOKEN') or None,
+    # Server-Timing headers for 'staff', 'all' or 'none'
+    'SERVER_TIMING': 'staff',
+}
+
+# Test runs flush metrics to a temporary directory (configs.test_runner)
+TEST_RUNNER = 'configs.test_runner.TestRunner'
+
+# Failed-login lockout for the token, login and Google endpoints (apps.auth_api.accounts.lockout)
+ACCOUNT_LOCKOUT = {
+    'ENABLED': True,
+    # Failed attempts within WINDOW seconds that lock the account for LOCK_MINUTES
+    'MAX_ATTEMPTS': 5,
+    'WINDOW': 15 * 60,
+    'LOCK_MINUTES': 15,
 }
 
 #----- DRF Spectacular Settings
@@ -220,14 +346,42 @@ SPECTACULAR_SETTINGS = {
 # Google ID token verification
 # -------------------------
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID", None)
+# Signing certificates endpoint; point it at a local stand-in for tests
+GOOGLE_CERTS_URL = os.environ.get("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs")
+# Seconds to wait for the certificates endpoint
+GOOGLE_CERTS_TIMEOUT = 5
+
+# ----------------------------
+# Audit log writer (apps.auth_api.accounts.audit)
+# ----------------------------
+AUDIT_LOG = {
+    'ENABLED': True,
+    # Write from a background thread in batches; False writes inline
+    'ASYNC': True,
+    'QUEUE_SIZE': 10000,
+    'BATCH_SIZE': 500,
+    # Seconds between flushes of a partially filled batch
+    'FLUSH_INTERVAL': 2.0,
+    # Whole months kept besides the current one; older monthly buckets are
+    # exported and dropped by `manage.py archive_audit_logs`
+    'RETENTION_MONTHS': 12,
+    'ARCHIVE_DIR': BASE_DIR / 'audit_archive',
+}
 
 # ----------------------------
 # Authentication backend
 # ----------------------------
 AUTHENTICATION_BACKENDS = [
+    # Answers has_perm() from cached role grants (roles.RolePermission).
+    # Listed first so that granted checks never reach ModelBackend's queries.
+    "apps.auth_api.roles.backends.RolePermissionBackend",
     "django.contrib.auth.backends.ModelBackend",
 ]
 
+# Seconds a resolved role permission set stays cached. Changes to
+# assignments or grants invalidate it immediately regardless.
+RBAC_PERMISSION_CACHE_TIMEOUT = 300
+
 # Production security settings
 if not DEBUG:
     SECURE_SSL_REDIRECT = True
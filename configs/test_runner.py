@@ -0,0 +1,25 @@
+"""
+Test runner keeping what a test run writes out of the working tree.
+
+Every request a test sends goes through ``RequestTimingMiddleware``, whose
+registry flushes snapshots to ``METRICS['DIR']``. For the duration of the
+run that directory is a temporary one, removed afterwards.
+"""
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._metrics_dir = tempfile.TemporaryDirectory(prefix='bms-test-metrics-')
+        self._metrics = override_settings(METRICS={**getattr(settings, 'METRICS', {}), 'DIR': self._metrics_dir.name})
+        self._metrics.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._metrics.disable()
+        self._metrics_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
@@ -4,14 +4,33 @@ URL configuration for configs project.
 from django.contrib import admin
 from django.urls import path, include
 
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenBlacklistView
+from configs.metrics import metrics_view
+
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
-from apps.auth_api.accounts.views import RegisterView, MeView, GoogleLoginView, LogoutView
-from apps.sunkinghub.zendesk_agents.views import LinkZendeskUserView, ZendeskProfileListView
+from apps.auth_api.accounts.views import (
+    RegisterView,
+    MeView,
+    GoogleLoginView,
+    LogoutView,
+    AuditedTokenObtainPairView,
+    AuditedTokenRefreshView,
+    AuditedLoginView,
+    AuditedPasswordChangeView,
+    AuditedPasswordResetConfirmView,
+)
+from apps.auth_api.accounts.async_views import AsyncMeView, AsyncGoogleLoginView
+from apps.sunkinghub.zendesk_agents.views import (
+    BulkZendeskProfileUpsertView,
+    LinkZendeskUserView,
+    ZendeskProfileListView,
+)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     
+    # Prometheus scrape target
+    path('metrics', metrics_view, name='metrics'),
+    
     # API Documentation
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     # The below link is the online documentation
@@ -20,20 +39,30 @@ urlpatterns = [
     
     #Auth
     path('api/auth/register/', RegisterView.as_view(), name='auth_register'),
-    path('api/auth/token/', TokenObtainPairView.as_view(), name='auth_token'),
-    path('api/auth/token/refresh/', TokenRefreshView.as_view(), name='auth_token_refresh'),
+    path('api/auth/token/', AuditedTokenObtainPairView.as_view(), name='auth_token'),
+    path('api/auth/token/refresh/', AuditedTokenRefreshView.as_view(), name='auth_token_refresh'),
     path('api/auth/logout/', LogoutView.as_view(), name='auth_logout'),
+    # Audited replacements for dj_rest_auth views; must precede the include below
+    path('api/auth/login/', AuditedLoginView.as_view(), name='rest_login'),
+    path('api/auth/password/change/', AuditedPasswordChangeView.as_view(), name='rest_password_change'),
+    path('api/auth/password/reset/confirm/', AuditedPasswordResetConfirmView.as_view(), name='rest_password_reset_confirm'),
     path('api/auth/', include('dj_rest_auth.urls')),
     
     #Google Auth
     path('api/auth/google/login/', GoogleLoginView.as_view(), name='google_login'),
     
+    # Async (ASGI) fast path for the hottest auth endpoints
+    path('api/async/me/', AsyncMeView.as_view(), name='async_me'),
+    path('api/async/auth/google/login/', AsyncGoogleLoginView.as_view(), name='async_google_login'),
+    
     # Users
+    path('api/me/', MeView.as_view(), name='me'),
     path('api/', include('apps.auth_api.accounts.urls')),
     
     # Zendesk Link
     path('api/zendesk/link/', LinkZendeskUserView.as_view(), name='zendesk_link'),
     path("api/zendesk/profiles/", ZendeskProfileListView.as_view(), name="zendesk-profiles"),
+    path("api/zendesk/profiles/bulk/", BulkZendeskProfileUpsertView.as_view(), name="zendesk-profiles-bulk"),
     
     # Roles
     path('api/', include('apps.auth_api.roles.urls')),